@@ -30,6 +30,50 @@ app.secret_key = os.environ.get('SESSION_SECRET')
 # YouTube API configuration
 app.config['YOUTUBE_API_KEY'] = os.environ.get('YOUTUBE_API_KEY', '')
 
+# YouTube Data API client: the API address (point it at a fake server for tests),
+# connect and read timeouts in seconds, and threads for concurrent video lookups
+app.config['YOUTUBE_API_URL'] = os.environ.get('YOUTUBE_API_URL', 'https://www.googleapis.com/youtube/v3')
+app.config['YOUTUBE_CONNECT_TIMEOUT'] = float(os.environ.get('YOUTUBE_CONNECT_TIMEOUT', 5))
+app.config['YOUTUBE_READ_TIMEOUT'] = float(os.environ.get('YOUTUBE_READ_TIMEOUT', 15))
+app.config['YOUTUBE_WORKERS'] = int(os.environ.get('YOUTUBE_WORKERS', 4))
+
+# YouTube responses are cached in YOUTUBE_CACHE_PATH (default: youtube.sqlite3
+# in CACHE_DIR or the temp directory), video details for YOUTUBE_VIDEO_TTL and
+# playlist pages for YOUTUBE_PLAYLIST_TTL seconds before being revalidated.
+# Calls stop for the day once YOUTUBE_DAILY_QUOTA units are spent
+app.config['YOUTUBE_CACHE_PATH'] = os.environ.get('YOUTUBE_CACHE_PATH')
+app.config['YOUTUBE_VIDEO_TTL'] = int(os.environ.get('YOUTUBE_VIDEO_TTL', 86400))
+app.config['YOUTUBE_PLAYLIST_TTL'] = int(os.environ.get('YOUTUBE_PLAYLIST_TTL', 3600))
+app.config['YOUTUBE_DAILY_QUOTA'] = int(os.environ.get('YOUTUBE_DAILY_QUOTA', 10000))
+
+# YouTube calls per second per process, in bursts of up to YOUTUBE_RATE_BURST
+app.config['YOUTUBE_RATE_LIMIT'] = float(os.environ.get('YOUTUBE_RATE_LIMIT', 10))
+app.config['YOUTUBE_RATE_BURST'] = int(os.environ.get('YOUTUBE_RATE_BURST', 20))
+
+# Text search configuration used for stemming on PostgreSQL
+app.config['FULLTEXT_LANGUAGE'] = os.environ.get('FULLTEXT_LANGUAGE', 'english')
+
+# Response caches: 'local' (per worker process), 'filesystem' (shared through
+# CACHE_DIR by every worker on the host) or a 'module:Class' path to another backend
+app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', 'local')
+app.config['CACHE_DIR'] = os.environ.get('CACHE_DIR')
+app.config['SEARCH_CACHE_SIZE'] = int(os.environ.get('SEARCH_CACHE_SIZE', 2048))
+
+# Playlist import wizard sessions: fetched playlists kept for PLAYLIST_CACHE_TTL
+# seconds, at most PLAYLIST_CACHE_SIZE of them, in the CACHE_BACKEND store
+app.config['PLAYLIST_CACHE_TTL'] = int(os.environ.get('PLAYLIST_CACHE_TTL', 3600))
+app.config['PLAYLIST_CACHE_SIZE'] = int(os.environ.get('PLAYLIST_CACHE_SIZE', 16))
+
+# Minimum trigram word similarity (0-1) for typo-tolerant search with match=fuzzy
+app.config['FUZZY_THRESHOLD'] = float(os.environ.get('FUZZY_THRESHOLD', 0.5))
+
+# Background jobs: 'thread' runs them on a pool of JOB_WORKERS threads, 'sync'
+# runs them inside the request that starts them (for tests). Uploads and result
+# files are kept in JOB_DIR
+app.config['JOB_EXECUTOR'] = os.environ.get('JOB_EXECUTOR', 'thread')
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_DIR'] = os.environ.get('JOB_DIR')
+
 # Initialize extensions
 db = SQLAlchemy(app)
 login_manager = LoginManager(app)
@@ -44,7 +88,29 @@ with app.app_context():
     # Create all tables based on models
     db.create_all()
     logging.info('Database tables created')
+
+    # Seed the change counters used to detect stale in-process indexes
+    from catalog import init_catalog_versions
+    init_catalog_versions()
+
+    # Set up the full-text index for lecture search
+    from fulltext import init_fulltext_search
+    init_fulltext_search()
+
+    # Set up trigram matching for typo-tolerant search
+    from fuzzy import init_fuzzy_search
+    init_fuzzy_search()
+    
+    # Mark jobs whose process is gone as failed
+    from jobs import init_jobs
+    init_jobs()
     
     # Import and initialize users
     from init_users import init_default_users
     init_default_users()
+
+    # Warm the in-memory facet and suggestion indexes in the background
+    from facet_index import facet_index
+    facet_index.refresh_async()
+    from suggest_index import suggest_index
+    suggest_index.refresh_async()
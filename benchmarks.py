@@ -0,0 +1,692 @@
+"""
+Benchmarks for the lecture catalog.
+
+Each benchmark fills a scratch database with a synthetic catalog and prints
+timings. A temporary SQLite file is used unless --database-url is given; the
+target database is wiped, so never point it at real data.
+
+    python benchmarks.py search --sizes 10000 100000
+    python benchmarks.py two-phase --size 20000
+    python benchmarks.py suggest --size 100000
+    python benchmarks.py fuzzy --size 100000
+    python benchmarks.py metadata
+    python benchmarks.py reorder --items 1000
+    python benchmarks.py export --size 20000
+    python benchmarks.py import --size 20000
+    python benchmarks.py youtube --videos 500 --latency 0.05
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import requests
+
+WORDS = [
+    'joseki', 'fuseki', 'tesuji', 'life', 'death', 'ko', 'ladder', 'net', 'shape', 'invasion',
+    'reduction', 'endgame', 'yose', 'opening', 'middle', 'game', 'review', 'pro', 'amateur', 'attack',
+    'defense', 'moyo', 'territory', 'influence', 'sabaki', 'semeai', 'capturing', 'race', 'corner', 'side',
+    'center', 'star', 'point', 'komoku', 'sansan', 'approach', 'pincer', 'enclosure', 'extension', 'cut',
+    'connect', 'eye', 'seki', 'aji', 'miai', 'sente', 'gote', 'tenuki', 'haengma', 'baduk',
+]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='scratch database to use (wiped by every run)')
+    parser.add_argument('--seed', type=int, default=42)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    search = subparsers.add_parser('search', help='ILIKE vs full-text title search')
+    search.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    search.add_argument('--queries', type=int, default=50)
+
+    two_phase = subparsers.add_parser('two-phase', help='joinedload + DISTINCT vs id-then-hydrate search')
+    two_phase.add_argument('--size', type=int, default=20000)
+    two_phase.add_argument('--per-page', type=int, default=9)
+
+    suggest = subparsers.add_parser('suggest', help='prefix index vs SQL typeahead suggestions, and index memory')
+    suggest.add_argument('--size', type=int, default=100000)
+    suggest.add_argument('--queries', type=int, default=1000)
+
+    fuzzy = subparsers.add_parser('fuzzy', help='exact vs typo-tolerant (trigram) title search')
+    fuzzy.add_argument('--size', type=int, default=100000)
+    fuzzy.add_argument('--queries', type=int, default=50)
+
+    metadata = subparsers.add_parser('metadata', help='queries per request with and without the metadata cache')
+    metadata.add_argument('--size', type=int, default=2000)
+
+    reorder = subparsers.add_parser('reorder', help='per-row vs set-based collection reordering')
+    reorder.add_argument('--items', type=int, default=1000)
+    reorder.add_argument('--repeat', type=int, default=20)
+
+    export = subparsers.add_parser('export', help='in-memory vs streaming full-catalog export')
+    export.add_argument('--size', type=int, default=5000)
+    export.add_argument('--collections', type=int, default=50)
+
+    bulk_import = subparsers.add_parser('import', help='per-record vs bulk full-catalog import, rows per second')
+    bulk_import.add_argument('--size', type=int, default=5000)
+    bulk_import.add_argument('--collections', type=int, default=50)
+
+    youtube = subparsers.add_parser('youtube', help='sequential vs pooled, concurrent YouTube API calls (fake server)')
+    youtube.add_argument('--videos', type=int, default=500)
+    youtube.add_argument('--latency', type=float, default=0.05, help='seconds the fake API waits per call')
+
+    return parser.parse_args()
+
+# The app binds to DATABASE_URL on import, so pick the scratch database first
+ARGS = parse_args()
+os.environ.setdefault('SESSION_SECRET', 'benchmarks')
+os.environ['DATABASE_URL'] = ARGS.database_url or 'sqlite:///{}'.format(
+    os.path.join(tempfile.mkdtemp(prefix='baduk-bench-'), 'bench.db'),
+)
+
+from sqlalchemy import event  # noqa: E402
+
+import routes  # noqa: E402
+from app import app, db  # noqa: E402
+from catalog import get_versions, init_catalog_versions  # noqa: E402
+from catalog_export import iter_export_json  # noqa: E402
+from catalog_import import CatalogImporter  # noqa: E402
+from collection_order import collection_keys, rebalance, reorder  # noqa: E402
+from db_utils import (  # noqa: E402
+    count_lectures,
+    get_filtered_lectures_query,
+    get_metadata,
+    hydrate_lectures,
+    search_lecture_ids,
+)
+from fake_youtube import FakeYouTubeServer  # noqa: E402
+from fulltext import apply_text_search, get_backend, init_fulltext_search  # noqa: E402
+from fuzzy import get_backend as get_fuzzy_backend  # noqa: E402
+from fuzzy import init_fuzzy_search, trigram_index  # noqa: E402
+from models import (  # noqa: E402
+    Collection,
+    Lecture,
+    Rank,
+    Tag,
+    Topic,
+    User,
+    collection_lecture,
+    lecture_tag,
+    lecture_topic,
+)
+from suggest_index import (  # noqa: E402
+    SUGGEST_KINDS,
+    build_prefix_table,
+    load_rows,
+    suggest_from_database,
+    suggest_index,
+)
+from youtube_client import YouTubeClient  # noqa: E402
+
+def reset_database():
+    """Drop and recreate every table, including the catalog versions and full-text index"""
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(db.text('DROP TABLE IF EXISTS lecture_fts'))
+        db.session.commit()
+    db.drop_all()
+    db.create_all()
+    init_catalog_versions()
+    init_fulltext_search()
+    init_fuzzy_search()
+
+def random_title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 7))).capitalize()
+
+def populate_catalog(size, rng, batch_size=5000):
+    """Insert a synthetic catalog of `size` lectures with topics, tags and ranks"""
+    db.session.execute(db.insert(Rank), [{'name': f'{k} kyu'} for k in range(1, 31)])
+    db.session.execute(db.insert(Topic), [{'name': f'Topic {i}'} for i in range(40)])
+    db.session.execute(db.insert(Tag), [{'name': f'Tag {i}'} for i in range(120)])
+
+    start = datetime(2015, 1, 1)
+    for offset in range(0, size, batch_size):
+        count = min(batch_size, size - offset)
+        lectures = [{
+            'id': offset + i + 1,
+            'title': random_title(rng),
+            'youtube_id': f'v{offset + i:010d}',
+            'thumbnail_url': f'https://i.ytimg.com/vi/v{offset + i:010d}/hqdefault.jpg',
+            'publish_date': start + timedelta(minutes=rng.randint(0, 5_000_000)),
+            'duration_seconds': rng.randint(60, 7200),
+            'rank_id': rng.randint(1, 30),
+        } for i in range(count)]
+        db.session.execute(db.insert(Lecture), lectures)
+
+        topics, tags = [], []
+        for lecture in lectures:
+            for topic_id in rng.sample(range(1, 41), rng.randint(1, 3)):
+                topics.append({'lecture_id': lecture['id'], 'topic_id': topic_id})
+            for tag_id in rng.sample(range(1, 121), rng.randint(0, 5)):
+                tags.append({'lecture_id': lecture['id'], 'tag_id': tag_id})
+        db.session.execute(lecture_topic.insert(), topics)
+        if tags:
+            db.session.execute(lecture_tag.insert(), tags)
+
+    db.session.commit()
+
+class StatementRecorder:
+    """Record the SQL statements run while active, to count queries and result rows"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(db.engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    def rows_returned(self):
+        """Replay the recorded statements and count the rows the database sent back"""
+        with db.engine.connect() as conn:
+            return sum(len(conn.exec_driver_sql(statement, parameters).fetchall())
+                       for statement, parameters in self.statements)
+
+def timed(func, repeat):
+    """Run func `repeat` times and return the latencies in milliseconds"""
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f'  {label:<32} median {statistics.median(latencies):8.2f} ms   p95 {p95:8.2f} ms')
+
+def bench_search(args, rng):
+    backend = get_backend()
+    for size in args.sizes:
+        reset_database()
+        populate_catalog(size, rng)
+        print(f'{size} lectures (full-text backend: {backend})')
+
+        workloads = {
+            'single word': [rng.choice(WORDS) for _ in range(args.queries)],
+            'prefix': [rng.choice(WORDS)[:3] for _ in range(args.queries)],
+            'two words': [f'{rng.choice(WORDS)} {rng.choice(WORDS)}' for _ in range(args.queries)],
+        }
+        for label, queries in workloads.items():
+            for name, search_backend in (('ilike', 'like'), (backend, backend)):
+                # Matching alone, then the first page as /api/search serves it
+                def count_matches(search_backend=search_backend, remaining=iter(queries)):
+                    apply_text_search(db.session.query(Lecture.id), next(remaining), search_backend).count()
+
+                def first_page(search_backend=search_backend, remaining=iter(queries)):
+                    query = apply_text_search(get_filtered_lectures_query(), next(remaining), search_backend)
+                    query.order_by(Lecture.publish_date.desc()).paginate(page=1, per_page=9, error_out=False)
+
+                report(f'{label} match [{name}]', timed(count_matches, len(queries)))
+                report(f'{label} page 1 [{name}]', timed(first_page, len(queries)))
+
+def legacy_search_page(search_params, page, per_page):
+    """The search as it was: joins, three joinedloads and DISTINCT, paginated with COUNT + OFFSET"""
+    query = Lecture.query.options(
+        db.joinedload(Lecture.topics),
+        db.joinedload(Lecture.tags),
+        db.joinedload(Lecture.rank),
+    ).distinct()
+    if search_params.get('topics'):
+        query = query.join(Lecture.topics).filter(Topic.id.in_(search_params['topics']))
+    if search_params.get('tags'):
+        query = query.join(Lecture.tags).filter(Tag.id.in_(search_params['tags']))
+    if search_params.get('rank'):
+        query = query.filter(Lecture.rank_id == search_params['rank'])
+    # Tie-breaker added so both paths page identically
+    query = query.order_by(Lecture.publish_date.desc(), Lecture.id.desc())
+    return query.paginate(page=page, per_page=per_page, error_out=False).items
+
+def two_phase_search_page(search_params, page, per_page):
+    """The current search: COUNT and a page of IDs on the narrow table, then selectinload"""
+    count_lectures(search_params)
+    return hydrate_lectures(search_lecture_ids(search_params, per_page, offset=(page - 1) * per_page))
+
+def bench_two_phase(args, rng):
+    reset_database()
+    populate_catalog(args.size, rng)
+    print(f'{args.size} lectures, {args.per_page} per page')
+
+    scenarios = {
+        'no filters, page 1': ({}, 1),
+        'topic, page 1': ({'topics': ['1']}, 1),
+        'topic + tag, page 1': ({'topics': ['1', '2'], 'tags': ['3']}, 1),
+        'topic, page 100': ({'topics': ['1']}, 100),
+        'rank, page 20': ({'rank': '5'}, 20),
+    }
+    for label, (search_params, page) in scenarios.items():
+        for name, search in (('joinedload', legacy_search_page), ('two-phase', two_phase_search_page)):
+            with StatementRecorder() as recorder:
+                lectures = search(search_params, page, args.per_page)
+                # Touch relationships the way the API serializer does
+                for lecture in lectures:
+                    [t.name for t in lecture.topics], [t.name for t in lecture.tags], lecture.rank
+            db.session.expire_all()
+            latencies = timed(lambda search=search: search(search_params, page, args.per_page), 10)
+            print(f'  {label:<22} [{name:<10}] {len(recorder.statements)} queries, '
+                  f'{recorder.rows_returned():6d} rows, median {statistics.median(latencies):8.2f} ms')
+
+    # Both paths must agree on which lectures are on the page
+    legacy_ids = [lecture.id for lecture in legacy_search_page({'topics': ['1']}, 3, args.per_page)]
+    same = legacy_ids == search_lecture_ids({'topics': ['1']}, args.per_page, offset=2 * args.per_page)
+    print(f'  same lectures on page 3: {same}')
+
+def bench_suggest(args, rng):
+    reset_database()
+    populate_catalog(args.size, rng)
+    db.session.execute(db.insert(Collection), [{'name': random_title(rng)} for _ in range(200)])
+    db.session.commit()
+    print(f'{args.size} lectures, 200 collections')
+
+    # Memory the index holds once built, then the build time without tracing overhead
+    tracemalloc.start()
+    suggest_index.refresh()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    started = time.perf_counter()
+    for column in SUGGEST_KINDS.values():
+        build_prefix_table(load_rows(column), suggest_index.max_limit)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f'  build {build_ms:.0f} ms, index {size / 2**20:.1f} MiB (peak while building {peak / 2**20:.1f} MiB)')
+    for kind, counts in suggest_index.memory_report().items():
+        print(f'    {kind:<12} ' + ', '.join(f'{value} {name}' for name, value in counts.items()))
+
+    versions = get_versions()
+    workloads = {
+        '1 letter': [rng.choice(WORDS)[:1] for _ in range(args.queries)],
+        '3 letters': [rng.choice(WORDS)[:3] for _ in range(args.queries)],
+        'word + prefix': [f'{rng.choice(WORDS)} {rng.choice(WORDS)[:2]}' for _ in range(args.queries)],
+    }
+    for label, queries in workloads.items():
+        remaining = iter(queries)
+        report(f'{label} [index]', timed(lambda: suggest_index.suggest(next(remaining), 5, versions), len(queries)))
+        remaining = iter(queries[:50])
+        report(f'{label} [sql]', timed(lambda: suggest_from_database(next(remaining), 5), 50))
+
+    # Both must suggest the same entries
+    mismatches = sum(
+        suggest_index.suggest(text, 5, versions) != suggest_from_database(text, 5)
+        for text in workloads['3 letters'][:50] + workloads['word + prefix'][:50]
+    )
+    print(f'  mismatches against SQL: {mismatches} of 100')
+
+def misspell(word, rng):
+    """The word with one letter dropped, doubled, swapped with the next or replaced"""
+    i = rng.randrange(len(word) - 1)
+    edit = rng.choice(('drop', 'double', 'swap', 'replace'))
+    if edit == 'drop':
+        return word[:i] + word[i + 1:]
+    if edit == 'double':
+        return word[:i] + word[i] + word[i:]
+    if edit == 'swap':
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice('aeiouy') + word[i + 1:]
+
+def bench_fuzzy(args, rng):
+    reset_database()
+    populate_catalog(args.size, rng)
+    print(f'{args.size} lectures (full-text backend: {get_backend()}, fuzzy backend: {get_fuzzy_backend()})')
+
+    if get_fuzzy_backend() == 'index':
+        started = time.perf_counter()
+        trigram_index.refresh()
+        print(f'  trigram index built in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+    long_words = [word for word in WORDS if len(word) >= 5]
+    originals = [rng.choice(long_words) for _ in range(args.queries)]
+    typos = [misspell(word, rng) for word in originals]
+    workloads = {
+        'correct word': originals,
+        'misspelled word': typos,
+        'word + misspelled word': [f'{rng.choice(WORDS)} {typo}' for typo in typos],
+    }
+    for label, queries in workloads.items():
+        for match in ('exact', 'fuzzy'):
+            def first_page(match=match, remaining=iter(queries)):
+                search_params = {'q': next(remaining), 'match': match}
+                count_lectures(search_params)
+                return search_lecture_ids(search_params, 9)
+
+            report(f'{label} [{match}]', timed(first_page, len(queries)))
+
+    # How often the best fuzzy match for a typo contains the intended word
+    found = 0
+    for original, typo in zip(originals, typos):
+        top = hydrate_lectures(search_lecture_ids({'q': typo, 'match': 'fuzzy'}, 1))
+        found += bool(top) and original in top[0].title.lower().split()
+    print(f'  typos whose top fuzzy result has the intended word: {found} of {len(typos)}')
+
+def legacy_get_metadata(versions=None):
+    """get_metadata as it was: four ORM queries on every call"""
+    return {
+        'topics': Topic.query.all(),
+        'tags': Tag.query.all(),
+        'ranks': Rank.query.all(),
+        'collections': Collection.query.all(),
+    }
+
+def bench_metadata(args, rng):
+    reset_database()
+    populate_catalog(args.size, rng)
+    db.session.add(Collection(name='Benchmark collection'))
+    admin = User(username='benchmark-admin', is_admin=True)
+    db.session.add(admin)
+    db.session.commit()
+    print(f'{args.size} lectures')
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+
+    pages = [
+        '/', '/admin/lectures', '/admin/lecture/edit/1', '/admin/metadata',
+        '/admin/collection/1/bulk-add', '/admin/playlist-import', '/admin/video-import',
+    ]
+    # The routes that called Topic.query.all() etc. directly did the same four
+    # queries as the old get_metadata, so patching it in reproduces them all
+    for label, metadata_function in (('before', legacy_get_metadata), ('after', get_metadata)):
+        routes.get_metadata = metadata_function
+        print(f'  {label}')
+        for url in pages:
+            client.get(url)  # warm caches and indexes
+            with StatementRecorder() as recorder:
+                status = client.get(url).status_code
+            print(f'    {url:<32} {status}  {len(recorder.statements):3d} queries')
+    routes.get_metadata = get_metadata
+
+def legacy_reorder(collection_id, lecture_ids):
+    """The reorder routes as they were: load every lecture, then one UPDATE per lecture"""
+    collection = db.session.get(Collection, collection_id)
+    collection_lecture_ids = [lecture.id for lecture in collection.lectures]
+    if not all(int(lid) in collection_lecture_ids for lid in lecture_ids):
+        raise ValueError('Lecture IDs do not match collection content')
+    for position, lecture_id in enumerate(lecture_ids):
+        db.session.execute(
+            collection_lecture.update().
+            where(collection_lecture.c.collection_id == collection_id).
+            where(collection_lecture.c.lecture_id == lecture_id).
+            values(position=position),
+        )
+
+def random_moves(order, count, rng):
+    return [{'lecture_id': rng.choice(order), 'new_position': rng.randrange(len(order))} for _ in range(count)]
+
+def bench_reorder(args, rng):
+    reset_database()
+    populate_catalog(args.items, rng)
+    collection = Collection(name='Benchmark course')
+    db.session.add(collection)
+    db.session.flush()
+    db.session.execute(collection_lecture.insert(), [
+        {'collection_id': collection.id, 'lecture_id': lecture_id, 'position': lecture_id}
+        for lecture_id in range(1, args.items + 1)
+    ])
+    db.session.commit()
+    collection_id = collection.id
+    print(f'{args.items} lectures in one collection, {db.engine.dialect.name}')
+
+    def shuffled(order):
+        rng.shuffle(order)
+        return {'lecture_ids': order}
+
+    def one_drag(order):
+        order.insert(rng.randrange(len(order)), order.pop(rng.randrange(len(order))))
+        return {'lecture_ids': order}
+
+    scenarios = [
+        ('full shuffle', shuffled),
+        ('one drag, full order', one_drag),
+        ('one move as a diff', lambda order: {'moves': random_moves(order, 1, rng)}),
+        ('ten moves as a diff', lambda order: {'moves': random_moves(order, 10, rng)}),
+    ]
+    for label, make_request in scenarios:
+        print(f'  {label}')
+        for name in ('per-row', 'set-based'):
+            if name == 'per-row' and label.endswith('diff'):
+                continue
+            rebalance(collection_id)
+            db.session.commit()
+            latencies, statements, written = [], 0, 0
+            for _ in range(args.repeat):
+                payload = make_request([lecture_id for lecture_id, _ in collection_keys(collection_id)])
+                with StatementRecorder() as recorder:
+                    started = time.perf_counter()
+                    if name == 'per-row':
+                        legacy_reorder(collection_id, payload['lecture_ids'])
+                        written += args.items
+                    else:
+                        written += reorder(collection_id, payload.get('lecture_ids'), payload.get('moves'))
+                    db.session.commit()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                statements += len(recorder.statements)
+            report(name, latencies)
+            print(f'  {"":<32} {statements / args.repeat:6.1f} statements  {written / args.repeat:7.1f} rows written')
+
+def legacy_export():
+    """export_data as it was: ORM objects for everything and a query per membership"""
+    export_data = {'lectures': [], 'topics': [], 'tags': [], 'ranks': [], 'collections': []}
+    for model, key in ((Topic, 'topics'), (Tag, 'tags'), (Rank, 'ranks')):
+        export_data[key] = [{'id': item.id, 'name': item.name} for item in model.query.all()]
+    for collection in Collection.query.all():
+        lecture_positions = []
+        for lecture in collection.lectures:
+            position_data = db.session.query(collection_lecture.c.position).filter(
+                collection_lecture.c.collection_id == collection.id,
+                collection_lecture.c.lecture_id == lecture.id,
+            ).first()
+            lecture_positions.append({'lecture_id': lecture.id, 'position': position_data[0] if position_data else 0})
+        lecture_positions.sort(key=lambda x: x['position'])
+        export_data['collections'].append({
+            'id': collection.id,
+            'name': collection.name,
+            'description': collection.description,
+            'created_at': collection.created_at.isoformat() if collection.created_at else None,
+            'lectures': lecture_positions,
+        })
+    for lecture in Lecture.query.all():
+        export_data['lectures'].append({
+            'id': lecture.id,
+            'title': lecture.title,
+            'youtube_id': lecture.youtube_id,
+            'thumbnail_url': lecture.thumbnail_url,
+            'publish_date': lecture.publish_date.isoformat(),
+            'duration_seconds': lecture.duration_seconds,
+            'rank_id': lecture.rank_id,
+            'topic_ids': [topic.id for topic in lecture.topics],
+            'tag_ids': [tag.id for tag in lecture.tags],
+            'collection_ids': [c.id for c in Collection.query.join(
+                collection_lecture,
+                Collection.id == collection_lecture.c.collection_id,
+            ).filter(collection_lecture.c.lecture_id == lecture.id).all()],
+        })
+    return app.json.response(export_data).get_data()
+
+def populate_collections(args, rng):
+    for index in range(args.collections):
+        collection = Collection(name=f'Course {index}')
+        db.session.add(collection)
+        db.session.flush()
+        members = rng.sample(range(1, args.size + 1), min(args.size, rng.randint(10, 200)))
+        db.session.execute(collection_lecture.insert(), [
+            {'collection_id': collection.id, 'lecture_id': lecture_id, 'position': position * 1024}
+            for position, lecture_id in enumerate(members)
+        ])
+    db.session.commit()
+
+def bench_export(args, rng):
+    reset_database()
+    populate_catalog(args.size, rng)
+    populate_collections(args, rng)
+    print(f'{args.size} lectures, {args.collections} collections')
+
+    for label, export in (
+        ('in-memory', legacy_export),
+        ('streaming', lambda: sum(len(chunk) for chunk in iter_export_json())),
+    ):
+        db.session.expunge_all()
+        tracemalloc.start()
+        with StatementRecorder() as recorder:
+            started = time.perf_counter()
+            export()
+            elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'  {label:<12} {elapsed:7.2f} s  {len(recorder.statements):6d} statements  '
+              f'peak {peak / 2**20:7.1f} MiB')
+
+def legacy_import(document):
+    """import_data as it was: a lookup query and a flush per record"""
+    id_maps = {'topics': {}, 'tags': {}, 'ranks': {}, 'collections': {}, 'lectures': {}}
+    for model, key in ((Topic, 'topics'), (Tag, 'tags'), (Rank, 'ranks')):
+        for data in document[key]:
+            item = model.query.filter_by(name=data['name']).first()
+            if not item:
+                item = model(name=data['name'])
+                db.session.add(item)
+                db.session.flush()
+            id_maps[key][data['id']] = item.id
+    for data in document['collections']:
+        collection = Collection.query.filter_by(name=data['name']).first()
+        if not collection:
+            collection = Collection(name=data['name'], description=data.get('description', ''))
+            db.session.add(collection)
+            db.session.flush()
+        id_maps['collections'][data['id']] = collection.id
+    for data in document['lectures']:
+        lecture = Lecture.query.filter_by(youtube_id=data['youtube_id']).first()
+        if not lecture:
+            lecture = Lecture(
+                title=data['title'],
+                youtube_id=data['youtube_id'],
+                thumbnail_url=data['thumbnail_url'],
+                publish_date=datetime.fromisoformat(data['publish_date']),
+                duration_seconds=data.get('duration_seconds', 0),
+                rank_id=id_maps['ranks'].get(data['rank_id']),
+            )
+            db.session.add(lecture)
+            db.session.flush()
+            for topic_id in data['topic_ids']:
+                lecture.topics.append(db.session.get(Topic, id_maps['topics'][topic_id]))
+            for tag_id in data['tag_ids']:
+                lecture.tags.append(db.session.get(Tag, id_maps['tags'][tag_id]))
+        id_maps['lectures'][data['id']] = lecture.id
+    for data in document['collections']:
+        collection = db.session.get(Collection, id_maps['collections'][data['id']])
+        for item in data['lectures']:
+            lecture = db.session.get(Lecture, id_maps['lectures'][item['lecture_id']])
+            if lecture not in collection.lectures:
+                collection.lectures.append(lecture)
+            db.session.execute(
+                collection_lecture.update().
+                where(collection_lecture.c.collection_id == collection.id).
+                where(collection_lecture.c.lecture_id == lecture.id).
+                values(position=item['position']),
+            )
+    db.session.commit()
+
+def bench_import(args, rng):
+    reset_database()
+    populate_catalog(args.size, rng)
+    populate_collections(args, rng)
+    document = json.loads(''.join(iter_export_json()))
+    rows = sum(len(document[key]) for key in ('topics', 'tags', 'ranks', 'collections', 'lectures'))
+    rows += sum(len(lecture['topic_ids']) + len(lecture['tag_ids']) for lecture in document['lectures'])
+    rows += sum(len(collection['lectures']) for collection in document['collections'])
+    print(f'{args.size} lectures, {args.collections} collections, {rows} rows')
+
+    for label, run in (
+        ('per-record', legacy_import),
+        ('bulk', lambda document: CatalogImporter().import_document(document)),
+    ):
+        reset_database()
+        db.session.expunge_all()
+        with StatementRecorder() as recorder:
+            started = time.perf_counter()
+            run(document)
+            elapsed = time.perf_counter() - started
+        print(f'  {label:<12} {elapsed:7.2f} s  {len(recorder.statements):6d} statements  '
+              f'{rows / elapsed:9.0f} rows/s')
+
+    # Importing into a full database only finds existing keys
+    report = CatalogImporter(dry_run=True).import_document(document)
+    print(f'  dry run over the imported catalog: {report.seconds:.2f} s, {report.rows_written} rows to write')
+
+def legacy_playlist(base_url, api_key, playlist_id):
+    """fetch_playlist_videos as it was: a new connection per call, pages one after another"""
+    video_ids, token = [], None
+    while True:
+        url = f'{base_url}/playlistItems?part=snippet,contentDetails&maxResults=50&playlistId={playlist_id}'
+        url += f'&key={api_key}'
+        if token:
+            url += f'&pageToken={token}'
+        data = requests.get(url).json()
+        ids = [item['contentDetails']['videoId'] for item in data['items']]
+        requests.get(f'{base_url}/videos?part=contentDetails,snippet&id={",".join(ids)}&key={api_key}').json()
+        video_ids.extend(ids)
+        token = data.get('nextPageToken')
+        if not token:
+            return video_ids
+
+def legacy_details(base_url, api_key, video_ids):
+    """The metadata refresh as it was: one videos.list call at a time"""
+    found = 0
+    for start in range(0, len(video_ids), 50):
+        ids = ','.join(video_ids[start:start + 50])
+        url = f'{base_url}/videos?part=contentDetails,snippet&id={ids}&key={api_key}'
+        found += len(requests.get(url).json()['items'])
+    return found
+
+def bench_youtube(args, rng):
+    server = FakeYouTubeServer(video_count=args.videos, latency=args.latency).start()
+    client = YouTubeClient(server.url)
+    video_ids = [f'v{index:010d}' for index in rng.sample(range(args.videos * 10), args.videos * 4)]
+    print(f'{args.videos} playlist videos, {len(video_ids)} lectures to refresh, {args.latency * 1000:.0f} ms per call')
+    try:
+        for label, run in (
+            ('playlist, sequential', lambda: legacy_playlist(server.url, 'key', 'PL')),
+            ('playlist, client', lambda: [video for page in client.iter_playlist('key', 'PL') for video in page.items]),
+            ('details, sequential', lambda: legacy_details(server.url, 'key', video_ids)),
+            ('details, client', lambda: client.videos('key', video_ids)),
+        ):
+            server.calls.clear()
+            server.connections = 0
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            print(f'  {label:<22} {elapsed:7.2f} s  {sum(server.calls.values()):5d} calls  '
+                  f'{server.connections:5d} connections')
+    finally:
+        client.close()
+        server.stop()
+
+def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = random.Random(ARGS.seed)
+    benchmarks = {
+        'search': bench_search,
+        'two-phase': bench_two_phase,
+        'suggest': bench_suggest,
+        'fuzzy': bench_fuzzy,
+        'metadata': bench_metadata,
+        'reorder': bench_reorder,
+        'export': bench_export,
+        'import': bench_import,
+        'youtube': bench_youtube,
+    }
+    with app.app_context():
+        benchmarks[ARGS.benchmark](ARGS, rng)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Caches for computed responses.
+
+`LRUCache` lives in the worker process. `FileSystemCache` keeps entries as
+files in a shared directory, so every gunicorn worker on the host sees the
+same entries. Both count hits and misses; `create_cache()` picks a backend by
+name or by dotted path to any class with the same interface.
+"""
+import hashlib
+import importlib
+import logging
+import os
+import pickle
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+def private_temp_dir(name):
+    """Directory `name` under the system temp directory, for the current user only.
+
+    The user ID is part of the name so users on one host never share it.
+    Raises RuntimeError if it already exists but is not a directory of this
+    user closed to everyone else, since its files are loaded as trusted.
+    """
+    path = os.path.join(tempfile.gettempdir(), f'{name}-{os.getuid()}')
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f'{path} is not a private directory of this user')
+    return path
+
+class CacheStats:
+    """Hit, miss and eviction counters for one cache in this process"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def as_dict(self, size):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'size': size,
+        }
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional time-to-live per entry"""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return default
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                self._stats.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return self._stats.as_dict(len(self))
+
+    def __len__(self):
+        return len(self._data)
+
+class FileSystemCache:
+    """Cache shared between processes through pickled files in one directory.
+
+    Without a `directory`, a private one under the temp directory is used:
+    entries are unpickled, so nobody else may be able to write there.
+
+    Reads refresh a file's modification time. Every 64 writes the directory is
+    pruned back to `maxsize` files, least recently used first.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, directory=None, namespace='cache'):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.directory = os.path.join(directory or private_temp_dir('baduktube-cache'), namespace)
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self._stats = CacheStats()
+        self._writes = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest())
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                stored_key, value, expires = pickle.load(f)
+            if stored_key != key or (expires is not None and expires < time.time()):
+                raise KeyError(key)
+            os.utime(path)
+        except (OSError, EOFError, KeyError, pickle.UnpicklingError):
+            self._stats.misses += 1
+            return default
+        self._stats.hits += 1
+        return value
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        path = self._path(key)
+        # Write to a temporary file and rename, so readers never see half an entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((key, value, expires), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning('Could not write cache entry to %s: %s', self.directory, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._writes += 1
+        if self._writes % 64 == 0:
+            self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _entries(self):
+        with os.scandir(self.directory) as entries:
+            return [entry for entry in entries if entry.is_file() and not entry.name.startswith('.')]
+
+    def _prune(self):
+        """Remove the least recently used files beyond maxsize"""
+        entries = self._entries()
+        if len(entries) <= self.maxsize:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.maxsize]:
+            try:
+                os.remove(entry.path)
+                self._stats.evictions += 1
+            except OSError:
+                pass
+
+    def clear(self):
+        for entry in self._entries():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stats(self):
+        return self._stats.as_dict(len(self))
+
+    def __len__(self):
+        return len(self._entries())
+
+CACHE_BACKENDS = {
+    'local': LRUCache,
+    'filesystem': FileSystemCache,
+}
+
+def create_cache(backend='local', maxsize=1024, ttl=None, **options):
+    """Cache from a backend name in CACHE_BACKENDS or a 'module:Class' path.
+
+    Extra options (such as the shared `directory` and `namespace`) are only
+    passed to backends other than the in-process one.
+    """
+    if backend in CACHE_BACKENDS:
+        cache_class = CACHE_BACKENDS[backend]
+    else:
+        module_name, _, class_name = backend.partition(':')
+        cache_class = getattr(importlib.import_module(module_name), class_name)
+    if cache_class is LRUCache:
+        return LRUCache(maxsize=maxsize, ttl=ttl)
+    return cache_class(maxsize=maxsize, ttl=ttl, **options)
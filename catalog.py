@@ -0,0 +1,199 @@
+"""
+Catalog change tracking.
+
+Every commit that writes to a catalog table bumps that table's counter in
+catalog_version, inside the same transaction. In-process indexes and caches
+compare these counters with the ones they were built from, which keeps them
+correct across gunicorn workers without any route having to remember to
+invalidate anything.
+"""
+import hashlib
+import logging
+import re
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import app, db
+from models import CatalogVersion
+
+CATALOG_TABLES = (
+    'lecture', 'topic', 'tag', 'rank', 'collection',
+    'lecture_topic', 'lecture_tag', 'collection_lecture',
+)
+
+# Target table of INSERT / UPDATE / DELETE statements run through the session
+WRITE_TARGET = re.compile(r'\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+"?(\w+)"?', re.IGNORECASE)
+
+def init_catalog_versions():
+    """Make sure every catalog table has a version row"""
+    existing = {row.table_name for row in CatalogVersion.query.all()}
+    for table_name in CATALOG_TABLES:
+        if table_name not in existing:
+            db.session.add(CatalogVersion(table_name=table_name, version=0))
+    db.session.commit()
+
+def get_catalog_state():
+    """Current version and last change time of every catalog table"""
+    rows = db.session.query(CatalogVersion.table_name, CatalogVersion.version, CatalogVersion.updated_at)
+    return {row.table_name: (row.version, row.updated_at) for row in rows}
+
+def get_versions():
+    """Current version of every catalog table, as a dict"""
+    return {table_name: version for table_name, (version, _) in get_catalog_state().items()}
+
+def catalog_validators(tables, *parts):
+    """Versions, strong ETag and Last-Modified time for a response built from `tables`.
+
+    The ETag covers the versions of those tables plus any other `parts` the
+    response depends on, so it can be checked before anything is rendered.
+    """
+    state = get_catalog_state()
+    versions = {table_name: version for table_name, (version, _) in state.items()}
+    key = repr((tuple(versions.get(table) for table in tables), parts))
+    etag = hashlib.sha1(key.encode()).hexdigest()
+    changed = [state[table][1] for table in tables if table in state and state[table][1]]
+    last_modified = max(changed).replace(tzinfo=timezone.utc) if changed else None
+    return versions, etag, last_modified
+
+def _pending(session):
+    return session.info.setdefault('catalog_writes', set())
+
+def record_writes(session, *tables):
+    """Count writes the session events cannot see, such as a COPY on the raw connection"""
+    _pending(session).update(tables)
+
+def _tables_written_by(obj, deleted=False):
+    """Catalog tables touched by flushing an ORM object"""
+    state = inspect(obj)
+    mapper = state.mapper
+    tables = set()
+    if deleted or state.pending or any(state.attrs[c.key].history.has_changes() for c in mapper.column_attrs):
+        tables.add(mapper.local_table.name)
+    for relationship in mapper.relationships:
+        if relationship.secondary is not None and (deleted or state.attrs[relationship.key].history.has_changes()):
+            tables.add(relationship.secondary.name)
+    return tables
+
+@event.listens_for(Session, 'before_flush')
+def _record_flushed_writes(session, flush_context, instances):
+    pending = _pending(session)
+    for obj in session.new | session.dirty:
+        pending.update(_tables_written_by(obj))
+    for obj in session.deleted:
+        pending.update(_tables_written_by(obj, deleted=True))
+
+def _statement_targets(statement):
+    """Tables written by a statement passed to session.execute()"""
+    table = getattr(statement, 'table', None)
+    if table is not None and hasattr(table, 'name'):
+        return {table.name}
+    # Raw SQL from db.text()
+    return set(WRITE_TARGET.findall(getattr(statement, 'text', '')))
+
+@event.listens_for(Session, 'do_orm_execute')
+def _record_executed_writes(orm_execute_state):
+    if not orm_execute_state.is_select:
+        _pending(orm_execute_state.session).update(_statement_targets(orm_execute_state.statement))
+
+@event.listens_for(Session, 'before_commit')
+def _bump_versions(session):
+    # Flush now so writes still pending in the session are recorded
+    session.flush()
+    tables = sorted(set(CATALOG_TABLES) & session.info.pop('catalog_writes', set()))
+    if tables:
+        session.execute(
+            db.update(CatalogVersion).
+            where(CatalogVersion.table_name.in_(tables)).
+            values(version=CatalogVersion.version + 1, updated_at=datetime.utcnow()),
+        )
+        # The bump itself is not a catalog write
+        session.info.pop('catalog_writes', None)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_writes(session):
+    session.info.pop('catalog_writes', None)
+
+class CatalogIndex:
+    """Base for in-process indexes built from catalog tables.
+
+    Subclasses list the `tables` they are built from and implement `build()`.
+    A snapshot is served while its build versions match the catalog; once they
+    drift a rebuild starts in a background thread and `snapshot()` returns None
+    so callers fall back to SQL until the index is warm again. Callers with no
+    SQL fallback use `latest()`, which serves the stale snapshot meanwhile.
+    """
+    tables = CATALOG_TABLES
+    name = 'index'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._built_versions = None
+        self._building = False
+
+    def build(self):
+        raise NotImplementedError
+
+    def versions_key(self, versions):
+        """The versions of this index's tables, for use in cache keys"""
+        return tuple(versions.get(table) for table in self.tables)
+
+    def snapshot(self, versions=None):
+        """The current snapshot, or None (and a background rebuild) if stale"""
+        versions = get_versions() if versions is None else versions
+        snapshot = self._snapshot
+        if snapshot is not None and self._built_versions == self.versions_key(versions):
+            return snapshot
+        self.refresh_async()
+        return None
+
+    def latest(self):
+        """(snapshot, its build versions), stale or not.
+
+        A stale snapshot is served while a background rebuild runs. Only a
+        cold index is built in the caller's thread, once, with concurrent
+        callers waiting for that build.
+        """
+        with self._lock:
+            if self._snapshot is None:
+                self._built_versions, self._snapshot = self._build_versioned()
+            snapshot, built_versions = self._snapshot, self._built_versions
+        if built_versions != self.versions_key(get_versions()):
+            self.refresh_async()
+        return snapshot, built_versions
+
+    def _build_versioned(self):
+        # Read versions before data, so a concurrent write can only make the
+        # snapshot newer than its versions and trigger one extra rebuild
+        versions = self.versions_key(get_versions())
+        return versions, self.build()
+
+    def refresh(self):
+        """Rebuild the index synchronously"""
+        versions, snapshot = self._build_versioned()
+        with self._lock:
+            self._snapshot = snapshot
+            self._built_versions = versions
+        return snapshot
+
+    def refresh_async(self):
+        """Rebuild the index in a background thread, unless one is running"""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._refresh_in_background, name=f'{self.name}-refresh', daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            with app.app_context():
+                self.refresh()
+                logging.info('Rebuilt %s', self.name)
+        except Exception as e:
+            logging.error('Error rebuilding %s: %s', self.name, e)
+        finally:
+            with self._lock:
+                self._building = False
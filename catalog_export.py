@@ -0,0 +1,171 @@
+"""
+Streaming full-catalog export.
+
+Writes the same JSON document /admin/export always produced, but piece by
+piece: every table is read once through a server-side cursor, and the
+association tables are read sorted by their parent ID and merged into the
+parent rows as they stream past, so memory use does not grow with the
+catalog and no query is run per lecture or collection.
+
+The same records can also be written as gzip-compressed NDJSON: a header
+line with the format version, then per table a section line followed by one
+record per line, tables in the order an import needs them.
+"""
+import json
+import zlib
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+
+from app import db
+from models import Collection, Lecture, Rank, Tag, Topic, collection_lecture, lecture_tag, lecture_topic
+
+# Rows fetched per round trip from the server-side cursors
+EXPORT_BATCH_SIZE = 1000
+
+# Flush the generator output once this many characters are buffered
+CHUNK_SIZE = 64 * 1024
+
+# Header of line-delimited exports; bump the version when records change shape
+EXPORT_FORMAT = 'baduk-catalog'
+EXPORT_FORMAT_VERSION = 1
+
+def stream_rows(statement):
+    """Rows of a select, fetched EXPORT_BATCH_SIZE at a time from a server-side cursor"""
+    return db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+def grouped_children(rows):
+    """Lookup for rows sorted by their first column.
+
+    Returns a function giving the remaining columns of the rows for a key;
+    keys must be asked for in ascending order, like a merge join.
+    """
+    groups = groupby(rows, key=itemgetter(0))
+    current = next(groups, None)
+
+    def take(key):
+        nonlocal current
+        while current is not None and current[0] < key:
+            current = next(groups, None)
+        if current is None or current[0] != key:
+            return []
+        children = [tuple(row)[1:] for row in current[1]]
+        current = next(groups, None)
+        return children
+
+    return take
+
+def iter_named(model):
+    for row in stream_rows(db.select(model.id, model.name).order_by(model.id)):
+        yield {'id': row.id, 'name': row.name}
+
+def iter_collections():
+    lectures_of = grouped_children(stream_rows(
+        db.select(collection_lecture.c.collection_id, collection_lecture.c.lecture_id, collection_lecture.c.position).
+        where(collection_lecture.c.collection_id.isnot(None)).
+        order_by(collection_lecture.c.collection_id, collection_lecture.c.position, collection_lecture.c.lecture_id),
+    ))
+    collections = stream_rows(db.select(
+        Collection.id, Collection.name, Collection.description, Collection.created_at,
+    ).order_by(Collection.id))
+    for row in collections:
+        yield {
+            'id': row.id,
+            'name': row.name,
+            'description': row.description,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'lectures': [
+                {'lecture_id': lecture_id, 'position': position or 0}
+                for lecture_id, position in lectures_of(row.id)
+            ],
+        }
+
+def iter_lectures():
+    def children(table, column):
+        take = grouped_children(stream_rows(
+            db.select(table.c.lecture_id, column).
+            where(table.c.lecture_id.isnot(None)).
+            order_by(table.c.lecture_id, column),
+        ))
+        return lambda lecture_id: [value for (value,) in take(lecture_id)]
+
+    topics_of = children(lecture_topic, lecture_topic.c.topic_id)
+    tags_of = children(lecture_tag, lecture_tag.c.tag_id)
+    collections_of = children(collection_lecture, collection_lecture.c.collection_id)
+    lectures = stream_rows(db.select(
+        Lecture.id,
+        Lecture.title,
+        Lecture.youtube_id,
+        Lecture.thumbnail_url,
+        Lecture.publish_date,
+        Lecture.duration_seconds,
+        Lecture.rank_id,
+    ).order_by(Lecture.id))
+    for row in lectures:
+        yield {
+            'id': row.id,
+            'title': row.title,
+            'youtube_id': row.youtube_id,
+            'thumbnail_url': row.thumbnail_url,
+            'publish_date': row.publish_date.isoformat() if row.publish_date else None,
+            'duration_seconds': row.duration_seconds,
+            'rank_id': row.rank_id,
+            'topic_ids': topics_of(row.id),
+            'tag_ids': tags_of(row.id),
+            'collection_ids': collections_of(row.id),
+        }
+
+# Sections of the export document, in the order jsonify's sorted keys put them
+EXPORT_SECTIONS = {
+    'collections': iter_collections,
+    'lectures': iter_lectures,
+    'ranks': lambda: iter_named(Rank),
+    'tags': lambda: iter_named(Tag),
+    'topics': lambda: iter_named(Topic),
+}
+
+def iter_export_json():
+    """The export document as chunks of JSON text"""
+    buffer, size = ['{'], 1
+    for index, (section, records) in enumerate(EXPORT_SECTIONS.items()):
+        buffer.append(f'{"," if index else ""}{json.dumps(section)}:[')
+        for count, record in enumerate(records()):
+            text = json.dumps(record, sort_keys=True, separators=(',', ':'))
+            buffer.append(f',{text}' if count else text)
+            size += len(text) + 1
+            if size >= CHUNK_SIZE:
+                yield ''.join(buffer)
+                buffer, size = [], 0
+        buffer.append(']')
+    buffer.append('}\n')
+    yield ''.join(buffer)
+
+def iter_export_ndjson():
+    """The export as NDJSON text chunks, sections in import order"""
+    header = {'format': EXPORT_FORMAT, 'version': EXPORT_FORMAT_VERSION, 'exported_at': datetime.utcnow().isoformat()}
+    buffer, size = [json.dumps(header) + '\n'], 0
+    for section in ('topics', 'tags', 'ranks', 'collections', 'lectures'):
+        buffer.append(json.dumps({'section': section}) + '\n')
+        for record in EXPORT_SECTIONS[section]():
+            text = json.dumps(record, separators=(',', ':')) + '\n'
+            buffer.append(text)
+            size += len(text)
+            if size >= CHUNK_SIZE:
+                yield ''.join(buffer)
+                buffer, size = [], 0
+    yield ''.join(buffer)
+
+def iter_export_gzip():
+    """The NDJSON export as gzip-compressed bytes"""
+    # wbits=31 writes the gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in iter_export_ndjson():
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def write_export(file):
+    """Write the export document to a text file"""
+    for chunk in iter_export_json():
+        file.write(chunk)
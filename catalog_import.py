@@ -0,0 +1,549 @@
+"""
+Bulk import of catalog data.
+
+`CatalogImporter` takes records section by section (topics, tags, ranks,
+collections, lectures and the association tables) and writes them in
+batches. The existing keys of every table it touches are loaded once into
+dicts, new rows go in with multi-row INSERT ... RETURNING, association rows
+with executemany (COPY on PostgreSQL), and the work is committed every
+`commit_every` rows. A dry run goes through the same steps without writing
+and reports what would change.
+
+Full exports are imported with remapped IDs, matching existing topics, tags,
+ranks and collections by name and lectures by YouTube ID. Single-table
+imports (`remap_ids=False`) keep the IDs in association rows as they are.
+
+`import_videos()` adds a batch of YouTube videos (from the playlist import
+wizard) the same way, in one transaction.
+
+Uploads are read with `read_import_sections()`, which takes the gzip NDJSON
+export line by line and hands records over in chunks, and still reads the
+older single JSON documents whole.
+"""
+import csv
+import gzip
+import io
+import json
+import logging
+import time
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime
+
+from app import db
+from catalog import record_writes
+from catalog_export import EXPORT_FORMAT, EXPORT_FORMAT_VERSION
+from collection_order import POSITION_GAP, apply_positions
+from db_utils import get_metadata
+from models import Collection, Lecture, Rank, Tag, Topic, collection_lecture, lecture_tag, lecture_topic
+
+# Rows per INSERT batch
+IMPORT_BATCH_SIZE = 1000
+
+# Rows written between commits; None keeps the whole import in one transaction
+IMPORT_COMMIT_EVERY = 20000
+
+# New keys listed per section in a dry run report
+DIFF_SAMPLE_SIZE = 5
+
+NAMED_MODELS = {'topics': Topic, 'tags': Tag, 'ranks': Rank, 'collections': Collection}
+
+# Association sections of single-table exports: table, its columns, and the
+# sections the columns point to
+ASSOCIATIONS = {
+    'lecture_topics': (lecture_topic, ('lecture_id', 'topic_id'), ('lectures', 'topics')),
+    'lecture_tags': (lecture_tag, ('lecture_id', 'tag_id'), ('lectures', 'tags')),
+    'collection_lectures': (collection_lecture, ('collection_id', 'lecture_id'), ('collections', 'lectures')),
+}
+
+# Order a full export is imported in, so every reference resolves
+SECTION_ORDER = ('topics', 'tags', 'ranks', 'collections', 'lectures', 'lecture_topics', 'lecture_tags',
+                 'collection_lectures')
+
+def parse_datetime(value, default=None):
+    return datetime.fromisoformat(value) if value else default
+
+def open_import_text(stream):
+    """Text reader over an uploaded file, decompressing it if it is gzipped"""
+    magic = stream.read(2)
+    stream.seek(0)
+    if magic == b'\x1f\x8b':
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    return io.TextIOWrapper(stream, encoding='utf-8')
+
+def read_import_sections(stream, chunk_size=IMPORT_BATCH_SIZE):
+    """(section, records) chunks of an uploaded export, in file order.
+
+    NDJSON exports are parsed a line at a time; every section yields at least
+    one chunk, even when empty. Raises ValueError for a newer format version
+    or a malformed file.
+    """
+    text = open_import_text(stream)
+    first = text.readline()
+    try:
+        header = json.loads(first)
+    except ValueError:
+        # An indented JSON document does not fit on its first line
+        header = None
+
+    if not isinstance(header, dict) or header.get('format') != EXPORT_FORMAT:
+        # Single JSON document of the older exports, read whole
+        rest = text.read()
+        document = json.loads(first + rest) if header is None or rest.strip() else header
+        if not isinstance(document, dict):
+            raise ValueError('Import file is not an export document')
+        for section in SECTION_ORDER:
+            records = document.get(section)
+            if records is not None:
+                for start in range(0, max(len(records), 1), chunk_size):
+                    yield section, records[start:start + chunk_size]
+        return
+
+    if header.get('version', 0) > EXPORT_FORMAT_VERSION:
+        raise ValueError(f"Export format version {header['version']} is newer than this version of the app reads")
+    section, chunk = None, []
+    for number, line in enumerate(text, start=2):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if set(record) == {'section'}:
+            if section is not None:
+                yield section, chunk
+            section, chunk = record['section'], []
+        elif section is None:
+            raise ValueError(f'Line {number} comes before the first section line')
+        else:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield section, chunk
+                chunk = []
+    if section is not None:
+        yield section, chunk
+
+class ImportReport:
+    """Per-section counts, timing and (for dry runs) samples of new keys"""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.counts = defaultdict(Counter)
+        self.samples = defaultdict(list)
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def count(self, section, outcome, amount=1):
+        self.counts[section][outcome] += amount
+
+    def sample(self, section, key):
+        if len(self.samples[section]) < DIFF_SAMPLE_SIZE:
+            self.samples[section].append(key)
+
+    @property
+    def rows_written(self):
+        return sum(counts['inserted'] + counts['updated'] for counts in self.counts.values())
+
+    @property
+    def seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows_written / self.seconds if self.seconds else 0.0
+
+    def inserted(self, section):
+        return self.counts[section]['inserted']
+
+    def as_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'sections': {section: dict(counts) for section, counts in self.counts.items()},
+            'samples': dict(self.samples),
+            'rows_written': self.rows_written,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+    def summary(self):
+        """One line for a flash message"""
+        parts = []
+        for section, counts in self.counts.items():
+            details = ', '.join(f'{amount} {outcome}' for outcome, amount in counts.items() if amount)
+            if self.dry_run and self.samples[section]:
+                details += f" (e.g. {', '.join(str(key) for key in self.samples[section])})"
+            parts.append(f'{section}: {details}')
+        if self.dry_run:
+            return 'Dry run, nothing was written. Would import ' + ('; '.join(parts) or 'nothing')
+        return (f'Imported {self.rows_written} rows in {self.seconds:.1f} s '
+                f'({self.rows_per_second:.0f} rows/s). ' + '; '.join(parts))
+
+class CatalogImporter:
+    """Batched importer for catalog records, fed one section at a time with `add()`"""
+
+    def __init__(self, remap_ids=True, dry_run=False, batch_size=IMPORT_BATCH_SIZE,
+                 commit_every=IMPORT_COMMIT_EVERY):
+        self.remap_ids = remap_ids
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.commit_every = commit_every
+        self.report = ImportReport(dry_run)
+        # Existing natural keys per section (name or YouTube ID -> ID), loaded on first use
+        self._keys = {}
+        # Existing IDs and association pairs, for single-table imports
+        self._ids = {}
+        self._pairs = {}
+        # Exported ID -> ID in this database, per section
+        self.id_maps = defaultdict(dict)
+        # New rows per section, by natural key: (row, exported IDs, extra)
+        self._pending = defaultdict(dict)
+        self._links = defaultdict(list)
+        self._memberships = []
+        self._uncommitted = 0
+        self._fake_ids = 0
+
+    # Loading existing keys
+
+    def keys(self, section):
+        if section not in self._keys:
+            if section == 'lectures':
+                query = db.session.query(Lecture.youtube_id, Lecture.id)
+            else:
+                model = NAMED_MODELS[section]
+                query = db.session.query(model.name, model.id)
+            self._keys[section] = dict(query)
+        return self._keys[section]
+
+    def existing_ids(self, section):
+        if section not in self._ids:
+            model = Lecture if section == 'lectures' else NAMED_MODELS[section]
+            self._ids[section] = {row[0] for row in db.session.query(model.id)}
+        return self._ids[section]
+
+    def existing_pairs(self, table):
+        """{(first, second): position or None} of an association table"""
+        if table.name not in self._pairs:
+            first, second = (table.c.collection_id, table.c.lecture_id) if table is collection_lecture else \
+                (table.c.lecture_id, table.c.topic_id if table is lecture_topic else table.c.tag_id)
+            position = table.c.position if table is collection_lecture else db.null()
+            self._pairs[table.name] = {(row[0], row[1]): row[2] for row in db.session.query(first, second, position)}
+        return self._pairs[table.name]
+
+    # Feeding records
+
+    def add(self, section, records):
+        """Queue records of one section; batches are written as they fill up"""
+        if section in ASSOCIATIONS:
+            self.add_associations(section, records)
+        elif section == 'lectures':
+            self.add_lectures(records)
+        elif section in NAMED_MODELS:
+            self.add_named(section, records)
+        else:
+            logging.warning('Skipping unknown import section %s', section)
+
+    def import_document(self, document):
+        """Import a whole export document (a dict of sections) and finish"""
+        for section in SECTION_ORDER:
+            if section in document:
+                self.add(section, document[section])
+        return self.finish()
+
+    def import_file(self, stream):
+        """Import an uploaded export file chunk by chunk and finish"""
+        for section, records in read_import_sections(stream, self.batch_size):
+            self.add(section, records)
+        return self.finish()
+
+    def add_named(self, section, records):
+        keys = self.keys(section)
+        pending = self._pending[section]
+        for record in records:
+            name = record['name']
+            if name in keys:
+                self.id_maps[section][record.get('id')] = keys[name]
+                self.report.count(section, 'existing')
+            elif name in pending:
+                pending[name][1].append(record.get('id'))
+            else:
+                row = {'name': name}
+                if section == 'collections':
+                    row['description'] = record.get('description', '')
+                    row['created_at'] = parse_datetime(record.get('created_at'), datetime.utcnow())
+                pending[name] = (row, [record.get('id')], None)
+                if len(pending) >= self.batch_size:
+                    self.flush(section)
+            if section == 'collections' and self.remap_ids:
+                self._queue_memberships(record)
+
+    def _queue_memberships(self, record):
+        if 'lectures' in record:
+            # Current format, with positions
+            for item in record['lectures']:
+                self._memberships.append((record['id'], item['lecture_id'], item.get('position', 0)))
+        elif 'lecture_ids' in record:
+            # Old format, ordered without positions
+            for position, lecture_id in enumerate(record['lecture_ids']):
+                self._memberships.append((record['id'], lecture_id, position))
+
+    def add_lectures(self, records):
+        if self.remap_ids:
+            # Topic, tag and rank IDs have to be known before lectures refer to them
+            for section in ('topics', 'tags', 'ranks'):
+                self.flush(section)
+        keys = self.keys('lectures')
+        pending = self._pending['lectures']
+        rank_map = self.id_maps['ranks']
+        for record in records:
+            youtube_id = record['youtube_id']
+            if youtube_id in keys:
+                self.id_maps['lectures'][record.get('id')] = keys[youtube_id]
+                self.report.count('lectures', 'existing')
+                continue
+            if youtube_id in pending:
+                pending[youtube_id][1].append(record.get('id'))
+                continue
+            rank_id = record.get('rank_id')
+            if self.remap_ids:
+                rank_id = rank_map.get(rank_id) if rank_id else None
+            row = {
+                'title': record['title'],
+                'youtube_id': youtube_id,
+                'thumbnail_url': record.get('thumbnail_url'),
+                'publish_date': parse_datetime(record.get('publish_date')),
+                'duration_seconds': record.get('duration_seconds', 0),
+                'rank_id': rank_id,
+            }
+            links = (record.get('topic_ids', []), record.get('tag_ids', [])) if self.remap_ids else None
+            pending[youtube_id] = (row, [record.get('id')], links)
+            if len(pending) >= self.batch_size:
+                self.flush('lectures')
+
+    def add_associations(self, section, records):
+        """Rows of a single-table association export, with IDs as they are"""
+        table, columns, targets = ASSOCIATIONS[section]
+        pairs = self.existing_pairs(table)
+        first_ids, second_ids = (self.existing_ids(target) for target in targets)
+        for record in records:
+            pair = (record[columns[0]], record[columns[1]])
+            if pair in pairs:
+                self.report.count(section, 'existing')
+            elif pair[0] not in first_ids or pair[1] not in second_ids:
+                self.report.count(section, 'skipped')
+            else:
+                pairs[pair] = record.get('position')
+                row = dict(zip(columns, pair))
+                if table is collection_lecture:
+                    row['position'] = record.get('position', 0)
+                self._queue_link(section, table, row)
+
+    def _queue_link(self, section, table, row):
+        links = self._links[table.name]
+        links.append(row)
+        self.report.count(section, 'inserted')
+        if self.dry_run:
+            self.report.sample(section, tuple(row.values()))
+        if len(links) >= self.batch_size:
+            self.flush_links(table)
+
+    # Writing
+
+    def flush(self, section):
+        """Insert the pending new rows of a section and record their IDs"""
+        # Taken out of the dict callers keep adding to, not replaced
+        pending = dict(self._pending[section])
+        self._pending[section].clear()
+        if not pending:
+            return
+        model = Lecture if section == 'lectures' else NAMED_MODELS[section]
+        key_column = Lecture.youtube_id if section == 'lectures' else model.name
+        rows = [row for row, _, _ in pending.values()]
+        if self.dry_run:
+            new_ids = {}
+            for key in pending:
+                self._fake_ids -= 1
+                new_ids[key] = self._fake_ids
+                self.report.sample(section, key)
+        else:
+            result = db.session.execute(db.insert(model).returning(model.id, key_column), rows)
+            new_ids = {key: new_id for new_id, key in result}
+        self.report.count(section, 'inserted', len(rows))
+
+        keys = self.keys(section)
+        for key, (_, exported_ids, links) in pending.items():
+            new_id = new_ids[key]
+            keys[key] = new_id
+            for exported_id in exported_ids:
+                self.id_maps[section][exported_id] = new_id
+            if links:
+                self._link_lecture(new_id, *links)
+        self._wrote(len(rows))
+
+    def _link_lecture(self, lecture_id, topic_ids, tag_ids):
+        for section, target, exported_ids in (
+            ('lecture_topics', 'topics', topic_ids),
+            ('lecture_tags', 'tags', tag_ids),
+        ):
+            table, columns, _ = ASSOCIATIONS[section]
+            id_map = self.id_maps[target]
+            for exported_id in dict.fromkeys(exported_ids):
+                if exported_id in id_map:
+                    self._queue_link(section, table, {'lecture_id': lecture_id, columns[1]: id_map[exported_id]})
+
+    def flush_links(self, table):
+        """Insert the pending rows of an association table"""
+        rows = self._links.pop(table.name, [])
+        if not rows or self.dry_run:
+            return
+        columns = list(rows[0])
+        if db.engine.dialect.name == 'postgresql':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([row[column] for column in columns] for row in rows)
+            buffer.seek(0)
+            cursor = db.session.connection().connection.cursor()
+            cursor.copy_expert(f'COPY {table.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+            record_writes(db.session, table.name)
+        else:
+            db.session.execute(table.insert(), rows)
+        self._wrote(len(rows))
+
+    def _flush_memberships(self):
+        """Add lectures to collections from the collection records of a full export"""
+        pairs = self.existing_pairs(collection_lecture)
+        collection_map, lecture_map = self.id_maps['collections'], self.id_maps['lectures']
+        moved = defaultdict(list)
+        for exported_collection, exported_lecture, position in self._memberships:
+            if exported_collection not in collection_map or exported_lecture not in lecture_map:
+                self.report.count('collection_lectures', 'skipped')
+                continue
+            pair = (collection_map[exported_collection], lecture_map[exported_lecture])
+            if pair not in pairs:
+                pairs[pair] = position
+                self._queue_link('collection_lectures', collection_lecture, {
+                    'collection_id': pair[0], 'lecture_id': pair[1], 'position': position,
+                })
+            elif pairs[pair] != position:
+                # Already in the collection: take the exported position
+                pairs[pair] = position
+                moved[pair[0]].append((pair[1], position))
+                self.report.count('collection_lectures', 'updated')
+            else:
+                self.report.count('collection_lectures', 'existing')
+        self._memberships = []
+        if not self.dry_run:
+            for collection_id, changes in moved.items():
+                self._wrote(apply_positions(collection_id, changes))
+
+    def _wrote(self, rows):
+        self._uncommitted += rows
+        if self.commit_every and not self.dry_run and self._uncommitted >= self.commit_every:
+            db.session.commit()
+            self._uncommitted = 0
+
+    def finish(self):
+        """Write everything still pending, commit and return the report"""
+        for section in ('topics', 'tags', 'ranks', 'collections', 'lectures'):
+            self.flush(section)
+        if self._memberships:
+            self._flush_memberships()
+        for table in (lecture_topic, lecture_tag, collection_lecture):
+            self.flush_links(table)
+        if self.dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        self.report.finished = time.perf_counter()
+        logging.info('Import finished: %s', self.report.as_dict())
+        return self.report
+
+VideoImportResult = namedtuple('VideoImportResult', ['inserted', 'skipped', 'failed'])
+
+def _int_ids(values):
+    return [int(value) for value in values if str(value).strip()]
+
+def import_videos(videos, defaults, overrides=None):
+    """Add playlist videos as lectures in one transaction.
+
+    `defaults` holds the `rank`, `topic`, `tags` and `collections` applied to
+    every video; `overrides` maps a video ID to the ones that differ for it.
+    Existing YouTube IDs are looked up with one IN query and skipped. New
+    lectures are appended to their collections in playlist order. Returns
+    (video, reason) lists of inserted, skipped and failed videos.
+    """
+    overrides = overrides or {}
+    metadata = get_metadata()
+    known = {section: {item.id for item in metadata[section]} for section in ('ranks', 'topics', 'tags', 'collections')}
+    inserted, skipped, failed = [], [], []
+
+    video_ids = [video['video_id'] for video in videos]
+    existing = set(db.session.scalars(db.select(Lecture.youtube_id).where(Lecture.youtube_id.in_(video_ids))))
+
+    rows, links = [], {}
+    for video in videos:
+        if video['video_id'] in existing:
+            skipped.append((video, 'already in the catalog'))
+            continue
+        if video.get('error'):
+            # Without its details the lecture would be saved with no duration
+            failed.append((video, video['error']))
+            continue
+        choice = dict(defaults, **overrides.get(video['video_id'], {}))
+        try:
+            rank_id = int(choice['rank']) if choice.get('rank') else None
+            topic_id = int(choice['topic']) if choice.get('topic') else None
+            tag_ids = _int_ids(choice.get('tags', []))
+            collection_ids = _int_ids(choice.get('collections', []))
+        except ValueError:
+            failed.append((video, 'invalid rank, topic, tag or collection'))
+            continue
+        if rank_id not in known['ranks'] or topic_id not in known['topics']:
+            failed.append((video, 'a rank and a topic are required'))
+            continue
+        if not set(tag_ids) <= known['tags'] or not set(collection_ids) <= known['collections']:
+            failed.append((video, 'unknown tag or collection'))
+            continue
+        existing.add(video['video_id'])
+        rows.append({
+            'title': video['title'],
+            'youtube_id': video['video_id'],
+            'thumbnail_url': video['thumbnail_url'],
+            'publish_date': video['published_at'],
+            'duration_seconds': video['duration_seconds'],
+            'rank_id': rank_id,
+        })
+        links[video['video_id']] = (video, topic_id, dict.fromkeys(tag_ids), dict.fromkeys(collection_ids))
+
+    if not rows:
+        return VideoImportResult(inserted, skipped, failed)
+
+    try:
+        result = db.session.execute(db.insert(Lecture).returning(Lecture.id, Lecture.youtube_id), rows)
+        new_ids = {youtube_id: lecture_id for lecture_id, youtube_id in result}
+        topic_rows, tag_rows, members = [], [], defaultdict(list)
+        for youtube_id, (video, topic_id, tag_ids, collection_ids) in links.items():
+            lecture_id = new_ids[youtube_id]
+            topic_rows.append({'lecture_id': lecture_id, 'topic_id': topic_id})
+            tag_rows.extend({'lecture_id': lecture_id, 'tag_id': tag_id} for tag_id in tag_ids)
+            for collection_id in collection_ids:
+                members[collection_id].append(lecture_id)
+            inserted.append((video, None))
+        db.session.execute(lecture_topic.insert(), topic_rows)
+        if tag_rows:
+            db.session.execute(lecture_tag.insert(), tag_rows)
+
+        if members:
+            # Append after each collection's last key, one gap apart in playlist order
+            last_keys = dict(db.session.query(
+                collection_lecture.c.collection_id, db.func.max(collection_lecture.c.position),
+            ).filter(collection_lecture.c.collection_id.in_(list(members))).group_by(collection_lecture.c.collection_id))
+            db.session.execute(collection_lecture.insert(), [
+                {
+                    'collection_id': collection_id,
+                    'lecture_id': lecture_id,
+                    'position': (last_keys.get(collection_id) or 0) + (index + 1) * POSITION_GAP,
+                }
+                for collection_id, lecture_ids in members.items()
+                for index, lecture_id in enumerate(lecture_ids)
+            ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    logging.info('Imported %s playlist videos (%s skipped, %s failed)', len(inserted), len(skipped), len(failed))
+    return VideoImportResult(inserted, skipped, failed)
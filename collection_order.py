@@ -0,0 +1,326 @@
+"""
+Sparse ordering keys for lectures in a collection.
+
+collection_lecture.position values are spaced POSITION_GAP apart, so moving a
+lecture only rewrites its own row with a key between its new neighbours. When
+two neighbours run out of room the collection is renumbered, right away if a
+move needs it and otherwise in a background thread once gaps get small. That
+thread starts only after the move is committed, so it renumbers the new order.
+Collections with the old consecutive positions are renumbered the first time
+a move needs room, or all at once with `flask rebalance-collections`.
+"""
+import logging
+import threading
+from bisect import bisect_left
+from itertools import pairwise
+
+import click
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import app, db
+from models import Collection, collection_lecture
+
+# Spacing between the keys of neighbouring lectures after a rebalance
+POSITION_GAP = 1024
+
+# A move leaving less room than this around the new key schedules a rebalance
+MIN_GAP = 8
+
+# Rows per CASE statement, three bound parameters each, below SQLite's old 999 limit
+CASE_BATCH_SIZE = 300
+
+_rebalancing = set()
+_rebalancing_lock = threading.Lock()
+
+def collection_keys(collection_id):
+    """(lecture_id, position) of a collection's lectures in display order"""
+    rows = db.session.query(collection_lecture.c.lecture_id, collection_lecture.c.position).filter(
+        collection_lecture.c.collection_id == collection_id,
+    ).order_by(collection_lecture.c.position, collection_lecture.c.lecture_id)
+    return [(row.lecture_id, row.position or 0) for row in rows]
+
+def next_position(collection_id):
+    """Key for a lecture appended at the end of a collection"""
+    last = db.session.query(db.func.max(collection_lecture.c.position)).filter(
+        collection_lecture.c.collection_id == collection_id,
+    ).scalar()
+    return (last or 0) + POSITION_GAP
+
+def append_lecture(collection_id, lecture_id):
+    """Add a lecture at the end of a collection. The caller commits."""
+    db.session.execute(collection_lecture.insert().values(
+        collection_id=collection_id, lecture_id=lecture_id, position=next_position(collection_id),
+    ))
+
+def key_between(before, after):
+    """Integer key strictly between two neighbouring keys (None for an open end), or None if there is no room"""
+    if before is None and after is None:
+        return POSITION_GAP
+    if before is None:
+        return after - POSITION_GAP
+    if after is None:
+        return before + POSITION_GAP
+    if after - before < 2:
+        return None
+    return (before + after) // 2
+
+def apply_positions(collection_id, changes):
+    """Write (lecture_id, position) pairs of one collection in a single statement.
+
+    PostgreSQL gets UPDATE ... FROM (VALUES ...); other databases a CASE over
+    the lecture IDs, batched to stay under their bound parameter limits.
+    Returns the number of rows written.
+    """
+    if not changes:
+        return 0
+    if db.engine.dialect.name == 'postgresql':
+        moved = db.values(
+            db.column('lecture_id', db.Integer), db.column('position', db.Integer), name='moved',
+        ).data(changes)
+        db.session.execute(
+            collection_lecture.update().
+            where(collection_lecture.c.collection_id == collection_id).
+            where(collection_lecture.c.lecture_id == moved.c.lecture_id).
+            values(position=moved.c.position),
+        )
+        return len(changes)
+
+    for start in range(0, len(changes), CASE_BATCH_SIZE):
+        batch = dict(changes[start:start + CASE_BATCH_SIZE])
+        db.session.execute(
+            collection_lecture.update().
+            where(collection_lecture.c.collection_id == collection_id).
+            where(collection_lecture.c.lecture_id.in_(list(batch))).
+            values(position=db.case(batch, value=collection_lecture.c.lecture_id)),
+        )
+    return len(changes)
+
+def set_position(collection_id, lecture_id, position):
+    db.session.execute(
+        collection_lecture.update().
+        where(collection_lecture.c.collection_id == collection_id).
+        where(collection_lecture.c.lecture_id == lecture_id).
+        values(position=position),
+    )
+
+def rebalance(collection_id, lecture_ids=None):
+    """Renumber a collection POSITION_GAP apart, in `lecture_ids` order or the current one.
+
+    Returns the number of rows rewritten. The caller commits.
+    """
+    current = dict(collection_keys(collection_id))
+    if lecture_ids is None:
+        lecture_ids = list(current)
+    changes = [
+        (lecture_id, (index + 1) * POSITION_GAP)
+        for index, lecture_id in enumerate(lecture_ids)
+        if current.get(lecture_id) != (index + 1) * POSITION_GAP
+    ]
+    return apply_positions(collection_id, changes)
+
+def schedule_rebalance(collection_id):
+    """Renumber a collection in the background once the current transaction commits"""
+    db.session.info.setdefault('pending_rebalances', set()).add(collection_id)
+
+@event.listens_for(Session, 'after_commit')
+def _start_pending_rebalances(session):
+    for collection_id in sorted(session.info.pop('pending_rebalances', ())):
+        rebalance_async(collection_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_rebalances(session):
+    session.info.pop('pending_rebalances', None)
+
+def rebalance_async(collection_id):
+    """Renumber a collection in a background thread, unless one is running for it.
+
+    Reads the committed order, so call it only once the moves are committed;
+    schedule_rebalance() waits for the commit.
+    """
+    with _rebalancing_lock:
+        if collection_id in _rebalancing:
+            return
+        _rebalancing.add(collection_id)
+    threading.Thread(
+        target=_rebalance_in_background, args=(collection_id,), name=f'rebalance-{collection_id}', daemon=True,
+    ).start()
+
+def _rebalance_in_background(collection_id):
+    try:
+        with app.app_context():
+            rewritten = rebalance(collection_id)
+            db.session.commit()
+            logging.info('Rebalanced collection %s, %s rows rewritten', collection_id, rewritten)
+    except Exception as e:
+        db.session.rollback()
+        logging.error('Error rebalancing collection %s: %s', collection_id, e)
+    finally:
+        with _rebalancing_lock:
+            _rebalancing.discard(collection_id)
+
+def _needs_rebalance(before, key, after):
+    return (before is not None and key - before < MIN_GAP) or (after is not None and after - key < MIN_GAP)
+
+def move_lecture(collection_id, lecture_id, new_index):
+    """Move a lecture to `new_index` (0-based) in its collection.
+
+    Returns the number of rows written: 1 normally, 0 if it was already
+    there, or the whole collection if its keys had to be renumbered. Raises
+    KeyError if the lecture is not in the collection and IndexError if the
+    index is out of range. The caller commits; a background rebalance, if
+    the move left too little room, starts after that commit.
+    """
+    keys = collection_keys(collection_id)
+    lecture_ids = [row[0] for row in keys]
+    if lecture_id not in lecture_ids:
+        raise KeyError(lecture_id)
+    if not 0 <= new_index < len(keys):
+        raise IndexError(new_index)
+    if lecture_ids.index(lecture_id) == new_index:
+        return 0
+
+    others = [row for row in keys if row[0] != lecture_id]
+    before = others[new_index - 1][1] if new_index > 0 else None
+    after = others[new_index][1] if new_index < len(others) else None
+    key = key_between(before, after)
+    if key is None:
+        # Neighbours too close (or old consecutive positions): renumber now
+        order = [row[0] for row in others]
+        order.insert(new_index, lecture_id)
+        return rebalance(collection_id, order)
+
+    set_position(collection_id, lecture_id, key)
+    if _needs_rebalance(before, key, after):
+        schedule_rebalance(collection_id)
+    return 1
+
+def longest_increasing_run(values):
+    """Indexes of a longest strictly increasing subsequence of `values`"""
+    tails, tail_indexes, previous = [], [], [None] * len(values)
+    for index, value in enumerate(values):
+        slot = bisect_left(tails, value)
+        if slot == len(tails):
+            tails.append(value)
+            tail_indexes.append(index)
+        else:
+            tails[slot] = value
+            tail_indexes[slot] = index
+        previous[index] = tail_indexes[slot - 1] if slot else None
+    run = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        run.append(index)
+        index = previous[index]
+    return run[::-1]
+
+def order_after_moves(lecture_ids, moves):
+    """The order of `lecture_ids` after applying moves one after another.
+
+    Each move names a `lecture_id` and where it goes: `after_id` (None for the
+    front), `before_id` (None for the end) or a 0-based `new_position`.
+    Raises ValueError for a malformed move, a lecture that is not in the list
+    or a bad target.
+    """
+    if not isinstance(moves, list):
+        raise ValueError('Moves must be a list')
+    order = list(lecture_ids)
+    for move in moves:
+        if not isinstance(move, dict) or move.get('lecture_id') is None:
+            raise ValueError('Every move needs a lecture_id')
+        lecture_id = _as_int(move['lecture_id'], 'Lecture')
+        if lecture_id not in order:
+            raise ValueError(f'Lecture {lecture_id} is not in this collection')
+        order.remove(lecture_id)
+        if 'after_id' in move:
+            index = 0 if move['after_id'] is None else _neighbour_index(order, move['after_id']) + 1
+        elif 'before_id' in move:
+            index = len(order) if move['before_id'] is None else _neighbour_index(order, move['before_id'])
+        elif 'new_position' in move and _as_int(move['new_position'], 'Position') in range(len(order) + 1):
+            index = int(move['new_position'])
+        else:
+            raise ValueError(f'Move for lecture {lecture_id} has no valid target')
+        order.insert(index, lecture_id)
+    return order
+
+def _as_int(value, what):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f'{what} {value!r} is not a number')
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{what} {value!r} is not a number') from None
+
+def _neighbour_index(order, neighbour):
+    """Index in `order` of the lecture a move is placed next to"""
+    neighbour_id = _as_int(neighbour, 'Lecture')
+    if neighbour_id not in order:
+        raise ValueError(f'Lecture {neighbour_id} is not in this collection')
+    return order.index(neighbour_id)
+
+def reorder(collection_id, lecture_ids=None, moves=None):
+    """Put a collection in the order of `lecture_ids`, or apply `moves` to its current order.
+
+    Lectures already in increasing key order keep their keys; the others get
+    keys between their new neighbours, written in one statement. Returns the
+    number of rows written. Raises ValueError, with a message for the client,
+    unless `lecture_ids` is exactly the collection's lectures, or if a move
+    is invalid. The caller commits.
+    """
+    current = dict(collection_keys(collection_id))
+    if moves is not None:
+        lecture_ids = order_after_moves(current, moves)
+    elif isinstance(lecture_ids, list):
+        lecture_ids = [_as_int(lecture_id, 'Lecture') for lecture_id in lecture_ids]
+    else:
+        raise ValueError('Lecture IDs must be a list')
+    if len(lecture_ids) != len(current) or set(lecture_ids) != set(current):
+        raise ValueError('Lecture IDs do not match collection content')
+
+    positions = [current[lecture_id] for lecture_id in lecture_ids]
+    kept = set(longest_increasing_run(positions))
+    new_positions = list(positions)
+    index = 0
+    while index < len(lecture_ids):
+        if index in kept:
+            index += 1
+            continue
+        # Spread a run of moved lectures evenly between the kept keys around it
+        end = index
+        while end < len(lecture_ids) and end not in kept:
+            end += 1
+        before = new_positions[index - 1] if index > 0 else None
+        after = new_positions[end] if end < len(lecture_ids) else None
+        count = end - index
+        if before is None and after is None:
+            keys = [(i + 1) * POSITION_GAP for i in range(count)]
+        elif before is None:
+            keys = [after - (count - i) * POSITION_GAP for i in range(count)]
+        elif after is None:
+            keys = [before + (i + 1) * POSITION_GAP for i in range(count)]
+        elif after - before > count:
+            step = (after - before) / (count + 1)
+            keys = [before + int(step * (i + 1)) for i in range(count)]
+        else:
+            return rebalance(collection_id, lecture_ids)
+        new_positions[index:end] = keys
+        index = end
+
+    changes = [
+        (lecture_id, position)
+        for lecture_id, position in zip(lecture_ids, new_positions)
+        if current[lecture_id] != position
+    ]
+    written = apply_positions(collection_id, changes)
+    if any(b - a < MIN_GAP for a, b in pairwise(new_positions)):
+        schedule_rebalance(collection_id)
+    return written
+
+@app.cli.command('rebalance-collections')
+def rebalance_collections():
+    """Renumber every collection's lecture positions with sparse keys."""
+    total = 0
+    for (collection_id,) in db.session.query(Collection.id).order_by(Collection.id):
+        total += rebalance(collection_id)
+        db.session.commit()
+    click.echo(f'Rewrote {total} collection positions')
@@ -0,0 +1,14 @@
+"""
+Test settings, applied before the app is first imported: a throwaway SQLite
+database and cache and job directories, so tests never touch real data.
+"""
+import os
+import tempfile
+
+_directory = tempfile.mkdtemp(prefix='baduktube-tests-')
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_directory, 'test.db')
+os.environ['SESSION_SECRET'] = 'test'
+os.environ['CACHE_DIR'] = os.path.join(_directory, 'cache')
+os.environ['JOB_DIR'] = os.path.join(_directory, 'jobs')
+os.environ['YOUTUBE_CACHE_PATH'] = os.path.join(_directory, 'youtube.sqlite3')
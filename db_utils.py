@@ -2,57 +2,220 @@
 """
 Database utility functions to centralize common database operations
 """
+import base64
+import binascii
+import json
 import logging
+from collections import namedtuple
+from datetime import datetime
+from types import MappingProxyType
 
 from app import db
-from models import Collection, Lecture, Rank, Tag, Topic, collection_lecture
+from cache import LRUCache
+from catalog import get_versions
+from fulltext import apply_text_search
+from fuzzy import apply_fuzzy_search, fuzzy_score, get_backend, rank_fuzzy_ids
+from models import Collection, Lecture, Rank, Tag, Topic, collection_lecture, lecture_tag, lecture_topic
 
-def get_metadata():
-    """Get all metadata for forms and filtering"""
-    return {
-        'topics': Topic.query.all(),
-        'tags': Tag.query.all(),
-        'ranks': Rank.query.all(),
-        'collections': Collection.query.all(),
-    }
+# Detached, read-only rows for metadata lists
+MetadataItem = namedtuple('MetadataItem', ['id', 'name'])
+CollectionItem = namedtuple('CollectionItem', ['id', 'name', 'description'])
+CollectionSummary = namedtuple('CollectionSummary', [
+    'id', 'name', 'description', 'created_at', 'lecture_count', 'total_seconds', 'newest_publish_date', 'thumbnail_url',
+])
+
+METADATA_TABLES = ('topic', 'tag', 'rank', 'collection')
+
+# Metadata snapshots by the versions of the metadata tables
+_metadata_cache = LRUCache(maxsize=4)
+
+def get_metadata(versions=None):
+    """Get all metadata for forms and filtering.
+
+    Returns tuples of named tuples rather than ORM objects, cached until a
+    commit changes one of the metadata tables.
+    """
+    versions = get_versions() if versions is None else versions
+    key = tuple(versions.get(table) for table in METADATA_TABLES)
+    metadata = _metadata_cache.get(key)
+    if metadata is None:
+        metadata = MappingProxyType({
+            'topics': tuple(MetadataItem(*row) for row in db.session.query(Topic.id, Topic.name).order_by(Topic.id)),
+            'tags': tuple(MetadataItem(*row) for row in db.session.query(Tag.id, Tag.name).order_by(Tag.id)),
+            'ranks': tuple(MetadataItem(*row) for row in db.session.query(Rank.id, Rank.name).order_by(Rank.id)),
+            'collections': tuple(CollectionItem(*row) for row in db.session.query(
+                Collection.id, Collection.name, Collection.description,
+            ).order_by(Collection.id)),
+        })
+        _metadata_cache.set(key, metadata)
+    return metadata
 
 def get_filtered_lectures_query():
     """Get base query for lectures with eager loading"""
+    # selectinload keeps one row per lecture, so LIMIT/OFFSET apply to lectures
+    # rather than to a lecture x topic x tag product
     query = Lecture.query.options(
-        db.joinedload(Lecture.topics),
-        db.joinedload(Lecture.tags),
+        db.selectinload(Lecture.topics),
+        db.selectinload(Lecture.tags),
         db.joinedload(Lecture.rank),
-    ).distinct()
+    )
     
     return query
 
+def is_fuzzy_search(search_params):
+    """Whether the text search should tolerate typos (match=fuzzy)"""
+    return bool(search_params.get('q')) and search_params.get('match') == 'fuzzy'
+
+def has_facet_filters(search_params):
+    """Whether any topic, tag or rank filter is set"""
+    return any(search_params.get('topics', [])) or any(search_params.get('tags', [])) or \
+        bool(search_params.get('rank'))
+
 def apply_search_filters(query, search_params):
     """Apply search filters to a lecture query"""
     # Text search
-    if search_params.get('q'):
-        query = query.filter(Lecture.title.ilike(f'%{search_params["q"]}%'))
+    if is_fuzzy_search(search_params):
+        query = apply_fuzzy_search(query, search_params['q'])
+    elif search_params.get('q'):
+        query = apply_text_search(query, search_params['q'])
 
-    # Topic filtering
+    # Topic filtering, as a semi-join so no DISTINCT is needed
     if search_params.get('topics') and any(search_params['topics']):
         valid_topic_ids = [tid for tid in search_params['topics'] if tid]
         if valid_topic_ids:
-            query = query.join(Lecture.topics).filter(Topic.id.in_(valid_topic_ids))
+            query = query.filter(Lecture.id.in_(
+                db.select(lecture_topic.c.lecture_id).where(lecture_topic.c.topic_id.in_(valid_topic_ids)),
+            ))
 
     # Tag filtering
     if search_params.get('tags') and any(search_params['tags']):
         valid_tag_ids = [tid for tid in search_params['tags'] if tid]
         if valid_tag_ids:
-            query = query.join(Lecture.tags).filter(Tag.id.in_(valid_tag_ids))
+            query = query.filter(Lecture.id.in_(
+                db.select(lecture_tag.c.lecture_id).where(lecture_tag.c.tag_id.in_(valid_tag_ids)),
+            ))
 
     # Rank filtering
     if search_params.get('rank'):
         query = query.filter(Lecture.rank_id == search_params['rank'])
     
-    # Always sort by newest
-    query = query.order_by(Lecture.publish_date.desc())
+    # Always sort by newest, with the ID as a stable tie-breaker, after the
+    # similarity of fuzzy matches where the database can rank them
+    score = fuzzy_score(search_params['q']) if is_fuzzy_search(search_params) else None
+    if score is not None:
+        query = query.order_by(score.desc())
+    query = query.order_by(Lecture.publish_date.desc().nullslast(), Lecture.id.desc())
     
     return query
 
+def search_lecture_ids(search_params, limit, offset=0, cursor_key=None):
+    """First search phase: one page of matching lecture IDs from the lecture table alone"""
+    if is_fuzzy_search(search_params) and get_backend() == 'index':
+        # Ranked by the in-process index, with SQL only checking the other filters
+        if has_facet_filters(search_params):
+            query = apply_search_filters(db.session.query(Lecture.id), search_params)
+            lecture_ids = rank_fuzzy_ids(search_params['q'], [row.id for row in query])
+        else:
+            lecture_ids = rank_fuzzy_ids(search_params['q'])
+        return lecture_ids[offset:offset + limit]
+
+    query = apply_search_filters(db.session.query(Lecture.id), search_params)
+    if cursor_key:
+        query = apply_keyset(query, cursor_key)
+    return [row.id for row in query.offset(offset).limit(limit)]
+
+def hydrate_lectures(lecture_ids):
+    """Second search phase: load lectures with topics, tags and rank, in the order of lecture_ids"""
+    if not lecture_ids:
+        return []
+    lectures = get_filtered_lectures_query().filter(Lecture.id.in_(lecture_ids)).all()
+    by_id = {lecture.id: lecture for lecture in lectures}
+    return [by_id[lecture_id] for lecture_id in lecture_ids if lecture_id in by_id]
+
+def normalize_search_params(search_params):
+    """Hashable, order-independent key for a set of search filters"""
+    return (
+        ' '.join(search_params.get('q', '').lower().split()),
+        tuple(sorted(str(t) for t in search_params.get('topics', []) if t)),
+        tuple(sorted(str(t) for t in search_params.get('tags', []) if t)),
+        str(search_params.get('rank') or ''),
+        'fuzzy' if is_fuzzy_search(search_params) else '',
+    )
+
+def count_lectures(search_params):
+    """Exact number of lectures matching the search filters"""
+    if is_fuzzy_search(search_params) and get_backend() == 'index' and not has_facet_filters(search_params):
+        return len(rank_fuzzy_ids(search_params['q']))
+    return apply_search_filters(db.session.query(Lecture.id), search_params).order_by(None).count()
+
+def count_facets(search_params):
+    """Per-topic, per-tag and per-rank result counts in one grouped query.
+
+    Each facet is counted with every filter applied except its own, so the
+    counts say how many results picking that option would give.
+    """
+    def matching_ids(excluded):
+        params = {key: value for key, value in search_params.items() if key != excluded}
+        return apply_search_filters(db.session.query(Lecture.id), params).order_by(None).statement
+
+    def association_counts(facet, table, value_column):
+        return db.select(db.literal(facet), value_column, db.func.count(db.distinct(table.c.lecture_id))). \
+            where(table.c.lecture_id.in_(matching_ids(facet))).group_by(value_column)
+
+    statement = db.union_all(
+        association_counts('topics', lecture_topic, lecture_topic.c.topic_id),
+        association_counts('tags', lecture_tag, lecture_tag.c.tag_id),
+        db.select(db.literal('ranks'), Lecture.rank_id, db.func.count(Lecture.id)).
+        where(Lecture.id.in_(matching_ids('rank')), Lecture.rank_id.isnot(None)).
+        group_by(Lecture.rank_id),
+    )
+
+    counts = {'topics': {}, 'tags': {}, 'ranks': {}}
+    for facet, value_id, count in db.session.execute(statement):
+        counts[facet][value_id] = count
+    return counts
+
+def encode_cursor(lecture):
+    """Opaque keyset cursor pointing just past `lecture` in newest-first order"""
+    key = [lecture.publish_date.isoformat() if lecture.publish_date else None, lecture.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """(publish_date, id) from a cursor made by encode_cursor, ValueError if invalid"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        publish_date, lecture_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return (datetime.fromisoformat(publish_date) if publish_date else None, int(lecture_id))
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def encode_offset_cursor(offset):
+    """Opaque cursor for result orders without a keyset, such as fuzzy matches"""
+    return base64.urlsafe_b64encode(json.dumps({'offset': offset}).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_offset_cursor(cursor):
+    """Offset from a cursor made by encode_offset_cursor, ValueError if invalid"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        offset = int(json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))['offset'])
+    except (binascii.Error, UnicodeError, TypeError, ValueError, KeyError) as e:
+        raise ValueError('Invalid cursor') from e
+    if offset < 0:
+        raise ValueError('Invalid cursor')
+    return offset
+
+def apply_keyset(query, cursor_key):
+    """Restrict a newest-first lecture query to rows after the cursor position"""
+    publish_date, lecture_id = cursor_key
+    if publish_date is None:
+        # Undated lectures sort last, by descending ID
+        return query.filter(Lecture.publish_date.is_(None), Lecture.id < lecture_id)
+    return query.filter(db.or_(
+        Lecture.publish_date < publish_date,
+        db.and_(Lecture.publish_date == publish_date, Lecture.id < lecture_id),
+        Lecture.publish_date.is_(None),
+    ))
+
 def safe_commit():
     """Commit changes with error handling"""
     try:
@@ -74,7 +237,87 @@ def get_collection_lectures(collection_id):
 
     # Try to order by position if the column exists
     try:
-        return query.order_by(collection_lecture.c.position).all()
+        return query.order_by(collection_lecture.c.position, collection_lecture.c.lecture_id).all()
     except Exception:
         # Fall back to no ordering if position column doesn't exist
         return query.all()
+
+def get_collection_summaries(collection_id=None):
+    """Every collection (or just one) with its lecture count, total duration, newest lecture and cover, in one query"""
+    # Thumbnail of the first lecture by position, as a correlated subquery
+    cover = db.session.query(Lecture.thumbnail_url).join(
+        collection_lecture,
+        Lecture.id == collection_lecture.c.lecture_id,
+    ).filter(
+        collection_lecture.c.collection_id == Collection.id,
+    ).order_by(
+        collection_lecture.c.position, collection_lecture.c.lecture_id,
+    ).limit(1).correlate(Collection).scalar_subquery()
+
+    rows = db.session.query(
+        Collection.id,
+        Collection.name,
+        Collection.description,
+        Collection.created_at,
+        db.func.count(Lecture.id),
+        db.func.coalesce(db.func.sum(Lecture.duration_seconds), 0),
+        db.func.max(Lecture.publish_date),
+        cover,
+    ).outerjoin(
+        collection_lecture,
+        Collection.id == collection_lecture.c.collection_id,
+    ).outerjoin(
+        Lecture,
+        Lecture.id == collection_lecture.c.lecture_id,
+    )
+    if collection_id is not None:
+        rows = rows.filter(Collection.id == collection_id)
+    rows = rows.group_by(
+        Collection.id, Collection.name, Collection.description, Collection.created_at,
+    ).order_by(Collection.id)
+    return [CollectionSummary(*row) for row in rows]
+
+def encode_position_cursor(position, lecture_id, index):
+    """Opaque cursor pointing just past a lecture of a collection, which is the `index`-th one shown"""
+    key = [position, lecture_id, index]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_position_cursor(cursor):
+    """(position, lecture_id, index) from a cursor made by encode_position_cursor, ValueError if invalid"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position, lecture_id, index = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return int(position), int(lecture_id), int(index)
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def get_collection_page(collection_id, limit, after=None):
+    """One chunk of a collection's lectures in position order, and the cursor of the next chunk or None.
+
+    `after` is a cursor from a previous chunk. Lectures come with topics,
+    tags and rank loaded, plus a `collection_index` (1-based) for display.
+    """
+    position, lecture_id, index = decode_position_cursor(after) if after else (None, None, 0)
+    query = get_filtered_lectures_query().add_columns(collection_lecture.c.position).join(
+        collection_lecture,
+        Lecture.id == collection_lecture.c.lecture_id,
+    ).filter(
+        collection_lecture.c.collection_id == collection_id,
+    )
+    if after:
+        # Keyset on (position, lecture_id), the order positions are shown in
+        query = query.filter(db.or_(
+            collection_lecture.c.position > position,
+            db.and_(collection_lecture.c.position == position, collection_lecture.c.lecture_id > lecture_id),
+        ))
+    rows = query.order_by(collection_lecture.c.position, collection_lecture.c.lecture_id).limit(limit + 1).all()
+
+    lectures = []
+    for offset, (lecture, _) in enumerate(rows[:limit]):
+        lecture.collection_index = index + offset + 1
+        lectures.append(lecture)
+    next_cursor = None
+    if len(rows) > limit:
+        last, last_position = rows[limit - 1]
+        next_cursor = encode_position_cursor(last_position, last.id, index + limit)
+    return lectures, next_cursor
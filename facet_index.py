@@ -0,0 +1,164 @@
+"""
+In-memory facet index for topic, tag and rank filtering.
+
+Holds one posting set of lecture IDs per topic, tag and rank plus the global
+newest-first ordering, so filtered searches become set intersections and only
+the requested page of lectures is loaded from the database.
+"""
+import heapq
+import random
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+import click
+
+from app import app, db
+from catalog import CatalogIndex
+from db_utils import apply_search_filters
+from models import Lecture, lecture_tag, lecture_topic
+
+FacetSnapshot = namedtuple('FacetSnapshot', ['order', 'position', 'topics', 'tags', 'ranks'])
+
+def parse_ids(values):
+    """Integer IDs from request values, ignoring blanks"""
+    return [int(value) for value in values if value]
+
+class FacetIndex(CatalogIndex):
+    tables = ('lecture', 'lecture_topic', 'lecture_tag')
+    name = 'facet index'
+
+    def build(self):
+        """Load posting sets for every topic, tag and rank from the database"""
+        rows = db.session.query(Lecture.id, Lecture.publish_date, Lecture.rank_id).all()
+        # Same order as the SQL path: newest first, then highest ID
+        rows.sort(key=lambda row: (row.publish_date or datetime.min, row.id), reverse=True)
+        order = [row.id for row in rows]
+
+        ranks = defaultdict(set)
+        for row in rows:
+            if row.rank_id is not None:
+                ranks[row.rank_id].add(row.id)
+
+        topics = defaultdict(set)
+        for lecture_id, topic_id in db.session.query(lecture_topic.c.lecture_id, lecture_topic.c.topic_id):
+            topics[topic_id].add(lecture_id)
+
+        tags = defaultdict(set)
+        for lecture_id, tag_id in db.session.query(lecture_tag.c.lecture_id, lecture_tag.c.tag_id):
+            tags[tag_id].add(lecture_id)
+
+        return FacetSnapshot(
+            order=order,
+            position={lecture_id: index for index, lecture_id in enumerate(order)},
+            topics={key: frozenset(ids) for key, ids in topics.items()},
+            tags={key: frozenset(ids) for key, ids in tags.items()},
+            ranks={key: frozenset(ids) for key, ids in ranks.items()},
+        )
+
+    @staticmethod
+    def matching_ids(snapshot, search_params):
+        """Lecture IDs matching the facet filters, or None when there are none"""
+        candidates = None
+
+        # Any of the selected topics, and any of the selected tags
+        for postings, ids in ((snapshot.topics, parse_ids(search_params.get('topics', []))),
+                              (snapshot.tags, parse_ids(search_params.get('tags', [])))):
+            if ids:
+                matches = frozenset().union(*(postings.get(i, frozenset()) for i in ids))
+                candidates = matches if candidates is None else candidates & matches
+
+        if search_params.get('rank'):
+            matches = snapshot.ranks.get(int(search_params['rank']), frozenset())
+            candidates = matches if candidates is None else candidates & matches
+
+        return candidates
+
+    def facet_counts(self, search_params, versions=None):
+        """Per-topic, per-tag and per-rank counts like db_utils.count_facets, or None"""
+        if search_params.get('q'):
+            return None
+        snapshot = self.snapshot(versions)
+        if snapshot is None:
+            return None
+
+        counts = {}
+        for facet, postings in (('topics', snapshot.topics), ('tags', snapshot.tags), ('ranks', snapshot.ranks)):
+            # Count each facet with every filter except its own
+            params_key = 'rank' if facet == 'ranks' else facet
+            base = self.matching_ids(snapshot, {k: v for k, v in search_params.items() if k != params_key})
+            if base is None:
+                counts[facet] = {value_id: len(ids) for value_id, ids in postings.items()}
+            else:
+                counts[facet] = {value_id: len(ids & base) for value_id, ids in postings.items()}
+        return counts
+
+    def search(self, search_params, offset, limit, after_id=None, versions=None):
+        """Page of lecture IDs and total count, or None if the index can't answer.
+
+        The page starts `offset` rows in, or just after lecture `after_id` for
+        keyset pagination. Text queries are left to the SQL path, as is
+        everything while the index is cold or stale.
+        """
+        if search_params.get('q'):
+            return None
+        snapshot = self.snapshot(versions)
+        if snapshot is None:
+            return None
+
+        if after_id is not None:
+            if after_id not in snapshot.position:
+                # Cursor lecture is gone, let SQL resume from its sort key
+                return None
+            offset = snapshot.position[after_id] + 1
+
+        candidates = self.matching_ids(snapshot, search_params)
+        if candidates is None:
+            return snapshot.order[offset:offset + limit], len(snapshot.order)
+
+        position = snapshot.position
+        if after_id is not None:
+            remaining = (c for c in candidates if position[c] >= offset)
+            return heapq.nsmallest(limit, remaining, key=position.__getitem__), len(candidates)
+
+        page = heapq.nsmallest(offset + limit, candidates, key=position.__getitem__)[offset:]
+        return page, len(candidates)
+
+facet_index = FacetIndex()
+
+def verify_facet_index(samples=200, seed=0):
+    """Compare facet index results with the SQL path, returning the mismatches"""
+    snapshot = facet_index.refresh()
+    rng = random.Random(seed)
+    cases = [{'topics': [str(t)]} for t in snapshot.topics]
+    cases += [{'tags': [str(t)]} for t in snapshot.tags]
+    cases += [{'rank': str(r)} for r in snapshot.ranks]
+    for _ in range(samples):
+        case = {}
+        if snapshot.topics and rng.random() < 0.7:
+            case['topics'] = [str(t) for t in rng.sample(sorted(snapshot.topics), min(2, len(snapshot.topics)))]
+        if snapshot.tags and rng.random() < 0.5:
+            case['tags'] = [str(rng.choice(sorted(snapshot.tags)))]
+        if snapshot.ranks and rng.random() < 0.5:
+            case['rank'] = str(rng.choice(sorted(snapshot.ranks)))
+        cases.append(case)
+
+    mismatches = []
+    sql_query = db.session.query(Lecture.id)
+    for case in cases:
+        expected = [row.id for row in apply_search_filters(sql_query, case)]
+        matches = facet_index.matching_ids(snapshot, case)
+        actual = list(snapshot.order) if matches is None else sorted(matches, key=snapshot.position.__getitem__)
+        if actual != expected:
+            mismatches.append((case, len(expected), len(actual)))
+    return len(cases), mismatches
+
+@app.cli.command('check-facet-index')
+@click.option('--samples', default=200, help='Number of random filter combinations to check.')
+def check_facet_index(samples):
+    """Check facet index results against the SQL search path."""
+    checked, mismatches = verify_facet_index(samples)
+    for case, expected, actual in mismatches:
+        click.echo(f'Mismatch for {case}: SQL returned {expected} lectures, index returned {actual}')
+    click.echo(f'Checked {checked} filter combinations, {len(mismatches)} mismatches')
+    if mismatches:
+        raise SystemExit(1)
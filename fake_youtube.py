@@ -0,0 +1,204 @@
+"""
+A local stand-in for the parts of the YouTube Data API the app uses.
+
+Serves playlistItems.list and videos.list with made-up videos, after an
+optional delay per call, with ETags and 304 answers to If-None-Match, so imports and the YouTube client can be tried and
+benchmarked without an API key or quota. Every playlist has the same videos;
+the playlist ID 'missing' answers with the API's not-found error. Transient
+errors can be injected, at random with --error-rate or one by one with
+FakeYouTubeServer.fail().
+
+    python fake_youtube.py --port 8765 --videos 500 --latency 0.1 --error-rate 0.1
+    YOUTUBE_API_URL=http://127.0.0.1:8765 python main.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+def video_id(index):
+    return f'v{index:010d}'
+
+def thumbnails(index):
+    return {'high': {'url': f'https://i.ytimg.com/vi/{video_id(index)}/hqdefault.jpg'}}
+
+class FakeYouTubeHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so clients can reuse their connections
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per call
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data, headers=None):
+        headers = {'Content-Type': 'application/json', **(headers or {})}
+        if status == 200:
+            # Like the API, answer a matching If-None-Match with an empty 304
+            data['etag'] = headers['ETag'] = hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+            if self.headers.get('If-None-Match') == data['etag']:
+                with self.server.lock:
+                    self.server.not_modified += 1
+                status, data = 304, None
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message, reason=None, headers=None):
+        error = {'code': status, 'message': message}
+        if reason:
+            error['errors'] = [{'reason': reason, 'domain': 'youtube.quota', 'message': message}]
+        self.send_json(status, {'error': error}, headers)
+
+    def send_fault(self, status, reason):
+        # Real rate limiting may ask for a pause
+        headers = {'Retry-After': '0.1'} if status == 429 else None
+        self.send_error_json(status, f'Injected {reason or status} error', reason, headers)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        resource = url.path.rstrip('/').rsplit('/', 1)[-1]
+        with self.server.lock:
+            self.server.calls[resource] += 1
+            fault = self.server.next_fault(resource)
+        time.sleep(self.server.latency)
+        if fault:
+            self.send_fault(*fault)
+        elif not params.get('key'):
+            self.send_error_json(403, 'The request is missing a valid API key.')
+        elif resource == 'playlistItems':
+            self.playlist_items(params)
+        elif resource == 'videos':
+            self.videos(params)
+        else:
+            self.send_error_json(404, 'Not Found')
+
+    def playlist_items(self, params):
+        if params.get('playlistId') == 'missing':
+            self.send_error_json(404, 'The playlist identified with the playlistId parameter cannot be found.')
+            return
+        page_size = min(int(params.get('maxResults', 5)), 50)
+        start = int(params.get('pageToken') or 0)
+        end = min(start + page_size, self.server.video_count)
+        data = {
+            'pageInfo': {'totalResults': self.server.video_count, 'resultsPerPage': page_size},
+            'items': [
+                {
+                    'snippet': {
+                        'title': f'Fake lecture {index}',
+                        'publishedAt': self.server.published(index, added=True),
+                        'thumbnails': thumbnails(index),
+                    },
+                    'contentDetails': {'videoId': video_id(index)},
+                }
+                for index in range(start, end)
+            ],
+        }
+        if end < self.server.video_count:
+            data['nextPageToken'] = str(end)
+        self.send_json(200, data)
+
+    def videos(self, params):
+        items = []
+        for requested in params.get('id', '').split(',')[:50]:
+            if not (requested.startswith('v') and requested[1:].isdigit()):
+                continue
+            index = int(requested[1:])
+            items.append({
+                'id': requested,
+                'snippet': {
+                    'title': f'Fake lecture {index}',
+                    'publishedAt': self.server.published(index),
+                    'thumbnails': thumbnails(index),
+                },
+                'contentDetails': {'duration': f'PT{index % 3}H{index % 60}M{index % 59}S'},
+            })
+        self.send_json(200, {'items': items})
+
+class FakeYouTubeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, video_count=120, latency=0.0):
+        super().__init__(('127.0.0.1', port), FakeYouTubeHandler)
+        self.video_count = video_count
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.connections = 0
+        self.not_modified = 0
+        self.error_rate = 0.0
+        self._faults = []
+
+    def fail(self, status, reason=None, times=1, resource=None):
+        """Answer the next `times` calls (of one endpoint, or any) with an error status and reason"""
+        with self.lock:
+            self._faults.extend([(status, reason, resource)] * times)
+
+    def next_fault(self, resource):
+        """(status, reason) to answer a call with instead of its response, if any; call with the lock held"""
+        for index, (status, reason, fault_resource) in enumerate(self._faults):
+            if fault_resource in (None, resource):
+                del self._faults[index]
+                return status, reason
+        if self.error_rate and random.random() < self.error_rate:
+            return random.choice(((503, None), (429, None), (403, 'rateLimitExceeded')))
+        return None
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out hang up before their response is written
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    @staticmethod
+    def published(index, added=False):
+        date = datetime(2020, 1, 1) + timedelta(days=index + (30 if added else 0))
+        return date.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def start(self):
+        """Serve on a daemon thread; returns the server"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--videos', type=int, default=120, help='videos in every playlist')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before each response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of calls answered with 503, 429 or 403')
+    args = parser.parse_args()
+    server = FakeYouTubeServer(args.port, args.videos, args.latency)
+    server.error_rate = args.error_rate
+    print(f'Fake YouTube API at {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
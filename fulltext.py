@@ -0,0 +1,103 @@
+"""
+Full-text search over lecture titles.
+
+PostgreSQL gets a generated tsvector column with a GIN index, SQLite gets an
+FTS5 shadow table kept in sync by triggers. Both are maintained by the database
+itself, so every write path (imports, edits, raw SQL) stays in sync without
+application code. Any other database falls back to the old ILIKE match.
+"""
+import logging
+import re
+
+from app import app, db
+from models import Lecture
+
+# Backend chosen by init_fulltext_search(), one of 'postgresql', 'sqlite' or 'like'
+_backend = 'like'
+
+POSTGRES_DDL = [
+    ('ALTER TABLE lecture ADD COLUMN IF NOT EXISTS search_vector tsvector '
+     "GENERATED ALWAYS AS (to_tsvector('{config}', coalesce(title, ''))) STORED"),
+    'CREATE INDEX IF NOT EXISTS ix_lecture_search_vector ON lecture USING GIN (search_vector)',
+]
+
+SQLITE_DDL = [
+    ("CREATE VIRTUAL TABLE IF NOT EXISTS lecture_fts USING fts5("
+     "title, content='lecture', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2')"),
+    ('CREATE TRIGGER IF NOT EXISTS lecture_fts_ai AFTER INSERT ON lecture BEGIN '
+     'INSERT INTO lecture_fts(rowid, title) VALUES (new.id, new.title); END'),
+    ('CREATE TRIGGER IF NOT EXISTS lecture_fts_ad AFTER DELETE ON lecture BEGIN '
+     "INSERT INTO lecture_fts(lecture_fts, rowid, title) VALUES ('delete', old.id, old.title); END"),
+    ('CREATE TRIGGER IF NOT EXISTS lecture_fts_au AFTER UPDATE OF title ON lecture BEGIN '
+     "INSERT INTO lecture_fts(lecture_fts, rowid, title) VALUES ('delete', old.id, old.title); "
+     'INSERT INTO lecture_fts(rowid, title) VALUES (new.id, new.title); END'),
+]
+
+def get_backend():
+    """Name of the full-text backend in use"""
+    return _backend
+
+def init_fulltext_search():
+    """Create the full-text index for the configured database, if supported"""
+    global _backend
+
+    dialect = db.engine.dialect.name
+    try:
+        if dialect == 'postgresql':
+            config = app.config['FULLTEXT_LANGUAGE']
+            if not re.fullmatch(r'\w+', config):
+                raise ValueError(f'Invalid text search configuration: {config}')
+            for statement in POSTGRES_DDL:
+                db.session.execute(db.text(statement.format(config=config)))
+        elif dialect == 'sqlite':
+            created = db.session.execute(
+                db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'lecture_fts'"),
+            ).first() is None
+            for statement in SQLITE_DDL:
+                db.session.execute(db.text(statement))
+            if created:
+                # Index lectures that existed before the shadow table
+                db.session.execute(db.text("INSERT INTO lecture_fts(lecture_fts) VALUES ('rebuild')"))
+        else:
+            logging.info('No full-text index for %s, using ILIKE search', dialect)
+            return _backend
+        db.session.commit()
+        _backend = dialect
+    except Exception as e:
+        db.session.rollback()
+        logging.warning('Could not set up full-text search, using ILIKE search: %s', e)
+        _backend = 'like'
+
+    logging.info('Full-text search backend: %s', _backend)
+    return _backend
+
+def tokenize(text):
+    """Split a search string into lowercase word tokens"""
+    return re.findall(r'\w+', text.lower())
+
+def apply_text_search(query, text, backend=None):
+    """Filter a lecture query to titles matching every word of the search text.
+
+    Each word is matched as a prefix so results keep up with typing.
+    """
+    backend = backend or _backend
+    tokens = tokenize(text)
+    if not tokens:
+        return query
+
+    if backend == 'postgresql':
+        ts_query = ' & '.join(f'{token}:*' for token in tokens)
+        return query.filter(
+            db.literal_column('lecture.search_vector').op('@@')(
+                db.func.to_tsquery(app.config['FULLTEXT_LANGUAGE'], ts_query),
+            ),
+        )
+
+    if backend == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        matching_ids = db.select(db.literal_column('rowid')).select_from(db.table('lecture_fts')).where(
+            db.literal_column('lecture_fts').op('MATCH')(match),
+        )
+        return query.filter(Lecture.id.in_(matching_ids))
+
+    return query.filter(Lecture.title.ilike(f'%{text}%'))
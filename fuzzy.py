@@ -0,0 +1,162 @@
+"""
+Typo-tolerant title search by trigram similarity.
+
+A search word matches a title word by the share of the search word's trigrams
+the two have in common, the measure pg_trgm calls word_similarity. On
+PostgreSQL this runs in the database with pg_trgm and a GIN trigram index;
+elsewhere an in-process trigram index over title words answers instead.
+Every search word has to match some title word, and results are ranked by the
+average similarity, newest first among equals.
+"""
+import logging
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+from app import app, db
+from cache import LRUCache
+from catalog import CatalogIndex
+from fulltext import tokenize
+from models import Lecture
+
+# Backend chosen by init_fuzzy_search(), 'postgresql' or 'index'
+_backend = 'index'
+
+POSTGRES_DDL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ix_lecture_title_trgm ON lecture USING GIN (title gin_trgm_ops)',
+]
+
+TrigramSnapshot = namedtuple('TrigramSnapshot', ['order', 'words', 'grams'])
+
+def get_backend():
+    """Name of the fuzzy search backend in use"""
+    return _backend
+
+def init_fuzzy_search():
+    """Enable pg_trgm and its title index on PostgreSQL, otherwise use the in-process index"""
+    global _backend
+
+    if db.engine.dialect.name != 'postgresql':
+        logging.info('Fuzzy search backend: index')
+        return _backend
+    try:
+        for statement in POSTGRES_DDL:
+            db.session.execute(db.text(statement))
+        db.session.commit()
+        _backend = 'postgresql'
+    except Exception as e:
+        db.session.rollback()
+        logging.warning('Could not set up pg_trgm, using the in-process trigram index: %s', e)
+        _backend = 'index'
+
+    logging.info('Fuzzy search backend: %s', _backend)
+    return _backend
+
+def trigrams(word):
+    """Trigrams of a word padded like pg_trgm pads it"""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TrigramIndex(CatalogIndex):
+    tables = ('lecture',)
+    name = 'trigram index'
+
+    def __init__(self):
+        super().__init__()
+        self._results = LRUCache(maxsize=256)
+
+    def build(self):
+        """Positions of lectures per title word and title words per trigram"""
+        rows = db.session.query(Lecture.id, Lecture.title, Lecture.publish_date).all()
+        rows.sort(key=lambda row: (row.publish_date or datetime.min, row.id), reverse=True)
+
+        words = defaultdict(list)
+        for position, row in enumerate(rows):
+            for word in set(tokenize(row.title)):
+                words[word].append(position)
+
+        grams = defaultdict(list)
+        for word in words:
+            for gram in trigrams(word):
+                grams[gram].append(word)
+
+        return TrigramSnapshot(order=[row.id for row in rows], words=dict(words), grams=dict(grams))
+
+    def search(self, text, threshold):
+        """{lecture_id: score} for titles with a similar word for every search word, best first"""
+        # No SQL fallback here: a stale index answers until its rebuild is done
+        snapshot, built_versions = self.latest()
+        tokens = tuple(dict.fromkeys(tokenize(text)))
+        key = (tokens, threshold, built_versions)
+        scores = self._results.get(key)
+        if scores is not None:
+            return scores
+
+        totals = None
+        for token in tokens:
+            # Title words sharing enough trigrams with the search word
+            grams = trigrams(token)
+            shared = defaultdict(int)
+            for gram in grams:
+                for word in snapshot.grams.get(gram, ()):
+                    shared[word] += 1
+            best = {}
+            for word, count in shared.items():
+                similarity = count / len(grams)
+                if similarity >= threshold:
+                    for position in snapshot.words[word]:
+                        if similarity > best.get(position, 0):
+                            best[position] = similarity
+            if totals is None:
+                totals = best
+            else:
+                totals = {position: totals[position] + score for position, score in best.items() if position in totals}
+
+        # Best average similarity first, then newest first like other searches
+        ranked = sorted((totals or {}).items(), key=lambda item: (-item[1], item[0]))
+        scores = {snapshot.order[position]: total / len(tokens) for position, total in ranked}
+        self._results.set(key, scores)
+        return scores
+
+trigram_index = TrigramIndex()
+
+def apply_fuzzy_search(query, text):
+    """Filter a lecture query to titles with a word similar to every word of the search text"""
+    tokens = tokenize(text)
+    if not tokens:
+        return query
+    threshold = app.config['FUZZY_THRESHOLD']
+
+    if _backend == 'postgresql':
+        # <% is word_similarity(a, b) >= the threshold setting, and can use the GIN index
+        db.session.execute(
+            db.text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+            {'threshold': str(threshold)},
+        )
+        for token in tokens:
+            query = query.filter(db.literal(token).op('<%')(Lecture.title))
+        return query
+
+    lecture_ids = list(trigram_index.search(text, threshold))
+    # Inline the IDs so long result lists don't hit bound parameter limits
+    return query.filter(Lecture.id.in_(db.bindparam('fuzzy_ids', lecture_ids, expanding=True, literal_execute=True)))
+
+def fuzzy_score(text):
+    """SQL expression ranking fuzzy matches on PostgreSQL, None for the in-process index"""
+    tokens = tokenize(text)
+    if _backend != 'postgresql' or not tokens:
+        return None
+    # The sum orders results like the average, the number of words being the same
+    scores = [db.func.word_similarity(token, Lecture.title) for token in tokens]
+    return sum(scores[1:], scores[0])
+
+def rank_fuzzy_ids(text, lecture_ids=None):
+    """IDs of lectures matching the text by in-process similarity, best first.
+
+    With `lecture_ids`, only those lectures are kept.
+    """
+    scores = trigram_index.search(text, app.config['FUZZY_THRESHOLD'])
+    if lecture_ids is None:
+        return list(scores)
+    allowed = set(lecture_ids)
+    return [lecture_id for lecture_id in scores if lecture_id in allowed]
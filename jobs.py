@@ -0,0 +1,414 @@
+"""
+Background jobs for long admin tasks.
+
+Imports, exports, the reset with its backup and the YouTube metadata refresh
+run on a small thread pool instead of in the request worker. Every job has a
+row in the job table with its status, progress, result and result file, which
+the admin pages poll at /admin/jobs/<id>. A job belongs to the process that
+runs it; when that process is gone (a worker restart or crash) the job is
+marked failed the next time it is looked at or the app starts.
+
+With JOB_EXECUTOR=sync jobs run inside the request that submits them, which
+is what tests want.
+"""
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app import app, db
+from cache import private_temp_dir
+from catalog_export import iter_export_gzip, write_export
+from catalog_import import CatalogImporter, read_import_sections
+from models import Job, Lecture
+from youtube_client import MAX_RESULTS, youtube
+from youtube_utils import iter_video_details, parse_duration, parse_published
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Seconds between progress writes to the job table
+JOB_PROGRESS_INTERVAL = 2
+
+# A job still running after this long is taken to be lost, whichever host ran it
+JOB_MAX_RUNTIME = timedelta(hours=6)
+
+# Result files are deleted this long after their job finished
+JOB_RESULT_TTL = timedelta(days=1)
+
+# Statements emptying a table for a replacing single-table import, dependants first
+REPLACE_STATEMENTS = {
+    'lectures': ['DELETE FROM lecture_topic', 'DELETE FROM lecture_tag', 'DELETE FROM collection_lecture',
+                 'DELETE FROM lecture'],
+    'topics': ['DELETE FROM lecture_topic', 'DELETE FROM topic'],
+    'tags': ['DELETE FROM lecture_tag', 'DELETE FROM tag'],
+    'ranks': ['UPDATE lecture SET rank_id = NULL', 'DELETE FROM rank'],
+    'collections': ['DELETE FROM collection_lecture', 'DELETE FROM collection'],
+    'lecture_topics': ['DELETE FROM lecture_topic'],
+    'lecture_tags': ['DELETE FROM lecture_tag'],
+    'collection_lectures': ['DELETE FROM collection_lecture'],
+}
+
+JOB_KINDS = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Progress of the jobs running in this process, fresher than their rows
+_live = {}
+_live_lock = threading.Lock()
+
+class SyncExecutor:
+    """Executor running every job right away in the submitting thread"""
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if app.config['JOB_EXECUTOR'] == 'sync':
+                _executor = SyncExecutor()
+            else:
+                _executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='job')
+        return _executor
+
+def job_kind(name):
+    """Register a function as the body of a kind of job"""
+    def register(func):
+        JOB_KINDS[name] = func
+        return func
+    return register
+
+def job_dir():
+    """Directory for uploads waiting for a job and for result files"""
+    # Uploads are read back as trusted input, so the default is private to this user
+    path = app.config['JOB_DIR'] or private_temp_dir('baduk-jobs')
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+def save_upload(file):
+    """Store an uploaded file for a job to read later; returns its path"""
+    fd, path = tempfile.mkstemp(prefix='upload-', dir=job_dir())
+    with os.fdopen(fd, 'wb') as target:
+        file.save(target)
+    return path
+
+def _owner():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def is_interrupted(job):
+    """Whether an active job's process is gone"""
+    if job.status not in ACTIVE_STATUSES:
+        return False
+    if job.started_at and datetime.utcnow() - job.started_at > JOB_MAX_RUNTIME:
+        return True
+    host, _, pid = (job.owner or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        # Run on another host; only the runtime limit can tell
+        return False
+    if int(pid) == os.getpid():
+        with _live_lock:
+            return job.id not in _live
+    return not _process_alive(int(pid))
+
+def fail_interrupted(job):
+    job.status = 'failed'
+    job.error = 'Interrupted: the process running this job stopped before it finished'
+    job.finished_at = datetime.utcnow()
+    upload_path = json.loads(job.params or '{}').get('upload_path')
+    if upload_path and os.path.exists(upload_path):
+        os.remove(upload_path)
+
+def init_jobs():
+    """Mark jobs left queued or running by a stopped process as failed"""
+    interrupted = [job for job in Job.query.filter(Job.status.in_(ACTIVE_STATUSES)) if is_interrupted(job)]
+    for job in interrupted:
+        fail_interrupted(job)
+    db.session.commit()
+    if interrupted:
+        logging.warning('Marked %s interrupted jobs as failed', len(interrupted))
+
+def remove_old_results():
+    """Delete result files older than JOB_RESULT_TTL"""
+    expired = Job.query.filter(Job.result_path.isnot(None), Job.finished_at < datetime.utcnow() - JOB_RESULT_TTL)
+    for job in expired:
+        if os.path.exists(job.result_path):
+            os.remove(job.result_path)
+        job.result_path = None
+    db.session.commit()
+
+def submit_job(kind, params=None, user_id=None):
+    """Queue a job and return its row"""
+    if kind not in JOB_KINDS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    remove_old_results()
+    job = Job(kind=kind, params=json.dumps(params or {}), owner=_owner(), created_by=user_id)
+    db.session.add(job)
+    db.session.commit()
+    with _live_lock:
+        _live[job.id] = {}
+    get_executor().submit(_run_in_background, job.id)
+    if app.config['JOB_EXECUTOR'] == 'sync':
+        # Finished already, in the job's own session
+        db.session.refresh(job)
+    return job
+
+def _run_in_background(job_id):
+    with app.app_context():
+        run_job(job_id)
+
+def run_job(job_id):
+    """Run a queued job to the end, recording its outcome"""
+    job = db.session.get(Job, job_id)
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+    context = JobContext(job)
+    try:
+        try:
+            result = JOB_KINDS[job.kind](context, **json.loads(job.params or '{}'))
+        except Exception as e:
+            db.session.rollback()
+            logging.exception('Job %s (%s) failed', job_id, job.kind)
+            job = db.session.get(Job, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        else:
+            job = db.session.get(Job, job_id)
+            job.status = 'succeeded'
+            job.result = json.dumps(result)
+            job.result_path = context.result_path
+        job.progress_done, job.progress_total, job.message = context.done, context.total, context.message
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    finally:
+        # Only once the outcome is stored, or a poll could take the job for interrupted
+        with _live_lock:
+            _live.pop(job_id, None)
+
+class JobContext:
+    """Handle a job body uses to report progress and name its result file"""
+
+    def __init__(self, job):
+        self.job_id = job.id
+        self.done, self.total, self.message = 0, None, None
+        self.result_path = None
+        self._saved = 0.0
+
+    def progress(self, done, total=None, message=None):
+        self.done, self.total = done, total
+        if message is not None:
+            self.message = message[:200]
+        with _live_lock:
+            _live[self.job_id] = {'done': done, 'total': total, 'message': self.message}
+        # SQLite allows one writer, and the job's own transaction may hold it,
+        # so there other workers see progress only when the job finishes
+        if db.engine.dialect.name != 'sqlite' and time.monotonic() - self._saved >= JOB_PROGRESS_INTERVAL:
+            self._saved = time.monotonic()
+            with db.engine.begin() as connection:
+                connection.execute(
+                    db.update(Job).where(Job.id == self.job_id).
+                    values(progress_done=done, progress_total=total, message=self.message),
+                )
+
+    def result_file(self, suffix):
+        """Path for this job's downloadable result"""
+        self.result_path = os.path.join(job_dir(), f'job-{self.job_id}{suffix}')
+        return self.result_path
+
+def job_status(job):
+    """JSON-ready state of a job, with the live progress if it runs in this process"""
+    if is_interrupted(job):
+        fail_interrupted(job)
+        db.session.commit()
+    with _live_lock:
+        live = _live.get(job.id) or {}
+    done = live.get('done', job.progress_done or 0)
+    total = live.get('total', job.progress_total)
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'done': done,
+        'total': total,
+        'percent': round(100 * done / total) if total else None,
+        'message': live.get('message', job.message),
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'has_file': bool(job.result_path) and job.status == 'succeeded',
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+def recent_jobs(limit=10):
+    return Job.query.order_by(Job.id.desc()).limit(limit).all()
+
+@job_kind('import')
+def import_job(job, upload_path, dry_run=False):
+    """Import a full export file saved by save_upload()"""
+    try:
+        size = os.path.getsize(upload_path)
+        importer = CatalogImporter(dry_run=dry_run)
+        with open(upload_path, 'rb') as upload:
+            for section, records in read_import_sections(upload, importer.batch_size):
+                importer.add(section, records)
+                job.progress(upload.tell(), size, f'Importing {section}')
+        report = importer.finish()
+    finally:
+        os.remove(upload_path)
+    return {'summary': report.summary(), 'report': report.as_dict()}
+
+@job_kind('import_table')
+def import_table_job(job, upload_path, table_name, replace_table=False, dry_run=False):
+    """Import one table from a saved upload, optionally emptying it first"""
+    try:
+        size = os.path.getsize(upload_path)
+        with open(upload_path, 'rb') as upload:
+            chunks = (records for section, records in read_import_sections(upload) if section == table_name)
+            first_chunk = next(chunks, None)
+            if first_chunk is None:
+                raise ValueError(f'The selected file does not contain {table_name} data')
+            if replace_table and not dry_run:
+                for statement in REPLACE_STATEMENTS[table_name]:
+                    db.session.execute(db.text(statement))
+                db.session.commit()
+            # Association rows keep their IDs, so they match the exported tables
+            importer = CatalogImporter(remap_ids=False, dry_run=dry_run)
+            importer.add(table_name, first_chunk)
+            for records in chunks:
+                importer.add(table_name, records)
+                job.progress(upload.tell(), size, f'Importing {table_name}')
+        report = importer.finish()
+    finally:
+        os.remove(upload_path)
+    if dry_run:
+        summary = report.summary()
+    else:
+        summary = (f'Successfully imported {report.inserted(table_name)} {table_name} records '
+                   f'({report.rows_per_second:.0f} rows/s)')
+    return {'summary': summary, 'report': report.as_dict()}
+
+@job_kind('export')
+def export_job(job, file_format='json'):
+    """Write a full export to a result file"""
+    path = job.result_file('.ndjson.gz' if file_format == 'ndjson' else '.json')
+    written = 0
+    if file_format == 'ndjson':
+        with open(path, 'wb') as target:
+            for chunk in iter_export_gzip():
+                target.write(chunk)
+                written += len(chunk)
+                job.progress(written, None, f'{written / 2**20:.1f} MiB written')
+    else:
+        with open(path, 'w', encoding='utf-8') as target:
+            write_export(target)
+        written = os.path.getsize(path)
+    return {'summary': f'Export ready ({written / 2**20:.1f} MiB)', 'bytes': written}
+
+@job_kind('reset')
+def reset_job(job):
+    """Back up the catalog to a result file, then delete it"""
+    # The backup is written completely before anything is deleted
+    job.progress(0, 2, 'Writing backup')
+    with open(job.result_file('.json'), 'w', encoding='utf-8') as backup:
+        write_export(backup)
+
+    job.progress(1, 2, 'Deleting data')
+    # Use raw SQL for faster deletion of many records
+    for table_name in ('lecture_topic', 'lecture_tag', 'collection_lecture', 'lecture', 'topic', 'tag', 'rank',
+                       'collection'):
+        db.session.execute(db.text(f'DELETE FROM {table_name}'))
+    # Reset the auto-increment counters (SQLite reuses IDs of an emptied table by itself)
+    if db.engine.dialect.name == 'postgresql':
+        for table_name in ('lecture', 'topic', 'tag', 'rank', 'collection'):
+            db.session.execute(db.text(f'ALTER SEQUENCE {table_name}_id_seq RESTART WITH 1'))
+    db.session.commit()
+    job.progress(2, 2, 'Done')
+    return {'summary': 'All data has been reset successfully'}
+
+def check_metadata_quota():
+    """Raise QuotaExceeded when refreshing every lecture would take today's YouTube quota past its budget"""
+    video_ids = db.session.scalars(db.select(Lecture.youtube_id).order_by(Lecture.id)).all()
+    youtube.ensure_quota(youtube.videos_cost(video_ids))
+
+@job_kind('refresh_metadata')
+def refresh_metadata_job(job):
+    """Update lecture durations and publish dates from the YouTube API, 50 videos per call"""
+    api_key = app.config['YOUTUBE_API_KEY']
+    if not api_key:
+        raise ValueError('YOUTUBE_API_KEY is not set')
+    rows = db.session.query(Lecture.id, Lecture.youtube_id, Lecture.duration_seconds, Lecture.publish_date). \
+        order_by(Lecture.id).all()
+    youtube.ensure_quota(youtube.videos_cost(row.youtube_id for row in rows))
+    updated = missing = done = 0
+    # Lectures whose videos call failed even after its retries, by error
+    failed = {}
+    # The videos.list calls run a few at a time on the YouTube client's pool,
+    # one per MAX_RESULTS lectures, their results arriving in lecture order
+    all_details = iter_video_details(api_key, [row.youtube_id for row in rows])
+    for start, (_, details, error) in zip(range(0, len(rows), MAX_RESULTS), all_details):
+        batch = rows[start:start + MAX_RESULTS]
+        done += len(batch)
+        if error:
+            # Left as they are rather than updated from nothing
+            failed.setdefault(str(error), []).extend(row.id for row in batch)
+            job.progress(done, len(rows), f'{updated} lectures updated')
+            continue
+        changes = []
+        for row in batch:
+            if row.youtube_id not in details:
+                missing += 1
+                continue
+            duration = parse_duration(details[row.youtube_id]['duration'])
+            change = {'id': row.id}
+            if duration and duration != row.duration_seconds:
+                change['duration_seconds'] = duration
+            if upload_date := details[row.youtube_id].get('upload_date'):
+                publish_date = parse_published(upload_date).replace(tzinfo=None)
+                if publish_date != row.publish_date:
+                    change['publish_date'] = publish_date
+            if len(change) > 1:
+                changes.append(change)
+        if changes:
+            # Bulk UPDATE by primary key, one executemany per batch
+            for keys in {tuple(change) for change in changes}:
+                db.session.execute(db.update(Lecture), [change for change in changes if tuple(change) == keys])
+            db.session.commit()
+            updated += len(changes)
+        job.progress(done, len(rows), f'{updated} lectures updated')
+    failed_count = sum(len(lecture_ids) for lecture_ids in failed.values())
+    checked = len(rows) - failed_count
+    summary = f'Checked {checked} lectures, updated {updated}'
+    if missing:
+        summary += f', {missing} not found on YouTube'
+    if failed:
+        summary += f', {failed_count} could not be checked ({"; ".join(failed)})'
+    return {
+        'summary': summary,
+        'checked': checked,
+        'updated': updated,
+        'missing': missing,
+        'failed': failed_count,
+        # Lecture IDs per error, so the failures can be looked at or retried
+        'errors': failed,
+    }
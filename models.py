@@ -75,3 +75,28 @@ lecture_tag = db.Table('lecture_tag',
     db.Column('lecture_id', db.Integer, db.ForeignKey('lecture.id')),
     db.Column('tag_id', db.Integer, db.ForeignKey('tag.id')),
 )
+
+class CatalogVersion(db.Model):
+    """Change counter per catalog table, bumped by every commit that writes to it"""
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Job(db.Model):
+    """A long admin task run in the background by jobs.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    params = db.Column(db.Text)
+    progress_done = db.Column(db.Integer, default=0)
+    progress_total = db.Column(db.Integer)
+    message = db.Column(db.String(200))
+    result = db.Column(db.Text)
+    result_path = db.Column(db.String(500))
+    error = db.Column(db.Text)
+    # host:pid of the process running it, to tell interrupted jobs from live ones
+    owner = db.Column(db.String(100))
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
@@ -0,0 +1,50 @@
+"""
+Server-side sessions for the playlist import wizard.
+
+Step 1 of the wizard fetches a playlist once; every later step reads the
+videos back from this cache instead of calling the YouTube API again. Entries
+are keyed by playlist ID, expire after PLAYLIST_CACHE_TTL seconds and at most
+PLAYLIST_CACHE_SIZE playlists are kept. The cache uses the CACHE_BACKEND of
+the response caches, so with the filesystem backend every gunicorn worker
+sees the same sessions.
+"""
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+from app import app
+from cache import create_cache
+from youtube_utils import VIDEO_UNAVAILABLE, fetch_playlist_videos
+
+PlaylistSession = namedtuple('PlaylistSession', ['playlist_id', 'videos', 'fetched_at'])
+
+playlist_cache = create_cache(
+    app.config['CACHE_BACKEND'],
+    maxsize=app.config['PLAYLIST_CACHE_SIZE'],
+    ttl=app.config['PLAYLIST_CACHE_TTL'],
+    directory=app.config['CACHE_DIR'],
+    namespace='playlists',
+)
+
+def _key(playlist_id):
+    return ('playlist', playlist_id)
+
+def load_playlist(api_key, playlist_id, refresh=False):
+    """(PlaylistSession, error) for a playlist, fetched from YouTube only when not cached or on refresh"""
+    if not refresh:
+        cached = playlist_cache.get(_key(playlist_id))
+        if cached is not None:
+            return cached, None
+    videos, error = fetch_playlist_videos(api_key, playlist_id)
+    if error:
+        return None, error
+    playlist = PlaylistSession(playlist_id=playlist_id, videos=videos, fetched_at=datetime.utcnow())
+    # Empty playlists are not worth keeping, nor ones with video details that
+    # failed to load: the next step should try those again
+    incomplete = sum(1 for video in videos if video.get('error') not in (None, VIDEO_UNAVAILABLE))
+    if videos and not incomplete:
+        playlist_cache.set(_key(playlist_id), playlist)
+    else:
+        playlist_cache.delete(_key(playlist_id))
+    logging.info('Fetched playlist %s: %s videos, %s without details', playlist_id, len(videos), incomplete)
+    return playlist, None
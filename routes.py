@@ -1,23 +1,58 @@
-import json
 import logging
+import math
+import os
 import uuid
 from datetime import datetime
 
-from flask import flash, jsonify, redirect, render_template, request, send_from_directory, session, url_for
+from flask import (
+    Response,
+    abort,
+    flash,
+    jsonify,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    send_file,
+    send_from_directory,
+    session,
+    stream_with_context,
+    url_for,
+)
 from flask_login import current_user, login_required, login_user, logout_user
+from werkzeug.datastructures import MultiDict
 
 from app import app, db
+from cache import LRUCache, create_cache
+from catalog import catalog_validators
+from catalog_export import iter_export_gzip, iter_export_json
+from catalog_import import SECTION_ORDER, import_videos
+from collection_order import POSITION_GAP, append_lecture, move_lecture, next_position, reorder
 from db_utils import (
-    apply_search_filters,
-    get_collection_lectures,
-    get_filtered_lectures_query,
+    count_facets,
+    count_lectures,
+    decode_cursor,
+    decode_offset_cursor,
+    encode_cursor,
+    encode_offset_cursor,
+    get_collection_page,
+    get_collection_summaries,
     get_metadata,
+    hydrate_lectures,
+    is_fuzzy_search,
+    normalize_search_params,
     safe_commit,
+    search_lecture_ids,
 )
+from facet_index import facet_index
 from forms import CollectionForm, LectureForm, LoginForm, MetadataForm
-from models import Collection, Lecture, Rank, Tag, Topic, User, collection_lecture, lecture_tag, lecture_topic
+from jobs import check_metadata_quota, job_status, recent_jobs, save_upload, submit_job
+from models import Collection, Job, Lecture, Rank, Tag, Topic, User, collection_lecture, lecture_tag, lecture_topic
+from playlist_session import load_playlist, playlist_cache
+from suggest_index import suggest_from_database, suggest_index
 from utils import get_youtube_video_info
-from youtube_utils import extract_playlist_id, fetch_playlist_videos
+from youtube_client import QuotaExceeded, youtube
+from youtube_utils import extract_playlist_id
 
 # Setup CSRF protection
 def generate_csrf_token():
@@ -27,18 +62,142 @@ def generate_csrf_token():
 
 app.jinja_env.globals['csrf_token'] = generate_csrf_token
 
+# Result counts per filter set, so cursor pages can show a total without a COUNT
+total_estimates = LRUCache(maxsize=1024, ttl=300)
+
+# Sidebar facet counts per filter set and catalog version
+facet_counts_cache = LRUCache(maxsize=512)
+
+# Whole /api/search responses, keyed by the request and the versions of the
+# tables a response is built from, so any catalog write invalidates them
+SEARCH_TABLES = ('lecture', 'topic', 'tag', 'rank', 'lecture_topic', 'lecture_tag')
+search_cache = create_cache(
+    app.config['CACHE_BACKEND'],
+    maxsize=app.config['SEARCH_CACHE_SIZE'],
+    directory=app.config['CACHE_DIR'],
+    namespace='search',
+)
+
+# Tables the collection pages are rendered from
+COLLECTION_TABLES = ('collection', 'collection_lecture', 'lecture')
+
+# Lectures per chunk of a collection page, a multiple of the three card columns
+COLLECTION_PAGE_SIZE = 24
+
+def get_release_tag():
+    """Newest modification time of the templates and static files, so page ETags change on deploy"""
+    newest = 0
+    for folder in (app.template_folder, app.static_folder):
+        for root, _, files in os.walk(os.path.join(app.root_path, folder)):
+            for name in files:
+                newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+    return int(newest)
+
+RELEASE_TAG = get_release_tag()
+
+# Caches reported on the admin panel
+response_caches = {
+    'search': search_cache,
+    'facet counts': facet_counts_cache,
+    'total estimates': total_estimates,
+    'playlists': playlist_cache,
+}
+
+def get_search_params(args=None):
+    """Search filters from the request query string, or from other `args`"""
+    args = request.args if args is None else args
+    return {
+        'q': args.get('q', ''),
+        'topics': args.getlist('topics[]'),
+        'tags': args.getlist('tags[]'),
+        'rank': args.get('rank'),
+        'match': args.get('match', ''),
+    }
+
+def cached_search(request_key, versions, compute):
+    """Search result for a request key from search_cache, computed on a miss"""
+    cache_key = (*request_key, tuple(versions.get(table) for table in SEARCH_TABLES))
+    result = search_cache.get(cache_key)
+    if result is None:
+        result = compute()
+        search_cache.set(cache_key, result)
+    return result
+
+def page_etag_parts():
+    """Per-visitor state that rendered pages depend on besides the catalog"""
+    if current_user.is_authenticated:
+        return RELEASE_TAG, current_user.get_id(), session.get('_csrf_token')
+    return RELEASE_TAG, None, None
+
+def is_not_modified(etag, last_modified):
+    """Whether the client's cached copy is current, judged from the request headers alone"""
+    # A pending flash message has to be rendered, so never answer 304 over it
+    if '_flashes' in session:
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+def conditional_response(response, etag, last_modified, per_visitor=False):
+    """Add validators to a response; clients must revalidate before reusing it"""
+    response = make_response(response)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    if per_visitor:
+        response.vary.add('Cookie')
+    return response
+
+def serialize_lecture(lecture):
+    return {
+        'id': lecture.id,
+        'title': lecture.title,
+        'youtube_id': lecture.youtube_id,
+        'thumbnail_url': lecture.thumbnail_url,
+        'publish_date': lecture.publish_date.isoformat(),
+        'duration_seconds': lecture.duration_seconds,
+        'topics': [t.name for t in lecture.topics],
+        'tags': [t.name for t in lecture.tags],
+        'rank': lecture.rank.name if lecture.rank else None,
+    }
+
 @app.route('/about')
 def about():
     return render_template('about.html')
 
 # Latest route has been removed
 
+# Results per page of the search page script
+SEARCH_PAGE_SIZE = 9
+
 @app.route('/')
 @app.route('/search')
 def search():
+    versions, etag, last_modified = catalog_validators(SEARCH_TABLES, 'search page', *page_etag_parts())
+    if is_not_modified(etag, last_modified):
+        return conditional_response(Response(status=304), etag, last_modified, per_visitor=True)
+
     # Get metadata using utility function
-    metadata = get_metadata()
-    return render_template('search.html', **metadata)
+    metadata = get_metadata(versions)
+
+    # The first page of results comes with the page, exactly as the script would
+    # fetch it, so lectures show without a second round trip
+    search_params = get_search_params(MultiDict())
+    request_key = (normalize_search_params(search_params), '', SEARCH_PAGE_SIZE, False)
+    first_page = cached_search(request_key, versions, lambda: search_by_cursor(
+        search_params, None, SEARCH_PAGE_SIZE, False, versions,
+    ))
+    cards_key = ('cards', RELEASE_TAG, *request_key, tuple(versions.get(table) for table in SEARCH_TABLES))
+    first_page_cards = search_cache.get(cards_key)
+    if first_page_cards is None:
+        first_page_cards = render_template('lecture_cards.html', lectures=first_page['lectures'])
+        search_cache.set(cards_key, first_page_cards)
+
+    page = render_template('search.html', first_page=first_page, first_page_cards=first_page_cards, **metadata)
+    return conditional_response(page, etag, last_modified, per_visitor=True)
 
 @app.route('/api/search')
 def api_search():
@@ -46,52 +205,206 @@ def api_search():
         # Validate and sanitize input parameters
         try:
             page = max(1, request.args.get('page', 1, type=int))
-            per_page = min(50, request.args.get('per_page', 9, type=int))  # Default 9 items per page
+            per_page = max(1, min(50, request.args.get('per_page', 9, type=int)))  # Default 9 items per page
         except (ValueError, TypeError):
             page = 1
             per_page = 9
 
         # Collect search parameters
-        search_params = {
-            'q': request.args.get('q', ''),
-            'topics': request.args.getlist('topics[]'),
-            'tags': request.args.getlist('tags[]'),
-            'rank': request.args.get('rank'),
-        }
+        search_params = get_search_params()
 
-        # Get base query and apply filters
-        lectures_query = get_filtered_lectures_query()
-        lectures_query = apply_search_filters(lectures_query, search_params)
-
-        # Add pagination
-        pagination = lectures_query.paginate(page=page, per_page=per_page, error_out=False)
-        lectures = pagination.items
-
-        # Process results
-        lecture_data = []
-        for lecture in lectures:
-            lecture_data.append({
-                'id': lecture.id,
-                'title': lecture.title,
-                'youtube_id': lecture.youtube_id,
-                'thumbnail_url': lecture.thumbnail_url,
-                'publish_date': lecture.publish_date.isoformat(),
-                'duration_seconds': lecture.duration_seconds,
-                'topics': [t.name for t in lecture.topics],
-                'tags': [t.name for t in lecture.tags],
-                'rank': lecture.rank.name if lecture.rank else None,
-            })
-
-        return jsonify({
-            'lectures': lecture_data,
-            'has_next': pagination.has_next,
-            'total_pages': pagination.pages,
-            'current_page': pagination.page,
-        })
+        # Keyset pagination for clients that send a cursor (empty for the first page).
+        # Fuzzy matches are ranked by similarity, so their cursors hold an offset
+        cursor = request.args.get('cursor')
+        cursor_key = None
+        if cursor:
+            try:
+                cursor_key = decode_offset_cursor(cursor) if is_fuzzy_search(search_params) else decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+        include_total = request.args.get('include_total') == '1'
+        request_key = (
+            normalize_search_params(search_params),
+            page if cursor is None else cursor,
+            per_page,
+            include_total,
+        )
+        versions, etag, last_modified = catalog_validators(SEARCH_TABLES, request_key)
+        if is_not_modified(etag, last_modified):
+            return conditional_response(Response(status=304), etag, last_modified)
+
+        if cursor is None:
+            result = cached_search(request_key, versions, lambda: search_by_page(
+                search_params, page, per_page, versions,
+            ))
+        else:
+            result = cached_search(request_key, versions, lambda: search_by_cursor(
+                search_params, cursor_key, per_page, include_total, versions,
+            ))
+
+        return conditional_response(jsonify(result), etag, last_modified)
     except Exception as e:
         logging.error('Error in api_search: %s', e)
         return jsonify({'error': str(e)}), 500
 
+def search_by_page(search_params, page, per_page, versions):
+    """One numbered page of search results with the total page count"""
+    # Phase one: the page of lecture IDs, from the in-memory facet index
+    # when it is warm, otherwise from the narrow lecture table
+    offset = (page - 1) * per_page
+    indexed = facet_index.search(search_params, offset, per_page, versions=versions)
+    if indexed is not None:
+        lecture_ids, total = indexed
+    else:
+        total = count_lectures(search_params)
+        lecture_ids = search_lecture_ids(search_params, per_page, offset=offset)
+
+    # Phase two: load just those lectures with their topics, tags and rank
+    lectures = hydrate_lectures(lecture_ids)
+    total_pages = math.ceil(total / per_page)
+    has_next = page < total_pages
+
+    return {
+        'lectures': [serialize_lecture(lecture) for lecture in lectures],
+        'has_next': has_next,
+        'total_pages': total_pages,
+        'current_page': page,
+    }
+
+def search_by_cursor(search_params, cursor_key, per_page, include_total, versions):
+    """One keyset page of search results, without a COUNT query"""
+    # Fetch one extra row to learn whether there is a next page
+    if is_fuzzy_search(search_params):
+        offset = cursor_key or 0
+        total = None
+        lecture_ids = search_lecture_ids(search_params, per_page + 1, offset=offset)
+    else:
+        after_id = cursor_key[1] if cursor_key else None
+        indexed = facet_index.search(search_params, 0, per_page + 1, after_id=after_id, versions=versions)
+        if indexed is not None:
+            lecture_ids, total = indexed
+        else:
+            total = None
+            lecture_ids = search_lecture_ids(search_params, per_page + 1, cursor_key=cursor_key)
+
+    has_next = len(lecture_ids) > per_page
+    lectures = hydrate_lectures(lecture_ids[:per_page])
+    if not has_next:
+        next_cursor = None
+    elif is_fuzzy_search(search_params):
+        next_cursor = encode_offset_cursor(offset + per_page)
+    else:
+        next_cursor = encode_cursor(lectures[-1])
+    result = {
+        'lectures': [serialize_lecture(lecture) for lecture in lectures],
+        'has_next': has_next,
+        'next_cursor': next_cursor,
+    }
+
+    # The exact total is only counted on request, otherwise a recent count is reused
+    filters_key = normalize_search_params(search_params)
+    if total is None and include_total:
+        total = count_lectures(search_params)
+    if total is not None:
+        total_estimates.set(filters_key, total)
+        result['total'] = total
+    else:
+        result['total_estimate'] = total_estimates.get(filters_key)
+
+    return result
+
+@app.route('/api/search/facets')
+def api_search_facets():
+    """Result counts per topic, tag and rank for the current search"""
+    try:
+        search_params = get_search_params()
+        filters_key = normalize_search_params(search_params)
+        versions, etag, last_modified = catalog_validators(facet_index.tables, 'facets', filters_key)
+        if is_not_modified(etag, last_modified):
+            return conditional_response(Response(status=304), etag, last_modified)
+
+        cache_key = (filters_key, facet_index.versions_key(versions))
+        counts = facet_counts_cache.get(cache_key)
+        if counts is None:
+            counts = facet_index.facet_counts(search_params, versions)
+            if counts is None:
+                counts = count_facets(search_params)
+            facet_counts_cache.set(cache_key, counts)
+        return conditional_response(jsonify(counts), etag, last_modified)
+    except Exception as e:
+        logging.error('Error in api_search_facets: %s', e)
+        return jsonify({'error': str(e)}), 500
+
+# Most lectures /api/lectures returns in one call
+MAX_BATCH_LECTURES = 300
+
+def parse_list_arg(name):
+    """Comma separated values of a query string argument, which may also be repeated"""
+    return [value.strip() for arg in request.args.getlist(name) for value in arg.split(',') if value.strip()]
+
+@app.route('/api/lectures')
+def api_lectures():
+    """Compact records for a batch of lectures, by ?ids=1,2 and/or ?youtube_ids=a,b"""
+    try:
+        lecture_ids = [int(value) for value in parse_list_arg('ids')]
+    except ValueError:
+        return jsonify({'error': 'ids must be integers'}), 400
+    youtube_ids = parse_list_arg('youtube_ids')
+    if len(lecture_ids) + len(youtube_ids) > MAX_BATCH_LECTURES:
+        return jsonify({'error': f'At most {MAX_BATCH_LECTURES} lectures per request'}), 400
+
+    try:
+        _, etag, last_modified = catalog_validators(('lecture',), 'lectures', lecture_ids, youtube_ids)
+        if is_not_modified(etag, last_modified):
+            return conditional_response(Response(status=304), etag, last_modified)
+
+        lectures = []
+        if lecture_ids or youtube_ids:
+            # One query on the primary key and the unique youtube_id index, no relationships
+            rows = db.session.query(
+                Lecture.id,
+                Lecture.youtube_id,
+                Lecture.title,
+                Lecture.thumbnail_url,
+                Lecture.publish_date,
+                Lecture.duration_seconds,
+            ).filter(db.or_(Lecture.id.in_(lecture_ids), Lecture.youtube_id.in_(youtube_ids))).order_by(Lecture.id)
+            lectures = [{
+                'id': row.id,
+                'youtube_id': row.youtube_id,
+                'title': row.title,
+                'thumbnail_url': row.thumbnail_url,
+                'publish_date': row.publish_date.isoformat() if row.publish_date else None,
+                'duration_seconds': row.duration_seconds,
+            } for row in rows]
+        return conditional_response(jsonify({'lectures': lectures}), etag, last_modified)
+    except Exception as e:
+        logging.error('Error in api_lectures: %s', e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/suggest')
+def api_suggest():
+    """Lecture titles and topic, tag and collection names with words starting with the typed text"""
+    try:
+        text = request.args.get('q', '')[:100]
+        limit = max(1, min(suggest_index.max_limit, request.args.get('limit', 5, type=int)))
+        versions, etag, last_modified = catalog_validators(suggest_index.tables, 'suggest', text.lower(), limit)
+        if is_not_modified(etag, last_modified):
+            return conditional_response(Response(status=304), etag, last_modified)
+
+        suggestions = suggest_index.suggest(text, limit, versions)
+        if suggestions is None:
+            suggestions = suggest_from_database(text, limit)
+        result = {
+            kind: [{'id': entry_id, 'label': label} for entry_id, label in entries]
+            for kind, entries in suggestions.items()
+        }
+        return conditional_response(jsonify(result), etag, last_modified)
+    except Exception as e:
+        logging.error('Error in api_suggest: %s', e)
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
@@ -119,10 +432,11 @@ def logout():
 def edit_lecture(lecture_id):
     lecture = Lecture.query.get_or_404(lecture_id)
     form = LectureForm()
-    form.topics.choices = [(t.id, t.name) for t in Topic.query.all()]
-    form.tags.choices = [(t.id, t.name) for t in Tag.query.all()]
-    form.rank.choices = [(r.id, r.name) for r in Rank.query.all()]
-    form.collections.choices = [(c.id, c.name) for c in Collection.query.all()]
+    metadata = get_metadata()
+    form.topics.choices = [(t.id, t.name) for t in metadata['topics']]
+    form.tags.choices = [(t.id, t.name) for t in metadata['tags']]
+    form.rank.choices = [(r.id, r.name) for r in metadata['ranks']]
+    form.collections.choices = [(c.id, c.name) for c in metadata['collections']]
 
     if form.validate_on_submit():
         try:
@@ -171,7 +485,7 @@ def edit_lecture(lecture_id):
             # Add lecture to newly selected collections
             for collection in selected_collections:
                 if collection not in current_collections:
-                    collection.lectures.append(lecture)
+                    append_lecture(collection.id, lecture.id)
 
             db.session.commit()
             flash('Lecture updated successfully!')
@@ -338,102 +652,21 @@ def manage_metadata():
                          collection_form=collection_form,
                          collections=metadata['collections'])
 
-@app.route('/admin/export', methods=['GET'])
+@app.route('/admin/export', methods=['GET', 'POST'])
 @login_required
 def export_data():
-    try:
-        # Get all data
-        lectures = Lecture.query.all()
-        topics = Topic.query.all()
-        tags = Tag.query.all()
-        ranks = Rank.query.all()
-        collections = Collection.query.all()
-
-        # Prepare data for export
-        export_data = {
-            'lectures': [],
-            'topics': [],
-            'tags': [],
-            'ranks': [],
-            'collections': [],
-        }
-
-        # Add topics
-        for topic in topics:
-            export_data['topics'].append({
-                'id': topic.id,
-                'name': topic.name,
-            })
-
-        # Add tags
-        for tag in tags:
-            export_data['tags'].append({
-                'id': tag.id,
-                'name': tag.name,
-            })
-
-        # Add ranks
-        for rank in ranks:
-            export_data['ranks'].append({
-                'id': rank.id,
-                'name': rank.name,
-            })
-
-        # Add collections
-        for collection in collections:
-            # Get lectures with their positions
-            lecture_positions = []
-            for lecture in collection.lectures:
-                position_data = db.session.query(collection_lecture.c.position).filter(
-                    collection_lecture.c.collection_id == collection.id,
-                    collection_lecture.c.lecture_id == lecture.id,
-                ).first()
-
-                position = position_data[0] if position_data else 0
-                lecture_positions.append({
-                    'lecture_id': lecture.id,
-                    'position': position,
-                })
-
-            # Sort by position
-            lecture_positions.sort(key=lambda x: x['position'])
-
-            export_data['collections'].append({
-                'id': collection.id,
-                'name': collection.name,
-                'description': collection.description,
-
-                'created_at': collection.created_at.isoformat() if collection.created_at else None,
-                'lectures': lecture_positions,
-            })
-
-        # Add lectures
-        for lecture in lectures:
-            lecture_data = {
-                'id': lecture.id,
-                'title': lecture.title,
-                'youtube_id': lecture.youtube_id,
-                'thumbnail_url': lecture.thumbnail_url,
-                'publish_date': lecture.publish_date.isoformat(),
-                'duration_seconds': lecture.duration_seconds,
-                'rank_id': lecture.rank_id,
-                'topic_ids': [topic.id for topic in lecture.topics],
-                'tag_ids': [tag.id for tag in lecture.tags],
-                'collection_ids': [c.id for c in Collection.query.join(
-                    collection_lecture, 
-                    Collection.id == collection_lecture.c.collection_id,
-                ).filter(collection_lecture.c.lecture_id == lecture.id).all()],
-            }
-            export_data['lectures'].append(lecture_data)
-
-        # Return JSON file for download
-        response = jsonify(export_data)
-        response.headers.set('Content-Disposition', 'attachment', filename='baduk_lectures_export.json')
+    if request.method == 'POST':
+        # A background job writes the file, for the export button with progress
+        job = submit_job('export', {'file_format': request.values.get('format', 'json')}, current_user.id)
+        return job_started(job, url_for('db_export_page'))
+    # Streamed as it is read, so memory use stays flat however big the catalog is
+    if request.args.get('format') == 'ndjson':
+        response = Response(stream_with_context(iter_export_gzip()), mimetype='application/gzip')
+        response.headers.set('Content-Disposition', 'attachment', filename='baduk_lectures_export.ndjson.gz')
         return response
-    except Exception as e:
-        logging.error('Error exporting data: %s', e)
-        flash(f'Error exporting data: {e}')
-        return redirect(url_for('admin_panel'))
+    response = Response(stream_with_context(iter_export_json()), mimetype='application/json')
+    response.headers.set('Content-Disposition', 'attachment', filename='baduk_lectures_export.json')
+    return response
 
 @app.route('/admin/import', methods=['GET', 'POST'])
 @login_required
@@ -450,168 +683,12 @@ def import_data():
                 return redirect(request.url)
 
             if file:
-                import_data = json.loads(file.read().decode('utf-8'))
-
-                # Create mappings to store old ID to new ID relationships
-                topic_id_map = {}
-                tag_id_map = {}
-                rank_id_map = {}
-                collection_id_map = {}
-                lecture_id_map = {}
-
-                # Process topics
-                if 'topics' in import_data:
-                    for topic_data in import_data['topics']:
-                        # Check if topic already exists
-                        existing_topic = Topic.query.filter_by(name=topic_data['name']).first()
-                        if not existing_topic:
-                            # Always create with a new ID
-                            new_topic = Topic(name=topic_data['name'])
-                            db.session.add(new_topic)
-                            db.session.flush()
-                            topic_id_map[topic_data['id']] = new_topic.id
-                        else:
-                            topic_id_map[topic_data['id']] = existing_topic.id
-
-                # Process tags
-                if 'tags' in import_data:
-                    for tag_data in import_data['tags']:
-                        # Check if tag already exists
-                        existing_tag = Tag.query.filter_by(name=tag_data['name']).first()
-                        if not existing_tag:
-                            # Always create with a new ID
-                            new_tag = Tag(name=tag_data['name'])
-                            db.session.add(new_tag)
-                            db.session.flush()
-                            tag_id_map[tag_data['id']] = new_tag.id
-                        else:
-                            tag_id_map[tag_data['id']] = existing_tag.id
-
-                # Process ranks
-                if 'ranks' in import_data:
-                    for rank_data in import_data['ranks']:
-                        # Check if rank already exists
-                        existing_rank = Rank.query.filter_by(name=rank_data['name']).first()
-                        if not existing_rank:
-                            # Always create with a new ID
-                            new_rank = Rank(name=rank_data['name'])
-                            db.session.add(new_rank)
-                            db.session.flush()
-                            rank_id_map[rank_data['id']] = new_rank.id
-                        else:
-                            rank_id_map[rank_data['id']] = existing_rank.id
-
-                # Process collections (basic info first, we'll assign lectures later)
-                if 'collections' in import_data:
-                    for collection_data in import_data['collections']:
-                        # Check if collection already exists
-                        existing_collection = Collection.query.filter_by(name=collection_data['name']).first()
-                        if not existing_collection:
-                            # Always create with a new ID
-                            if created_at_str := collection_data.get('created_at'):
-                                created_at = datetime.fromisoformat(created_at_str)
-                            else:
-                                created_at = datetime.utcnow()
-                            new_collection = Collection(
-                                name=collection_data['name'],
-                                description=collection_data.get('description', ''),
-                                created_at=created_at,
-                            )
-                            db.session.add(new_collection)
-                            db.session.flush()
-                            collection_id_map[collection_data['id']] = new_collection.id
-                        else:
-                            collection_id_map[collection_data['id']] = existing_collection.id
-
-                # Process lectures
-                if 'lectures' in import_data:
-                    for lecture_data in import_data['lectures']:
-                        # Check if lecture already exists by YouTube ID
-                        existing_lecture = Lecture.query.filter_by(youtube_id=lecture_data['youtube_id']).first()
-                        if not existing_lecture:
-                            # Always create with a new ID
-                            new_lecture = Lecture(
-                                title=lecture_data['title'],
-                                youtube_id=lecture_data['youtube_id'],
-                                thumbnail_url=lecture_data['thumbnail_url'],
-                                publish_date=datetime.fromisoformat(lecture_data['publish_date']),
-                                duration_seconds=lecture_data.get('duration_seconds',0),
-                            )
-
-                            # Set rank
-                            if lecture_data.get('rank_id') and lecture_data['rank_id'] in rank_id_map:
-                                new_lecture.rank_id = rank_id_map[lecture_data['rank_id']]
-                            
-                            db.session.add(new_lecture)
-                            db.session.flush()
-                            
-                            # Add topics
-                            if 'topic_ids' in lecture_data:
-                                for old_topic_id in lecture_data['topic_ids']:
-                                    if old_topic_id in topic_id_map:
-                                        topic = Topic.query.get(topic_id_map[old_topic_id])
-                                        if topic:
-                                            new_lecture.topics.append(topic)
-
-                            # Add tags
-                            if 'tag_ids' in lecture_data:
-                                for old_tag_id in lecture_data['tag_ids']:
-                                    if old_tag_id in tag_id_map:
-                                        tag = Tag.query.get(tag_id_map[old_tag_id])
-                                        if tag:
-                                            new_lecture.tags.append(tag)
-                            
-                            lecture_id_map[lecture_data['id']] = new_lecture.id
-                        else:
-                            lecture_id_map[lecture_data['id']] = existing_lecture.id
-
-                # Now associate lectures with collections
-                if 'collections' in import_data:
-                    for collection_data in import_data['collections']:
-                        if collection_data['id'] in collection_id_map:
-                            collection = Collection.query.get(collection_id_map[collection_data['id']])
-                            if collection:
-                                # Handle both new and old format
-                                if 'lectures' in collection_data:
-                                    # New format with position data
-                                    for lecture_data in collection_data['lectures']:
-                                        old_lecture_id = lecture_data['lecture_id']
-                                        position = lecture_data.get('position', 0)
-
-                                        if old_lecture_id in lecture_id_map:
-                                            lecture = Lecture.query.get(lecture_id_map[old_lecture_id])
-                                            if lecture:
-                                                if lecture not in collection.lectures:
-                                                    collection.lectures.append(lecture)
-
-                                                # Set position
-                                                db.session.execute(
-                                                    collection_lecture.update().
-                                                    where(collection_lecture.c.collection_id == collection.id).
-                                                    where(collection_lecture.c.lecture_id == lecture.id).
-                                                    values(position=position),
-                                                )
-
-                                elif 'lecture_ids' in collection_data:
-                                    # Old format without position
-                                    for position, old_lecture_id in enumerate(collection_data['lecture_ids']):
-                                        if old_lecture_id in lecture_id_map:
-                                            lecture = Lecture.query.get(lecture_id_map[old_lecture_id])
-                                            if lecture:
-                                                if lecture not in collection.lectures:
-                                                    collection.lectures.append(lecture)
-
-                                                # Set position
-                                                db.session.execute(
-                                                    collection_lecture.update().
-                                                    where(collection_lecture.c.collection_id == collection.id).
-                                                    where(collection_lecture.c.lecture_id == lecture.id).
-                                                    values(position=position),
-                                                )
-
-                db.session.commit()
-                flash('Data imported successfully')
-                return redirect(url_for('admin_panel'))
+                # Saved for a background job, which reads it chunk by chunk
+                job = submit_job('import', {
+                    'upload_path': save_upload(file),
+                    'dry_run': request.form.get('dry_run') == '1',
+                }, current_user.id)
+                return job_started(job, url_for('admin_panel'))
 
         except Exception as e:
             db.session.rollback()
@@ -788,61 +865,18 @@ def import_table():
         replace_table = request.form.get('replace_table') == '1'
 
         if file:
-            import_data = json.loads(file.read().decode('utf-8'))
-            
-            # Validate that the file contains the expected table
-            if table_name not in import_data and f'{table_name}' not in import_data:
-                flash(f'The selected file does not contain {table_name} data')
-                return redirect(url_for('db_import_page'))
-                
-            # If replacing, clear the table first
-            if replace_table:
-                if table_name == 'lectures':
-                    db.session.execute(db.text('DELETE FROM lecture_topic'))
-                    db.session.execute(db.text('DELETE FROM lecture_tag'))
-                    db.session.execute(db.text('DELETE FROM collection_lecture'))
-                    db.session.execute(db.text('DELETE FROM lecture'))
-                elif table_name == 'topics':
-                    db.session.execute(db.text('DELETE FROM lecture_topic'))
-                    db.session.execute(db.text('DELETE FROM topic'))
-                elif table_name == 'tags':
-                    db.session.execute(db.text('DELETE FROM lecture_tag'))
-                    db.session.execute(db.text('DELETE FROM tag'))
-                elif table_name == 'ranks':
-                    db.session.execute(db.text('UPDATE lecture SET rank_id = NULL'))
-                    db.session.execute(db.text('DELETE FROM rank'))
-                elif table_name == 'collections':
-                    db.session.execute(db.text('DELETE FROM collection_lecture'))
-                    db.session.execute(db.text('DELETE FROM collection'))
-                elif table_name == 'lecture_topics':
-                    db.session.execute(db.text('DELETE FROM lecture_topic'))
-                elif table_name == 'lecture_tags':
-                    db.session.execute(db.text('DELETE FROM lecture_tag'))
-                elif table_name == 'collection_lectures':
-                    db.session.execute(db.text('DELETE FROM collection_lecture'))
-                    
-                db.session.commit()
-            
-            # Import the data using the appropriate handler
-            table_import_handler = {
-                'lectures': import_lectures,
-                'topics': import_topics,
-                'tags': import_tags,
-                'ranks': import_ranks,
-                'collections': import_collections,
-                'lecture_topics': import_lecture_topics,
-                'lecture_tags': import_lecture_tags,
-                'collection_lectures': import_collection_lectures,
-            }
-            
-            if table_name in table_import_handler:
-                count = table_import_handler[table_name](import_data)
-                db.session.commit()
-                flash(f'Successfully imported {count} {table_name} records')
-            else:
+            if table_name not in SECTION_ORDER:
                 flash(f'Unknown table name: {table_name}')
-                
-            return redirect(url_for('db_import_page'))
+                return redirect(url_for('db_import_page'))
+
+            # The job checks the file has the table before replacing anything
+            job = submit_job('import_table', {
+                'upload_path': save_upload(file),
+                'table_name': table_name,
+                'replace_table': replace_table,
+                'dry_run': request.form.get('dry_run') == '1',
+            }, current_user.id)
+            return job_started(job, url_for('db_import_page'))
             
     except Exception as e:
         db.session.rollback()
@@ -850,283 +884,93 @@ def import_table():
         flash(f'Error importing table: {e}')
         return redirect(url_for('db_import_page'))
 
-# Helper functions for table import
-def import_topics(import_data):
-    data = import_data.get('topics', [])
-    count = 0
-    
-    for topic_data in data:
-        existing_topic = Topic.query.filter_by(name=topic_data['name']).first()
-        if not existing_topic:
-            new_topic = Topic(name=topic_data['name'])
-            db.session.add(new_topic)
-            count += 1
-            
-    return count
-
-def import_tags(import_data):
-    data = import_data.get('tags', [])
-    count = 0
-    
-    for tag_data in data:
-        existing_tag = Tag.query.filter_by(name=tag_data['name']).first()
-        if not existing_tag:
-            new_tag = Tag(name=tag_data['name'])
-            db.session.add(new_tag)
-            count += 1
-            
-    return count
-
-def import_ranks(import_data):
-    data = import_data.get('ranks', [])
-    count = 0
-    
-    for rank_data in data:
-        existing_rank = Rank.query.filter_by(name=rank_data['name']).first()
-        if not existing_rank:
-            new_rank = Rank(name=rank_data['name'])
-            db.session.add(new_rank)
-            count += 1
-            
-    return count
-
-def import_lectures(import_data):
-    data = import_data.get('lectures', [])
-    count = 0
-    
-    for lecture_data in data:
-        existing_lecture = Lecture.query.filter_by(youtube_id=lecture_data['youtube_id']).first()
-        if not existing_lecture:
-            publish_date = datetime.fromisoformat(lecture_data['publish_date'])
-            new_lecture = Lecture(
-                title=lecture_data['title'],
-                youtube_id=lecture_data['youtube_id'],
-                thumbnail_url=lecture_data['thumbnail_url'],
-                publish_date=publish_date,
-                duration_seconds=lecture_data['duration_seconds'],
-                rank_id=lecture_data['rank_id'],
-            )
-            db.session.add(new_lecture)
-            count += 1
-            
-    return count
-
-def import_collections(import_data):
-    data = import_data.get('collections', [])
-    count = 0
-    
-    for collection_data in data:
-        existing_collection = Collection.query.filter_by(name=collection_data['name']).first()
-        if not existing_collection:
-            if collection_data['created_at']:
-                created_at = datetime.fromisoformat(collection_data['created_at'])
-            else:
-                created_at = datetime.utcnow()
-            new_collection = Collection(
-                name=collection_data['name'],
-                description=collection_data['description'],
-                created_at=created_at,
-            )
-            db.session.add(new_collection)
-            count += 1
-            
-    return count
-
-def import_lecture_topics(import_data):
-    data = import_data.get('lecture_topics', [])
-    count = 0
-    
-    for lt_data in data:
-        # Check if relationship exists
-        exists = db.session.query(lecture_topic).filter_by(
-            lecture_id=lt_data['lecture_id'],
-            topic_id=lt_data['topic_id'],
-        ).first() is not None
-        
-        if not exists:
-            # Check if both lecture and topic exist
-            lecture = Lecture.query.get(lt_data['lecture_id'])
-            topic = Topic.query.get(lt_data['topic_id'])
-            
-            if lecture and topic:
-                db.session.execute(
-                    db.text('INSERT INTO lecture_topic (lecture_id, topic_id) VALUES (:lecture_id, :topic_id)'),
-                    {'lecture_id': lt_data['lecture_id'], 'topic_id': lt_data['topic_id']},
-                )
-                count += 1
-            
-    return count
-
-def import_lecture_tags(import_data):
-    data = import_data.get('lecture_tags', [])
-    count = 0
-    
-    for lt_data in data:
-        # Check if relationship exists
-        exists = db.session.query(lecture_tag).filter_by(
-            lecture_id=lt_data['lecture_id'],
-            tag_id=lt_data['tag_id'],
-        ).first() is not None
-        
-        if not exists:
-            # Check if both lecture and tag exist
-            lecture = Lecture.query.get(lt_data['lecture_id'])
-            tag = Tag.query.get(lt_data['tag_id'])
-            
-            if lecture and tag:
-                db.session.execute(
-                    db.text('INSERT INTO lecture_tag (lecture_id, tag_id) VALUES (:lecture_id, :tag_id)'),
-                    {'lecture_id': lt_data['lecture_id'], 'tag_id': lt_data['tag_id']},
-                )
-                count += 1
-            
-    return count
-
-def import_collection_lectures(import_data):
-    data = import_data.get('collection_lectures', [])
-    count = 0
-    
-    for cl_data in data:
-        # Check if relationship exists
-        exists = db.session.query(collection_lecture).filter_by(
-            collection_id=cl_data['collection_id'],
-            lecture_id=cl_data['lecture_id'],
-        ).first() is not None
-        
-        if not exists:
-            # Check if both collection and lecture exist
-            collection = Collection.query.get(cl_data['collection_id'])
-            lecture = Lecture.query.get(cl_data['lecture_id'])
-            
-            if collection and lecture:
-                sql = 'INSERT INTO collection_lecture (collection_id, lecture_id, position) ' \
-                    'VALUES (:collection_id, :lecture_id, :position)'
-                db.session.execute(db.text(sql), {
-                    'collection_id': cl_data['collection_id'], 'lecture_id': cl_data['lecture_id'],
-                    'position': cl_data['position'],
-                })
-                count += 1
-            
-    return count
-
 @app.route('/admin/reset', methods=['POST'])
 @login_required
 def reset_data():
-    try:
-        # Get all data first for backup
-        lectures = Lecture.query.all()
-        topics = Topic.query.all()
-        tags = Tag.query.all()
-        ranks = Rank.query.all()
-        collections = Collection.query.all()
-
-        # Prepare data for export (same as in export_data)
-        export_data = {
-            'lectures': [],
-            'topics': [],
-            'tags': [],
-            'ranks': [],
-            'collections': [],
-        }
+    # The job backs the catalog up to its result file before deleting anything
+    job = submit_job('reset', user_id=current_user.id)
+    return job_started(job, url_for('admin_panel'))
 
-        # Add topics
-        for topic in topics:
-            export_data['topics'].append({
-                'id': topic.id,
-                'name': topic.name,
-            })
-
-        # Add tags
-        for tag in tags:
-            export_data['tags'].append({
-                'id': tag.id,
-                'name': tag.name,
-            })
-
-        # Add ranks
-        for rank in ranks:
-            export_data['ranks'].append({
-                'id': rank.id,
-                'name': rank.name,
-            })
-
-        # Add collections with full details
-        for collection in collections:
-            # Get lectures with their positions
-            lecture_positions = []
-            for lecture in collection.lectures:
-                position_data = db.session.query(collection_lecture.c.position).filter(
-                    collection_lecture.c.collection_id == collection.id,
-                    collection_lecture.c.lecture_id == lecture.id,
-                ).first()
-
-                position = position_data[0] if position_data else 0
-                lecture_positions.append({
-                    'lecture_id': lecture.id,
-                    'position': position,
-                })
+@app.route('/admin/refresh-metadata', methods=['POST'])
+@login_required
+def refresh_metadata():
+    if not current_user.is_admin:
+        flash('You do not have admin privileges')
+        return redirect(url_for('search'))
+    try:
+        check_metadata_quota()
+    except QuotaExceeded as e:
+        return job_refused(str(e), url_for('admin_panel'))
+    job = submit_job('refresh_metadata', user_id=current_user.id)
+    return job_started(job, url_for('admin_panel'))
+
+def job_json(job):
+    state = job_status(job)
+    state['status_url'] = url_for('job_detail', job_id=job.id)
+    state['download_url'] = url_for('download_job_result', job_id=job.id) if state['has_file'] else None
+    return state
+
+def wants_json():
+    """Whether the request came from a script or asks for JSON"""
+    from_script = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    return from_script or request.accept_mimetypes.best == 'application/json'
+
+def job_started(job, redirect_to):
+    """202 with the job's state for scripts, otherwise a flash message and a redirect"""
+    state = job_json(job)
+    if wants_json():
+        response = jsonify(state)
+        response.status_code = 202
+        response.headers['Location'] = state['status_url']
+        return response
+    # Finished already with the synchronous executor
+    if job.status == 'succeeded':
+        flash(state['result']['summary'])
+    elif job.status == 'failed':
+        flash(f'Error: {job.error}')
+    else:
+        flash(f'Started job #{job.id}, its progress is shown on the admin panel')
+    return redirect(redirect_to)
+
+def job_refused(message, redirect_to):
+    """409 with the reason a job was not started for scripts, otherwise a flash message and a redirect"""
+    if wants_json():
+        return jsonify({'error': message}), 409
+    flash(message)
+    return redirect(redirect_to)
+
+@app.route('/admin/jobs')
+@login_required
+def list_jobs():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    return jsonify([job_json(job) for job in recent_jobs(request.args.get('limit', 10, type=int))])
 
-            # Sort by position
-            lecture_positions.sort(key=lambda x: x['position'])
-            
-            export_data['collections'].append({
-                'id': collection.id,
-                'name': collection.name,
-                'description': collection.description,
-
-                'created_at': collection.created_at.isoformat() if collection.created_at else None,
-                'lectures': lecture_positions,
-            })
-
-        # Add lectures
-        for lecture in lectures:
-            lecture_data = {
-                'id': lecture.id,
-                'title': lecture.title,
-                'youtube_id': lecture.youtube_id,
-                'thumbnail_url': lecture.thumbnail_url,
-                'publish_date': lecture.publish_date.isoformat(),
-                'duration_seconds': lecture.duration_seconds,
-                'rank_id': lecture.rank_id,
-                'topic_ids': [topic.id for topic in lecture.topics],
-                'tag_ids': [tag.id for tag in lecture.tags],
-                'collection_ids': [c.id for c in Collection.query.join(
-                    collection_lecture, 
-                    Collection.id == collection_lecture.c.collection_id,
-                ).filter(collection_lecture.c.lecture_id == lecture.id).all()],
-            }
-            export_data['lectures'].append(lecture_data)
-
-        # Clear database
-        # Use raw SQL for faster deletion of many records
-        db.session.execute(db.text('DELETE FROM lecture_topic'))
-        db.session.execute(db.text('DELETE FROM lecture_tag'))
-        db.session.execute(db.text('DELETE FROM collection_lecture'))
-        db.session.execute(db.text('DELETE FROM lecture'))
-        db.session.execute(db.text('DELETE FROM topic'))
-        db.session.execute(db.text('DELETE FROM tag'))
-        db.session.execute(db.text('DELETE FROM rank'))
-        db.session.execute(db.text('DELETE FROM collection'))
-        
-        # Reset the auto-increment counters
-        db.session.execute(db.text('ALTER SEQUENCE lecture_id_seq RESTART WITH 1'))
-        db.session.execute(db.text('ALTER SEQUENCE topic_id_seq RESTART WITH 1'))
-        db.session.execute(db.text('ALTER SEQUENCE tag_id_seq RESTART WITH 1'))
-        db.session.execute(db.text('ALTER SEQUENCE rank_id_seq RESTART WITH 1'))
-        db.session.execute(db.text('ALTER SEQUENCE collection_id_seq RESTART WITH 1'))
-        db.session.commit()
+@app.route('/admin/jobs/<int:job_id>')
+@login_required
+def job_detail(job_id):
+    """Status and progress of a job, polled by the admin pages"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    response = jsonify(job_json(db.get_or_404(Job, job_id)))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
-        flash('All data has been reset successfully')
-        # Return JSON for download with proper headers
-        response = jsonify(export_data)
-        response.headers.set('Content-Disposition', 'attachment', 
-                             filename=f'baduk_lectures_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
-        return response
-    except Exception as e:
-        db.session.rollback()
-        logging.error('Error resetting data: %s', e)
-        flash(f'Error resetting data: {e}')
-        return redirect(url_for('admin_panel'))
+@app.route('/admin/jobs/<int:job_id>/download')
+@login_required
+def download_job_result(job_id):
+    if not current_user.is_admin:
+        flash('You do not have admin privileges')
+        return redirect(url_for('search'))
+    job = db.get_or_404(Job, job_id)
+    if job.status != 'succeeded' or not job.result_path or not os.path.exists(job.result_path):
+        abort(404)
+    extension = os.path.basename(job.result_path).split('.', 1)[1]
+    if job.kind == 'reset':
+        name = f'baduk_lectures_backup_{job.finished_at.strftime("%Y%m%d_%H%M%S")}'
+    else:
+        name = 'baduk_lectures_export'
+    return send_file(job.result_path, as_attachment=True, download_name=f'{name}.{extension}')
 
 @app.route('/admin')
 @login_required
@@ -1139,7 +983,18 @@ def check_admin():
 @app.route('/admin/panel')
 @login_required
 def admin_panel():
-    return render_template('admin/panel.html')
+    cache_stats = {name: cache.stats() for name, cache in response_caches.items()}
+    return render_template('admin/panel.html', cache_stats=cache_stats, youtube_stats=youtube.stats())
+
+@app.route('/admin/cache-stats')
+@login_required
+def cache_stats():
+    """Hit and miss counters of the response caches in this worker, and today's YouTube API use"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    stats = {name: cache.stats() for name, cache in response_caches.items()}
+    stats['youtube'] = youtube.stats()
+    return jsonify(stats)
 
 @app.route('/admin/lectures')
 @login_required
@@ -1149,10 +1004,11 @@ def manage_lectures():
         return redirect(url_for('search'))
 
     # Get only necessary metadata
-    topics = Topic.query.all()
-    tags = Tag.query.all()
-    ranks = Rank.query.all()
-    return render_template('admin/manage_lectures.html', topics=topics, tags=tags, ranks=ranks)
+    metadata = get_metadata()
+    return render_template('admin/manage_lectures.html',
+                         topics=metadata['topics'],
+                         tags=metadata['tags'],
+                         ranks=metadata['ranks'])
 
 @app.route('/admin/lecture/delete/<int:lecture_id>', methods=['POST'])
 @login_required
@@ -1207,26 +1063,24 @@ def create_admin():
     logging.info('Admin user created successfully!')
 @app.route('/collections')
 def collections():
-    collections = Collection.query.all()
-    
-    # Calculate total duration for each collection
-    for collection in collections:
-        total_duration_seconds = sum(lecture.duration_seconds or 0 for lecture in collection.lectures)
-        hours, remainder = divmod(total_duration_seconds, 3600)
-        minutes, seconds = divmod(remainder, 60)
-        collection.total_duration = {
-            'hours': hours, 
-            'minutes': minutes, 
-            'seconds': seconds,
-            'total_seconds': total_duration_seconds,
-        }
-    
-    return render_template('collections.html', collections=collections)
+    _, etag, last_modified = catalog_validators(COLLECTION_TABLES, *page_etag_parts())
+    if is_not_modified(etag, last_modified):
+        return conditional_response(Response(status=304), etag, last_modified, per_visitor=True)
+
+    collections = get_collection_summaries()
+
+    page = render_template('collections.html', collections=collections)
+    return conditional_response(page, etag, last_modified, per_visitor=True)
 
 
 
 @app.route('/collection/<int:collection_id>', methods=['GET', 'POST'])
 def view_collection(collection_id):
+    if request.method == 'GET':
+        _, etag, last_modified = catalog_validators(COLLECTION_TABLES, collection_id, *page_etag_parts())
+        if is_not_modified(etag, last_modified):
+            return conditional_response(Response(status=304), etag, last_modified, per_visitor=True)
+
     collection = Collection.query.get_or_404(collection_id)
 
     # Handle admin actions (remove lecture)
@@ -1246,57 +1100,82 @@ def view_collection(collection_id):
 
             return redirect(url_for('view_collection', collection_id=collection_id))
 
-    # Get lectures for this collection using utility function
-    lectures = get_collection_lectures(collection_id)
-    
-    # Calculate total duration
-    total_duration_seconds = sum(lecture.duration_seconds or 0 for lecture in lectures)
-    # Convert to hours, minutes, seconds format
-    hours, remainder = divmod(total_duration_seconds, 3600)
+    # First chunk of lectures; the rest come from api_collection_lectures as the page scrolls
+    lectures, next_cursor = get_collection_page(collection_id, COLLECTION_PAGE_SIZE)
+
+    # Count and total duration from an aggregate rather than the loaded lectures
+    summary = get_collection_summaries(collection_id)[0]
+    hours, remainder = divmod(summary.total_seconds, 3600)
     minutes, seconds = divmod(remainder, 60)
-    total_duration = {'hours': hours, 'minutes': minutes, 'seconds': seconds, 'total_seconds': total_duration_seconds}
+    total_duration = {'hours': hours, 'minutes': minutes, 'seconds': seconds, 'total_seconds': summary.total_seconds}
 
-    return render_template('view_collection.html', 
+    page = render_template('view_collection.html', 
                           collection=collection, 
                           lectures=lectures, 
+                          next_cursor=next_cursor,
+                          lecture_count=summary.lecture_count,
                           total_duration=total_duration)
+    if request.method != 'GET':
+        return page
+    return conditional_response(page, etag, last_modified, per_visitor=True)
+
+@app.route('/api/collection/<int:collection_id>/lectures')
+def api_collection_lectures(collection_id):
+    """Next chunk of a collection's lectures after ?after=<cursor>, as records and rendered cards"""
+    after = request.args.get('after')
+    limit = max(1, min(100, request.args.get('limit', COLLECTION_PAGE_SIZE, type=int)))
+    _, etag, last_modified = catalog_validators(COLLECTION_TABLES, collection_id, after, limit, *page_etag_parts())
+    if is_not_modified(etag, last_modified):
+        return conditional_response(Response(status=304), etag, last_modified, per_visitor=True)
 
-@app.route('/collection/<int:collection_id>/reorder', methods=['POST'])
-@login_required
-def reorder_collection_lectures_frontend(collection_id):
-    # Only admin can reorder collections
-    if not current_user.is_admin:
-        return jsonify({'success': False, 'error': 'Admin privileges required'}), 403
-
+    collection = Collection.query.get_or_404(collection_id)
     try:
-        # Get lecture IDs from request
-        lecture_ids = request.json.get('lecture_ids', [])
-
-        # Verify all lectures exist in this collection before making changes
-        collection = Collection.query.get_or_404(collection_id)
-        collection_lecture_ids = [lecture.id for lecture in collection.lectures]
-
-        # Ensure we're only reordering existing items, not adding or removing
-        if not all(int(lid) in collection_lecture_ids for lid in lecture_ids):
-            return jsonify({'success': False, 'error': 'Lecture IDs do not match collection content'}), 400
-
-        # Update positions in the database - ONLY update position
-        for position, lecture_id in enumerate(lecture_ids):
-            db.session.execute(
-                collection_lecture.update().
-                where(collection_lecture.c.collection_id == collection_id).
-                where(collection_lecture.c.lecture_id == lecture_id).
-values(position=position),
+        lectures, next_cursor = get_collection_page(collection_id, limit, after)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        response = jsonify({
+            'lectures': [serialize_lecture(lecture) | {'index': lecture.collection_index} for lecture in lectures],
+            'html': render_template('collection_cards.html', collection=collection, lectures=lectures),
+            'next_cursor': next_cursor,
+        })
+        return conditional_response(response, etag, last_modified, per_visitor=True)
+    except Exception as e:
+        logging.error('Error in api_collection_lectures: %s', e)
+        return jsonify({'error': str(e)}), 500
 
-            )
+def reorder_from_request(collection_id):
+    """Apply a JSON reorder request: the full `lecture_ids` order, or a list of `moves`"""
+    try:
+        Collection.query.get_or_404(collection_id)
+        payload = request.json or {}
+        if not isinstance(payload, dict):
+            return jsonify({'success': False, 'error': 'Invalid reorder request'}), 400
+        # Only lectures that left their place among the others get a new key
+        try:
+            if 'moves' in payload:
+                written = reorder(collection_id, moves=payload['moves'])
+            else:
+                written = reorder(collection_id, payload.get('lecture_ids', []))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
 
         db.session.commit()
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'updated': written})
     except Exception as e:
         db.session.rollback()
         logging.error('Error reordering lectures: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/collection/<int:collection_id>/reorder', methods=['POST'])
+@login_required
+def reorder_collection_lectures_frontend(collection_id):
+    # Only admin can reorder collections
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'Admin privileges required'}), 403
+
+    return reorder_from_request(collection_id)
+
 @app.route('/admin/collections', methods=['GET', 'POST'])
 @login_required
 def manage_collections():
@@ -1330,22 +1209,13 @@ def edit_collection(collection_id):
     collection = Collection.query.get_or_404(collection_id)
     form = CollectionForm()
 
-    # Get lectures for this collection
-    lectures_query = db.session.query(
-        Lecture,
-    ).join(
-        collection_lecture,
-        Lecture.id == collection_lecture.c.lecture_id,
-    ).filter(
-        collection_lecture.c.collection_id == collection_id,
-    )
-
-    # Try to order by position if it exists
+    # One chunk of this collection's lectures, with links to the next
+    after = request.args.get('after')
     try:
-        lectures = lectures_query.order_by(collection_lecture.c.position).all()
-    except Exception:
-        # Fall back to default ordering
-        lectures = lectures_query.all()
+        lectures, next_cursor = get_collection_page(collection_id, COLLECTION_PAGE_SIZE, after)
+    except ValueError:
+        return redirect(url_for('edit_collection', collection_id=collection_id))
+    summary = get_collection_summaries(collection_id)[0]
 
     if request.method == 'POST':
         # Handle lecture removal if explicitly requested
@@ -1405,7 +1275,8 @@ def edit_collection(collection_id):
         form.name.data = collection.name
         form.description.data = collection.description
 
-    return render_template('admin/edit_collection.html', form=form, collection=collection, lectures=lectures)
+    return render_template('admin/edit_collection.html', form=form, collection=collection, lectures=lectures,
+                           next_cursor=next_cursor, after=after, lecture_count=summary.lecture_count)
 
 
 @app.route('/admin/collection/<int:collection_id>/bulk-add', methods=['GET', 'POST'])
@@ -1429,9 +1300,8 @@ def bulk_add_lectures(collection_id):
         .order_by(Lecture.publish_date.desc()).all()
     
     # Get metadata for filtering
-    topics = Topic.query.all()
-    tags = Tag.query.all()
-    ranks = Rank.query.all()
+    metadata = get_metadata()
+    topics, tags, ranks = metadata['topics'], metadata['tags'], metadata['ranks']
     
     if request.method == 'POST':
         # Get the selected lecture IDs from the form
@@ -1442,16 +1312,13 @@ def bulk_add_lectures(collection_id):
             return redirect(url_for('bulk_add_lectures', collection_id=collection_id))
         
         try:
-            # Get the maximum position in the collection
-            max_position_result = db.session.query(db.func.max(collection_lecture.c.position)).filter(
-                collection_lecture.c.collection_id == collection_id,
-            ).first()
-            max_position = max_position_result[0] if max_position_result[0] is not None else 0
-            
+            # Append after the current last lecture, leaving gaps for later moves
+            first_position = next_position(collection_id)
+
             # Add each selected lecture to the collection
             for i, lecture_id in enumerate(lecture_ids):
                 # Use direct SQL to add the relationship
-                position = max_position + i + 1
+                position = first_position + i * POSITION_GAP
                 db.session.execute(
                     db.text("""
                         INSERT INTO collection_lecture (collection_id, lecture_id, position)
@@ -1488,33 +1355,7 @@ def reorder_collection_lectures(collection_id):
         flash('You do not have admin privileges')
         return redirect(url_for('search'))
 
-    try:
-        # Get lecture IDs from request
-        lecture_ids = request.json.get('lecture_ids', [])
-
-        # Verify all lectures exist in this collection before making changes
-        collection = Collection.query.get_or_404(collection_id)
-        collection_lecture_ids = [lecture.id for lecture in collection.lectures]
-
-        # Ensure we're only reordering existing items, not adding or removing
-        if set(int(lid) for lid in lecture_ids) != set(collection_lecture_ids):
-            return jsonify({'success': False, 'error': 'Lecture IDs do not match collection content'}), 400
-
-        # Update positions in the database - ONLY update position
-        for position, lecture_id in enumerate(lecture_ids):
-            db.session.execute(
-                collection_lecture.update().
-                where(collection_lecture.c.collection_id == collection_id).
-                where(collection_lecture.c.lecture_id == lecture_id).
-                values(position=position),
-            )
-
-        db.session.commit()
-        return jsonify({'success': True})
-    except Exception as e:
-        db.session.rollback()
-        logging.error('Error reordering lectures: %s', e)
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return reorder_from_request(collection_id)
 
 @app.route('/admin/collection/<int:collection_id>/move-lecture', methods=['POST'])
 @login_required
@@ -1530,68 +1371,17 @@ def move_lecture_position(collection_id):
         if lecture_id is None or new_position is None:
             return jsonify({'success': False, 'error': 'Missing lecture_id or new_position'}), 400
 
-        # Get all lectures in this collection with their positions
-        lectures_positions = db.session.query(
-            Lecture.id, 
-            collection_lecture.c.position,
-        ).join(
-            collection_lecture,
-            Lecture.id == collection_lecture.c.lecture_id,
-        ).filter(
-            collection_lecture.c.collection_id == collection_id,
-        ).order_by(
-            collection_lecture.c.position,
-        ).all()
-
-        # Find the current position of the lecture to move
-        current_position = None
-        for lp in lectures_positions:
-            if lp[0] == int(lecture_id):
-                current_position = lp[1]
-                break
-
-        if current_position is None:
-            return jsonify({'success': False, 'error': 'Lecture not found in this collection'}), 404
-
-        # Convert new_position to int
-        new_position = int(new_position)
-
-        # Ensure new_position is within bounds
-        if new_position < 0 or new_position >= len(lectures_positions):
+        # Only the moved lecture's row is written, unless its neighbours are out of room
+        try:
+            written = move_lecture(collection_id, int(lecture_id), int(new_position))
+        except IndexError:
             return jsonify({'success': False, 'error': 'Invalid position'}), 400
+        except KeyError:
+            return jsonify({'success': False, 'error': 'Lecture not found in this collection'}), 404
 
-        # Skip if the position is the same
-        if current_position == new_position:
+        if not written:
             return jsonify({'success': True, 'message': 'Position unchanged'})
 
-        # Update positions of all affected lectures
-        if current_position < new_position:
-            # Moving down: shift lectures between current+1 and new up by 1
-            db.session.execute(
-                collection_lecture.update().
-                where(collection_lecture.c.collection_id == collection_id).
-                where(collection_lecture.c.position > current_position).
-                where(collection_lecture.c.position <= new_position).
-                values(position=collection_lecture.c.position - 1),
-            )
-        else:
-            # Moving up: shift lectures between new and current-1 down by 1
-            db.session.execute(
-                collection_lecture.update().
-                where(collection_lecture.c.collection_id == collection_id).
-                where(collection_lecture.c.position >= new_position).
-                where(collection_lecture.c.position < current_position).
-                values(position=collection_lecture.c.position + 1),
-            )
-
-        # Finally, update the position of the lecture being moved
-        db.session.execute(
-            collection_lecture.update().
-            where(collection_lecture.c.collection_id == collection_id).
-            where(collection_lecture.c.lecture_id == lecture_id).
-            values(position=new_position),
-        )
-
         db.session.commit()
         return jsonify({'success': True})
     except Exception as e:
@@ -1614,10 +1404,10 @@ def playlist_import():
     playlist_url = ''
 
     # Get metadata for the dropdown selections
-    topics = Topic.query.all()
-    tags = Tag.query.all()
-    ranks = Rank.query.all()
-    collections = Collection.query.all()
+    metadata = get_metadata()
+    topics, tags, ranks, collections = (
+        metadata['topics'], metadata['tags'], metadata['ranks'], metadata['collections'],
+    )
 
     if request.method == 'POST':
         youtube_api_key = request.form.get('youtube_api_key', '')
@@ -1635,17 +1425,22 @@ def playlist_import():
             # Store the API key in the session for future use
             session['youtube_api_key'] = youtube_api_key
 
-            videos, error = fetch_playlist_videos(youtube_api_key, playlist_id)
+            # Fetched once here; later steps read the videos from the import session
+            playlist, error = load_playlist(youtube_api_key, playlist_id, refresh=request.form.get('refresh') == '1')
             if error:
                 flash(error)
                 return render_template('admin/playlist_import.html', topics=topics, tags=tags, 
                                       ranks=ranks, collections=collections)
+            videos = playlist.videos
 
             if not videos:
                 flash('No videos found in the playlist')
                 return render_template('admin/playlist_import.html', topics=topics, tags=tags, 
                                       ranks=ranks, collections=collections)
 
+            if request.form.get('mode') == 'bulk':
+                return render_playlist_bulk(playlist, youtube_api_key, playlist_url, metadata)
+
             # Start with the first video
             current_video = videos[0]
             current_video_index = 0
@@ -1653,6 +1448,7 @@ def playlist_import():
             return render_template('admin/playlist_import.html', videos=videos, 
                                   current_video=current_video, current_video_index=current_video_index,
                                   youtube_api_key=youtube_api_key, playlist_url=playlist_url,
+                                  fetched_at=playlist.fetched_at,
                                   topics=topics, tags=tags, ranks=ranks, collections=collections)
 
         # Step 2: Process current video
@@ -1660,12 +1456,41 @@ def playlist_import():
             video_index = int(request.form.get('video_index', 0))
             action = request.form.get('action', '')
 
-            # Re-fetch videos to maintain state
+            # Videos from the import session, fetched again only if it expired or on request
             playlist_id = extract_playlist_id(playlist_url)
-            videos, _ = fetch_playlist_videos(youtube_api_key, playlist_id)
+            playlist, error = load_playlist(youtube_api_key, playlist_id, refresh=action == 'refresh')
+            if error:
+                flash(error)
+                return render_template('admin/playlist_import.html', topics=topics, tags=tags,
+                                      ranks=ranks, collections=collections)
+            videos = playlist.videos
+
+            if action == 'bulk':
+                return render_playlist_bulk(playlist, youtube_api_key, playlist_url, metadata)
+
+            if action == 'refresh' or video_index >= len(videos):
+                # Stay on the same video, or the last one if the playlist got shorter
+                if action == 'refresh':
+                    flash(f'Playlist refreshed: {len(videos)} videos')
+                current_video_index = min(video_index, len(videos) - 1)
+                current_video = videos[current_video_index] if videos else None
+                return render_template('admin/playlist_import.html', videos=videos,
+                                      current_video=current_video, current_video_index=current_video_index,
+                                      youtube_api_key=youtube_api_key, playlist_url=playlist_url,
+                                      fetched_at=playlist.fetched_at,
+                                      topics=topics, tags=tags, ranks=ranks, collections=collections)
 
             current_video = videos[video_index]
             
+            # A video whose details did not load stays current, so it can be refreshed
+            if action == 'save' and current_video.get('error'):
+                flash(f'Cannot add "{current_video["title"]}": {current_video["error"]}')
+                return render_template('admin/playlist_import.html', videos=videos,
+                                      current_video=current_video, current_video_index=video_index,
+                                      youtube_api_key=youtube_api_key, playlist_url=playlist_url,
+                                      fetched_at=playlist.fetched_at,
+                                      topics=topics, tags=tags, ranks=ranks, collections=collections)
+
             # If user chose to save this video
             if action == 'save':
                 # Get form data
@@ -1683,7 +1508,7 @@ def playlist_import():
                         youtube_id=current_video['video_id'],
                         thumbnail_url=current_video['thumbnail_url'],
                         publish_date=current_video['published_at'],
-                        duration_seconds=current_video.get('duration_seconds', 0),
+                        duration_seconds=current_video['duration_seconds'],
                         rank_id=rank_id,
                     )
 
@@ -1699,14 +1524,15 @@ def playlist_import():
                             if tag:
                                 new_lecture.tags.append(tag)
 
-                    # Add to collections (optional, multiple)
+                    db.session.add(new_lecture)
+
+                    # Add to collections (optional, multiple), after their last lecture
                     if collection_ids:
+                        db.session.flush()
                         for collection_id in collection_ids:
                             collection = Collection.query.get(collection_id)
                             if collection:
-                                collection.lectures.append(new_lecture)
-
-                    db.session.add(new_lecture)
+                                append_lecture(collection.id, new_lecture.id)
                     db.session.commit()
                     flash(f'Video "{current_video["title"]}" added successfully')
                 else:
@@ -1729,12 +1555,57 @@ def playlist_import():
             return render_template('admin/playlist_import.html', videos=videos, 
                                   current_video=current_video, current_video_index=current_video_index,
                                   youtube_api_key=youtube_api_key, playlist_url=playlist_url,
+                                  fetched_at=playlist.fetched_at,
                                   topics=topics, tags=tags, ranks=ranks, collections=collections)
 
+        # Step 3: Import the selected videos at once
+        elif step == '3':
+            playlist_id = extract_playlist_id(playlist_url)
+            playlist, error = load_playlist(youtube_api_key, playlist_id)
+            if error:
+                flash(error)
+                return render_template('admin/playlist_import.html', topics=topics, tags=tags,
+                                      ranks=ranks, collections=collections)
+            selected = set(request.form.getlist('selected'))
+            defaults = {
+                'rank': request.form.get('rank'),
+                'topic': request.form.get('topic'),
+                'tags': request.form.getlist('tags'),
+                'collections': request.form.getlist('collections'),
+            }
+            # Per-row choices left empty fall back to the defaults
+            overrides = {}
+            for video_id in (video['video_id'] for video in playlist.videos):
+                override = {field: request.form.get(f'{field}_{video_id}') for field in ('rank', 'topic')}
+                override.update({
+                    field: request.form.getlist(f'{field}_{video_id}') for field in ('tags', 'collections')
+                })
+                overrides[video_id] = {field: value for field, value in override.items() if value}
+            videos = [video for video in playlist.videos if video['video_id'] in selected]
+            try:
+                result = import_videos(videos, defaults, overrides)
+            except Exception as e:
+                logging.error('Error importing playlist %s: %s', playlist_id, e)
+                flash(f'Error importing videos, nothing was added: {e}')
+                result = None
+            else:
+                flash(f'{len(result.inserted)} videos added, {len(result.skipped)} skipped, '
+                      f'{len(result.failed)} failed')
+            return render_playlist_bulk(playlist, youtube_api_key, playlist_url, metadata, result)
+
     # GET request
     return render_template('admin/playlist_import.html', topics=topics, tags=tags, 
                           ranks=ranks, collections=collections)
 
+def render_playlist_bulk(playlist, youtube_api_key, playlist_url, metadata, result=None):
+    """The playlist wizard's all-at-once view, marking videos already in the catalog"""
+    video_ids = [video['video_id'] for video in playlist.videos]
+    existing = set(db.session.scalars(db.select(Lecture.youtube_id).where(Lecture.youtube_id.in_(video_ids))))
+    return render_template('admin/playlist_import.html', bulk=True, videos=playlist.videos, existing=existing,
+                           result=result, youtube_api_key=youtube_api_key, playlist_url=playlist_url,
+                           fetched_at=playlist.fetched_at, topics=metadata['topics'], tags=metadata['tags'],
+                           ranks=metadata['ranks'], collections=metadata['collections'])
+
 @app.route('/admin/video-import', methods=['GET', 'POST'])
 @login_required
 def video_import():
@@ -1743,10 +1614,10 @@ def video_import():
         return redirect(url_for('search'))
 
     # Get metadata for the dropdown selections
-    topics = Topic.query.all()
-    tags = Tag.query.all()
-    ranks = Rank.query.all()
-    collections = Collection.query.all()
+    metadata = get_metadata()
+    topics, tags, ranks, collections = (
+        metadata['topics'], metadata['tags'], metadata['ranks'], metadata['collections'],
+    )
 
     if request.method == 'POST':
         youtube_api_key = request.form.get('youtube_api_key', '')
@@ -1761,7 +1632,12 @@ def video_import():
                                       ranks=ranks, collections=collections)
             
             # Get video information
-            video_info = get_youtube_video_info(youtube_url, youtube_api_key)
+            try:
+                video_info = get_youtube_video_info(youtube_url, youtube_api_key)
+            except ValueError as e:
+                flash(str(e))
+                return render_template('admin/video_import.html', topics=topics, tags=tags,
+                                      ranks=ranks, collections=collections)
             if not video_info:
                 flash('Could not fetch video information. Please check the URL and API key.')
                 return render_template('admin/video_import.html', topics=topics, tags=tags, 
@@ -1834,14 +1710,15 @@ def video_import():
                         if tag:
                             new_lecture.tags.append(tag)
 
-                # Add to collections (optional, multiple)
+                db.session.add(new_lecture)
+
+                # Add to collections (optional, multiple), after their last lecture
                 if collection_ids:
+                    db.session.flush()
                     for collection_id in collection_ids:
                         collection = Collection.query.get(collection_id)
                         if collection:
-                            collection.lectures.append(new_lecture)
-
-                db.session.add(new_lecture)
+                            append_lecture(collection.id, new_lecture.id)
                 db.session.commit()
                 flash(f'Video "{title}" added successfully')
                 return redirect(url_for('video_import'))
@@ -1883,6 +1760,8 @@ def service_worker():
 # Sitemap and robots.txt routes
 @app.route('/sitemap.xml')
 def sitemap():
+    # The sitemap is a static file, so send_from_directory already sends its ETag
+    # and Last-Modified with no-cache and answers conditional requests with 304
     return send_from_directory('static', 'sitemap.xml', mimetype='application/xml')
 
 @app.route('/robots.txt')
@@ -44,6 +44,31 @@ function isStaticResource(url) {
   return pathname.startsWith('/static/') || pathname === '/manifest.json';
 }
 
+// Catalog pages and search results change with the catalog; the server sends
+// ETags for them, so they are always revalidated and cheap when unchanged
+function isCatalogResource(url) {
+  const pathname = new URL(url).pathname;
+  return pathname === '/' || pathname === '/search' || pathname === '/collections' ||
+    pathname.startsWith('/collection/') || pathname.startsWith('/api/search') ||
+    pathname.startsWith('/api/collection/');
+}
+
+// Fetch a request bypassing the HTTP cache's freshness, so the server
+// revalidates it (If-None-Match / If-Modified-Since) and answers 304 if unchanged
+function revalidate(request) {
+  // A navigation request cannot be copied with new options; fetch its URL the
+  // same way, leaving redirects to the browser as it would for the navigation
+  if (request.mode === 'navigate') {
+    return fetch(request.url, {
+      cache: 'no-cache',
+      credentials: 'same-origin',
+      headers: request.headers,
+      redirect: 'manual'
+    });
+  }
+  return fetch(new Request(request, { cache: 'no-cache' }));
+}
+
 // Activate event
 self.addEventListener('activate', (event) => {
   event.waitUntil(
@@ -61,6 +86,13 @@ self.addEventListener('activate', (event) => {
 
 // Basic fetch strategy - only cache static resources
 self.addEventListener('fetch', (event) => {
+  // Revalidate catalog responses with a conditional request (If-None-Match
+  // from the HTTP cache). They vary by visitor, so none are kept here
+  if (event.request.method === 'GET' && isCatalogResource(event.request.url)) {
+    event.respondWith(revalidate(event.request));
+    return;
+  }
+
   // Only handle static resources
   if (!isStaticResource(event.request.url)) {
     // For non-static resources, just fetch from network
@@ -0,0 +1,195 @@
+/**
+ * Background jobs on the admin pages
+ * Starts jobs from forms and buttons marked with data-job-form / data-job-url,
+ * polls /admin/jobs/<id> and keeps the job list up to date
+ */
+const BadukJobs = (function() {
+    const POLL_INTERVAL = 1000;
+    const LABELS = {
+        'import': 'Import',
+        'import_table': 'Table import',
+        'export': 'Export',
+        'reset': 'Reset',
+        'refresh_metadata': 'Metadata refresh',
+    };
+
+    function isActive(job) {
+        return job.status === 'queued' || job.status === 'running';
+    }
+
+    // POST to a job-starting route; resolves with the job state
+    function start(url, body) {
+        return fetch(url, {
+            method: 'POST',
+            body: body,
+            headers: {'X-Requested-With': 'XMLHttpRequest', 'Accept': 'application/json'},
+        }).then(response => {
+            if (response.status !== 202) {
+                // Refused jobs say why in the body
+                return response.json()
+                    .catch(() => ({}))
+                    .then(data => {
+                        throw new Error(data.error || 'Could not start the job (HTTP ' + response.status + ')');
+                    });
+            }
+            return response.json();
+        });
+    }
+
+    // Poll a job until it finishes; onUpdate gets every state seen
+    function watch(job, onUpdate) {
+        return new Promise((resolve, reject) => {
+            function poll(state) {
+                if (onUpdate) {
+                    onUpdate(state);
+                }
+                refreshLists();
+                if (!isActive(state)) {
+                    resolve(state);
+                    return;
+                }
+                setTimeout(() => {
+                    fetch(state.status_url, {headers: {'Accept': 'application/json'}})
+                        .then(response => response.json())
+                        .then(poll)
+                        .catch(reject);
+                }, POLL_INTERVAL);
+            }
+            poll(job);
+        });
+    }
+
+    function progressText(job) {
+        if (job.percent !== null && job.percent !== undefined) {
+            return job.percent + '%' + (job.message ? ' - ' + job.message : '');
+        }
+        return job.message || '';
+    }
+
+    function renderRow(job) {
+        const row = document.createElement('tr');
+        const cells = [
+            '#' + job.id,
+            LABELS[job.kind] || job.kind,
+            job.status,
+        ];
+        cells.forEach(text => {
+            const cell = document.createElement('td');
+            cell.textContent = text;
+            row.appendChild(cell);
+        });
+
+        const progressCell = document.createElement('td');
+        if (isActive(job)) {
+            const bar = document.createElement('div');
+            bar.className = 'progress';
+            const fill = document.createElement('div');
+            fill.className = 'progress-bar progress-bar-striped progress-bar-animated';
+            fill.style.width = (job.percent === null ? 100 : job.percent) + '%';
+            bar.appendChild(fill);
+            progressCell.appendChild(bar);
+        }
+        const text = document.createElement('small');
+        text.textContent = progressText(job);
+        progressCell.appendChild(text);
+        row.appendChild(progressCell);
+
+        const resultCell = document.createElement('td');
+        if (job.status === 'failed') {
+            resultCell.className = 'text-danger';
+            resultCell.textContent = job.error;
+        } else if (job.result) {
+            resultCell.textContent = job.result.summary + ' ';
+        }
+        if (job.download_url) {
+            const link = document.createElement('a');
+            link.href = job.download_url;
+            link.textContent = 'Download';
+            resultCell.appendChild(link);
+        }
+        row.appendChild(resultCell);
+        return row;
+    }
+
+    let refreshing = null;
+
+    // Re-render every job list on the page, polling while any job is active
+    function refreshLists() {
+        const lists = document.querySelectorAll('[data-jobs-url]');
+        if (!lists.length || refreshing) {
+            return;
+        }
+        refreshing = fetch(lists[0].dataset.jobsUrl, {headers: {'Accept': 'application/json'}})
+            .then(response => response.json())
+            .then(jobs => {
+                lists.forEach(list => {
+                    const body = list.querySelector('tbody');
+                    body.innerHTML = '';
+                    if (!jobs.length) {
+                        body.innerHTML = '<tr><td colspan="5" class="text-muted">No jobs yet</td></tr>';
+                    }
+                    jobs.forEach(job => body.appendChild(renderRow(job)));
+                });
+                if (jobs.some(isActive)) {
+                    setTimeout(() => {
+                        refreshing = null;
+                        refreshLists();
+                    }, POLL_INTERVAL);
+                } else {
+                    refreshing = null;
+                }
+            })
+            .catch(() => {
+                refreshing = null;
+            });
+    }
+
+    function download(job) {
+        if (job.download_url) {
+            window.location.href = job.download_url;
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        // Forms whose POST starts a job
+        document.querySelectorAll('form[data-job-form]').forEach(form => {
+            form.addEventListener('submit', function(event) {
+                event.preventDefault();
+                const button = form.querySelector('[type="submit"]');
+                if (button) {
+                    button.disabled = true;
+                }
+                start(form.action, new FormData(form))
+                    .then(job => watch(job))
+                    .then(job => {
+                        if (form.dataset.jobForm === 'download') {
+                            download(job);
+                        }
+                    })
+                    .catch(error => alert(error.message))
+                    .finally(() => {
+                        if (button) {
+                            button.disabled = false;
+                        }
+                    });
+            });
+        });
+
+        // Links that also work as plain downloads, run as jobs when scripts are on
+        document.querySelectorAll('a[data-job-url]').forEach(link => {
+            link.addEventListener('click', function(event) {
+                event.preventDefault();
+                const body = new FormData();
+                body.append('format', link.dataset.jobFormat || 'json');
+                start(link.dataset.jobUrl, body)
+                    .then(job => watch(job))
+                    .then(download)
+                    .catch(error => alert(error.message));
+            });
+        });
+
+        refreshLists();
+    });
+
+    return {start: start, watch: watch, download: download, refresh: refreshLists};
+})();
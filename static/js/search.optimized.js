@@ -6,10 +6,12 @@ document.addEventListener('DOMContentLoaded', function() {
     const rankFilter = document.getElementById('rank-filter');
     const resultsContainer = document.getElementById('results-container');
     const loadMoreButton = document.getElementById('load-more');
+    const suggestionsBox = document.getElementById('search-suggestions');
 
-    let currentPage = 1;
     const perPage = 9;
     let hasMore = false;
+    let nextCursor = null; // Opaque keyset cursor for the next page
+    let fuzzyMatch = false; // Whether the current results tolerate typos
     let currentSearchParams = {};
     let isSearching = false; // Flag to prevent concurrent searches
     window.results = []; // Global results array for duration badges
@@ -104,12 +106,37 @@ document.addEventListener('DOMContentLoaded', function() {
         return card;
     }
 
+    // Show result counts on filter options and disable the ones with none
+    function updateFacetCounts(params) {
+        fetch(`/api/search/facets?${params.toString()}`, { cache: 'no-cache' })
+        .then(response => response.json())
+        .then(counts => {
+            [[topicFilter, counts.topics], [tagFilter, counts.tags], [rankFilter, counts.ranks]].forEach(([select, facetCounts]) => {
+                if (!facetCounts) return;
+                Array.from(select.options).forEach(option => {
+                    if (!option.value) return; // "All" option
+                    if (!option.dataset.label) {
+                        option.dataset.label = option.textContent;
+                    }
+                    const count = facetCounts[option.value] || 0;
+                    option.textContent = `${option.dataset.label} (${count})`;
+                    // Never disable the current selection, so it can still be seen and changed
+                    option.disabled = count === 0 && option.value !== select.value;
+                });
+            });
+        })
+        .catch(error => console.error('Error fetching facet counts:', error));
+    }
+
     // Optimized search function with request cancellation
     let currentRequest = null;
-    function performSearch(page = 1, resetResults = true) {
+    function performSearch(resetResults = true, fuzzy = false) {
         // Prevent concurrent searches
         if (isSearching) return;
         isSearching = true;
+        if (resetResults) {
+            fuzzyMatch = fuzzy;
+        }
         
         // Show loading indicator
         if (resetResults) {
@@ -118,15 +145,18 @@ document.addEventListener('DOMContentLoaded', function() {
             loadMoreButton.innerHTML = pageCache.loadingButtonHtml;
         }
 
-        // Build search parameters
+        // Build search parameters, an empty cursor asks for the first page
         const params = new URLSearchParams();
-        params.append('page', page);
+        params.append('cursor', resetResults ? '' : nextCursor);
         params.append('per_page', perPage);
 
         // Add search query if present
         const searchQuery = searchInput.value.trim();
         if (searchQuery) {
             params.append('q', searchQuery);
+            if (fuzzyMatch) {
+                params.append('match', 'fuzzy');
+            }
         }
 
         // Add filters if selected
@@ -140,6 +170,14 @@ document.addEventListener('DOMContentLoaded', function() {
             params.append('rank', rankFilter.value);
         }
 
+        // Refresh filter counts for a new search, using the filters only
+        if (resetResults) {
+            const facetParams = new URLSearchParams(params);
+            facetParams.delete('cursor');
+            facetParams.delete('per_page');
+            updateFacetCounts(facetParams);
+        }
+
         // Save current search params
         currentSearchParams = {
             q: searchQuery,
@@ -162,8 +200,9 @@ document.addEventListener('DOMContentLoaded', function() {
             currentRequest = controller;
         }
 
-        // Fetch results with ability to cancel if supported
-        const fetchOptions = signal ? { signal } : {};
+        // Fetch results with ability to cancel if supported. 'no-cache' revalidates
+        // the browser's copy with If-None-Match, so unchanged results cost a 304
+        const fetchOptions = signal ? { signal, cache: 'no-cache' } : { cache: 'no-cache' };
         
         fetch(`/api/search?${params.toString()}`, fetchOptions)
         .then(response => response.json())
@@ -187,10 +226,16 @@ document.addEventListener('DOMContentLoaded', function() {
 
                 // Update pagination
                 hasMore = data.has_next;
-                currentPage = data.current_page;
+                nextCursor = data.next_cursor;
 
                 // Show/hide load more button
                 loadMoreButton.style.display = hasMore ? 'inline-block' : 'none';
+            } else if (resetResults && searchQuery && !fuzzyMatch) {
+                // Nothing matched exactly, try again allowing for typos
+                isSearching = false;
+                currentRequest = null;
+                performSearch(true, true);
+                return;
             } else {
                 if (resetResults) {
                     resultsContainer.innerHTML = pageCache.noResultsMessage;
@@ -221,6 +266,103 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Typeahead suggestions from /api/suggest, grouped by kind
+    const suggestionHeadings = { lectures: 'Lectures', topics: 'Topics', tags: 'Tags', collections: 'Collections' };
+    let suggestController = null;
+    let activeSuggestion = -1;
+
+    function hideSuggestions() {
+        suggestionsBox.classList.remove('show');
+        suggestionsBox.innerHTML = '';
+        activeSuggestion = -1;
+    }
+
+    function chooseSuggestion(kind, suggestion) {
+        hideSuggestions();
+        if (kind === 'collections') {
+            window.location.href = `/collection/${suggestion.id}`;
+            return;
+        }
+        if (kind === 'lectures') {
+            searchInput.value = suggestion.label;
+        } else {
+            // Topics and tags become filters instead of text
+            searchInput.value = '';
+            (kind === 'topics' ? topicFilter : tagFilter).value = suggestion.id;
+        }
+        performSearch();
+    }
+
+    function showSuggestions(data) {
+        suggestionsBox.innerHTML = '';
+        activeSuggestion = -1;
+        Object.keys(suggestionHeadings).forEach(kind => {
+            const suggestions = data[kind] || [];
+            if (suggestions.length === 0) return;
+            const heading = document.createElement('div');
+            heading.className = 'suggestion-heading';
+            heading.textContent = suggestionHeadings[kind];
+            suggestionsBox.appendChild(heading);
+            suggestions.forEach(suggestion => {
+                const item = document.createElement('button');
+                item.type = 'button';
+                item.className = 'suggestion-item';
+                item.setAttribute('role', 'option');
+                item.textContent = suggestion.label;
+                // mousedown fires before the input loses focus
+                item.addEventListener('mousedown', function(event) {
+                    event.preventDefault();
+                    chooseSuggestion(kind, suggestion);
+                });
+                suggestionsBox.appendChild(item);
+            });
+        });
+        suggestionsBox.classList.toggle('show', suggestionsBox.children.length > 0);
+    }
+
+    function fetchSuggestions() {
+        const text = searchInput.value.trim();
+        if (suggestController) {
+            suggestController.abort();
+        }
+        if (!text) {
+            hideSuggestions();
+            return;
+        }
+        suggestController = window.AbortController ? new AbortController() : null;
+        const options = suggestController ? { signal: suggestController.signal, cache: 'no-cache' } : { cache: 'no-cache' };
+        fetch(`/api/suggest?${new URLSearchParams({ q: text }).toString()}`, options)
+        .then(response => response.json())
+        .then(data => {
+            // Ignore answers for text that has changed since
+            if (searchInput.value.trim() === text) {
+                showSuggestions(data);
+            }
+        })
+        .catch(error => {
+            if (!error.name || error.name !== 'AbortError') {
+                console.error('Error fetching suggestions:', error);
+            }
+        });
+    }
+
+    searchInput.addEventListener('keydown', function(event) {
+        const items = suggestionsBox.querySelectorAll('.suggestion-item');
+        if (!suggestionsBox.classList.contains('show') || items.length === 0) return;
+        if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+            event.preventDefault();
+            const step = event.key === 'ArrowDown' ? 1 : -1;
+            activeSuggestion = (activeSuggestion + step + items.length) % items.length;
+            items.forEach((item, index) => item.classList.toggle('active', index === activeSuggestion));
+        } else if (event.key === 'Enter' && activeSuggestion >= 0) {
+            event.preventDefault();
+            items[activeSuggestion].dispatchEvent(new MouseEvent('mousedown'));
+        } else if (event.key === 'Escape') {
+            hideSuggestions();
+        }
+    });
+    searchInput.addEventListener('blur', hideSuggestions);
+
     // Efficient debounce function
     function debounce(func, wait) {
         let timeout;
@@ -235,21 +377,48 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Event listeners with optimized debounce
     const debouncedSearch = debounce(function() {
-        currentPage = 1;
-        performSearch(1);
+        performSearch();
     }, 300);
 
     searchInput.addEventListener('input', debouncedSearch);
+    searchInput.addEventListener('input', debounce(fetchSuggestions, 100));
     topicFilter.addEventListener('change', debouncedSearch);
     tagFilter.addEventListener('change', debouncedSearch);
     rankFilter.addEventListener('change', debouncedSearch);
 
     loadMoreButton.addEventListener('click', function() {
-        performSearch(currentPage + 1, false);
+        performSearch(false);
     });
 
-    // Initial search on page load
-    performSearch();
+    // Pick up the first page rendered with the page, as long as the filters
+    // (which the browser may restore on back navigation) still match it
+    function hydrateFirstPage() {
+        const bootstrapElement = document.getElementById('search-bootstrap');
+        if (!bootstrapElement || searchInput.value.trim() || topicFilter.value || tagFilter.value || rankFilter.value) {
+            return false;
+        }
+        const data = JSON.parse(bootstrapElement.textContent);
+        window.results = data.lectures || [];
+        resultsContainer.querySelectorAll('.lecture-card').forEach((card, index) => {
+            const lecture = window.results[index];
+            if (lecture) {
+                card.addEventListener('click', function() {
+                    openVideoModal(lecture.youtube_id, lecture.title);
+                });
+            }
+        });
+        hasMore = data.has_next;
+        nextCursor = data.next_cursor;
+        loadMoreButton.style.display = hasMore ? 'inline-block' : 'none';
+        currentSearchParams = { q: '', topics: [], tags: [], rank: '' };
+        updateFacetCounts(new URLSearchParams());
+        return true;
+    }
+
+    // Initial search on page load, unless the first page came with it
+    if (!hydrateFirstPage()) {
+        performSearch();
+    }
 });
 
 // Video modal functionality
@@ -0,0 +1,185 @@
+"""
+In-memory prefix index for search-as-you-type suggestions.
+
+Every lecture title, topic, tag and collection name is split into words. For
+each kind there is a sorted array of the distinct words, each with a posting
+array of the entries containing it, where entries are numbered best first
+(newest lecture, or alphabetical name). A prefix is a bisect range over the
+words, and the top suggestions are the first entries of the merged postings.
+Short prefixes, whose ranges span many words, have their top entries stored
+at build time.
+
+Each kind is rebuilt only when its own table changes.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from itertools import islice
+
+from app import db
+from catalog import CatalogIndex, get_versions
+from fulltext import tokenize
+from models import Collection, Lecture, Tag, Topic
+
+PrefixTable = namedtuple('PrefixTable', ['ids', 'labels', 'words', 'postings', 'short_prefixes'])
+
+# Each kind of suggestion and the model column it is made from
+SUGGEST_KINDS = {
+    'lectures': Lecture.title,
+    'topics': Topic.name,
+    'tags': Tag.name,
+    'collections': Collection.name,
+}
+
+# Prefixes up to this length get their top entries precomputed
+SHORT_PREFIX_LENGTH = 2
+
+# Candidates examined for a multi-word query before giving up on more matches
+MAX_SCANNED = 5000
+
+def load_rows(column):
+    """(id, label) rows of one kind, best first"""
+    model = column.class_
+    if model is Lecture:
+        # Newest first, like search results
+        rows = db.session.query(Lecture.id, Lecture.title, Lecture.publish_date).all()
+        rows.sort(key=lambda row: (row.publish_date or datetime.min, row.id), reverse=True)
+        return [(row.id, row.title) for row in rows]
+    return [tuple(row) for row in db.session.query(model.id, column).order_by(column)]
+
+def build_prefix_table(rows, limit):
+    """Prefix table for (id, label) rows that are already best first"""
+    word_postings = defaultdict(lambda: array('I'))
+    for rank, (_, label) in enumerate(rows):
+        for word in set(tokenize(label)):
+            word_postings[word].append(rank)
+
+    words = sorted(word_postings)
+    postings = [word_postings[word] for word in words]
+
+    short_prefixes = {}
+    for length in range(1, SHORT_PREFIX_LENGTH + 1):
+        for prefix in {word[:length] for word in words}:
+            lo, hi = prefix_range(words, prefix)
+            short_prefixes[prefix] = array('I', unique_head(heapq.merge(*postings[lo:hi]), limit))
+
+    return PrefixTable(
+        ids=array('I', [row[0] for row in rows]),
+        labels=[row[1] for row in rows],
+        words=words,
+        postings=postings,
+        short_prefixes=short_prefixes,
+    )
+
+def prefix_range(words, prefix):
+    """Slice of a sorted word list that starts with `prefix`"""
+    lo = bisect_left(words, prefix)
+    # Every word with the prefix sorts before prefix + the highest code point
+    hi = bisect_left(words, prefix + '\U0010ffff', lo)
+    return lo, hi
+
+def unique_head(ranks, limit):
+    """First `limit` distinct values of a sorted iterator"""
+    head = []
+    for rank in ranks:
+        if not head or head[-1] != rank:
+            head.append(rank)
+            if len(head) == limit:
+                break
+    return head
+
+class SuggestIndex(CatalogIndex):
+    tables = tuple(column.class_.__tablename__ for column in SUGGEST_KINDS.values())
+    name = 'suggest index'
+
+    # Top entries stored per short prefix, and so the most a lookup can return
+    max_limit = 20
+
+    def __init__(self):
+        super().__init__()
+        self._kind_versions = {}
+
+    def build(self):
+        """Prefix tables per kind, reusing the ones whose table has not changed"""
+        versions = get_versions()
+        previous = self._snapshot or {}
+        snapshot, kind_versions = {}, {}
+        for kind, column in SUGGEST_KINDS.items():
+            kind_versions[kind] = versions.get(column.class_.__tablename__)
+            if kind in previous and self._kind_versions.get(kind) == kind_versions[kind]:
+                snapshot[kind] = previous[kind]
+            else:
+                snapshot[kind] = build_prefix_table(load_rows(column), self.max_limit)
+        self._kind_versions = kind_versions
+        return snapshot
+
+    def suggest(self, text, limit=5, versions=None):
+        """Top suggestions of each kind for words starting with the typed text, or None if cold"""
+        tokens = tokenize(text)
+        if not tokens:
+            return {kind: [] for kind in SUGGEST_KINDS}
+        snapshot = self.snapshot(versions)
+        if snapshot is None:
+            return None
+        limit = min(limit, self.max_limit)
+        return {kind: self.lookup(table, tokens, limit) for kind, table in snapshot.items()}
+
+    @staticmethod
+    def lookup(table, tokens, limit):
+        """(id, label) of the best entries having a word starting with each token"""
+        # Walk the entries matching the last (still being typed) token in rank order
+        last = tokens[-1]
+        if len(tokens) == 1 and last in table.short_prefixes:
+            ranks = iter(table.short_prefixes[last])
+        else:
+            lo, hi = prefix_range(table.words, last)
+            ranks = heapq.merge(*table.postings[lo:hi])
+
+        results = []
+        previous = None
+        for rank in islice(ranks, MAX_SCANNED):
+            if rank == previous:
+                continue
+            previous = rank
+            label = table.labels[rank]
+            if len(tokens) > 1:
+                words = tokenize(label)
+                if not all(any(word.startswith(token) for word in words) for token in tokens[:-1]):
+                    continue
+            results.append((table.ids[rank], label))
+            if len(results) == limit:
+                break
+        return results
+
+    def memory_report(self):
+        """Entry, word and posting counts per kind of the current snapshot"""
+        return {
+            kind: {
+                'entries': len(table.ids),
+                'words': len(table.words),
+                'postings': sum(len(p) for p in table.postings),
+                'short_prefixes': len(table.short_prefixes),
+            }
+            for kind, table in (self._snapshot or {}).items()
+        }
+
+suggest_index = SuggestIndex()
+
+def suggest_from_database(text, limit=5):
+    """Suggestions straight from SQL, used while the index is cold"""
+    tokens = tokenize(text)
+    results = {}
+    for kind, column in SUGGEST_KINDS.items():
+        if not tokens:
+            results[kind] = []
+            continue
+        model = column.class_
+        query = db.session.query(model.id, column)
+        # Each token starts the label or one of its words
+        for token in tokens:
+            query = query.filter(db.or_(column.ilike(f'{token}%'), column.ilike(f'% {token}%')))
+        order = (Lecture.publish_date.desc(), Lecture.id.desc()) if model is Lecture else (column,)
+        results[kind] = [tuple(row) for row in query.order_by(*order).limit(limit)]
+    return results
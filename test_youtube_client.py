@@ -0,0 +1,87 @@
+"""
+YouTube client tests against the local fake API server in fake_youtube.py.
+"""
+import time
+
+import pytest
+
+# The app first, as everywhere: youtube_client reads its settings
+from app import app  # noqa: F401
+from fake_youtube import FakeYouTubeServer, video_id
+from youtube_client import MAX_RESULTS, RETRY_POLICIES, RetryPolicy, YouTubeClient, YouTubeError, youtube
+from youtube_utils import get_video_details
+
+WORKERS = 4
+
+@pytest.fixture
+def server():
+    server = FakeYouTubeServer(video_count=5 * MAX_RESULTS).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def client(server):
+    client = YouTubeClient(server.url, workers=WORKERS)
+    yield client
+    client.close()
+
+def test_connections_are_pooled(server, client):
+    for _ in range(10):
+        client.get('videos', 'key', id=video_id(1))
+    assert server.connections == 1
+
+    client.videos('key', [video_id(index) for index in range(20 * MAX_RESULTS)])
+    assert server.calls['videos'] == 10 + 20
+    # One connection per pool thread and the calling thread, kept across calls
+    assert server.connections <= WORKERS + 1
+
+def test_iter_playlist_walks_every_page(server, client):
+    pages = list(client.iter_playlist('key', 'PL'))
+
+    assert len(pages) == 5
+    assert server.calls['playlistItems'] == 5
+    items = [item for page in pages for item in page.items]
+    assert [item['contentDetails']['videoId'] for item in items] == [video_id(index) for index in range(250)]
+    for page in pages:
+        assert page.error is None
+        assert set(page.videos) == {item['contentDetails']['videoId'] for item in page.items}
+
+def test_iter_playlist_reads_one_page_ahead(server, client):
+    pages = client.iter_playlist('key', 'PL')
+    first = next(pages)
+    # Give the read-ahead time to finish; it must not go further
+    time.sleep(0.3)
+
+    assert len(first.items) == MAX_RESULTS
+    assert server.calls['playlistItems'] == 2
+    pages.close()
+
+def test_get_video_details_keeps_order(server, monkeypatch):
+    monkeypatch.setattr(youtube, 'base_url', server.url)
+    monkeypatch.setattr(youtube, 'cache', None)
+    monkeypatch.setattr(youtube, 'daily_quota', None)
+    monkeypatch.setattr(youtube, 'limiter', None)
+    video_ids = [video_id(index) for index in reversed(range(3 * MAX_RESULTS + 7))]
+    # IDs the fake API does not know are left out
+    video_ids.insert(60, 'missing0001')
+
+    details = get_video_details('key', video_ids)
+
+    assert list(details) == [video_id for video_id in video_ids if video_id != 'missing0001']
+    assert server.calls['videos'] == 4
+    assert details[video_id(7)]['duration'] == 'PT1H7M7S'
+
+def test_timeout_raises_youtube_error(server, monkeypatch):
+    monkeypatch.setitem(RETRY_POLICIES, 'network', RetryPolicy(attempts=2, base_delay=0, max_delay=0))
+    server.latency = 0.5
+    client = YouTubeClient(server.url, read_timeout=0.1, workers=WORKERS)
+    try:
+        with pytest.raises(YouTubeError) as error:
+            client.get('videos', 'key', id=video_id(1))
+    finally:
+        client.close()
+
+    assert error.value.kind == 'network'
+    assert 'timed out' in str(error.value)
+    # Timeouts are retried as network errors
+    assert server.calls['videos'] == 2
@@ -4,8 +4,8 @@ from datetime import datetime
 from urllib.parse import parse_qs, urlparse
 
 import isodate
-import requests
 
+from youtube_client import YouTubeError, youtube
 from youtube_utils import get_youtube_video_info as fallback_get_info
 
 def extract_youtube_video_id(url):
@@ -65,13 +65,10 @@ def get_youtube_video_info(url, api_key=None):
         return fallback_get_info(url, api_key)
     
     # Get video info using YouTube Data API
-    api_url = f'https://www.googleapis.com/youtube/v3/videos?id={video_id}&key={youtube_api_key}&part=snippet,contentDetails,statistics'
-    response = requests.get(api_url)
-
-    if response.status_code != 200:
-        raise ValueError(f'Error fetching video info: {response.status_code}')
-
-    data = response.json()
+    try:
+        data = youtube.get('videos', youtube_api_key, id=video_id, part='snippet,contentDetails')
+    except YouTubeError as e:
+        raise ValueError(f'Error fetching video info: {e}') from e
 
     if not data['items']:
         raise ValueError('Video not found')
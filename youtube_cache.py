@@ -0,0 +1,159 @@
+"""
+Persistent cache and quota ledger for YouTube Data API responses.
+
+Responses are kept in a SQLite file shared by every worker on the host,
+keyed by the endpoint and its parameters, so by the playlist page or the
+video IDs asked for. A response is served from the file until its TTL runs
+out; after that it is revalidated with If-None-Match, and a 304 renews it
+without the body being sent again. Entries are kept for `keep_days` after
+they were last fetched or renewed, so stale ones can still be revalidated.
+
+The same file counts the quota units spent per quota day (YouTube resets
+quotas at midnight Pacific time) along with the day's cache hits,
+revalidations and fetches, for the admin panel.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from cache import private_temp_dir
+
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag', 'fresh'])
+
+SCHEMA = (
+    (
+        'CREATE TABLE IF NOT EXISTS response (key TEXT PRIMARY KEY, etag TEXT, body TEXT NOT NULL,'
+        ' fetched_at REAL NOT NULL, expires_at REAL NOT NULL)'
+    ),
+    (
+        'CREATE TABLE IF NOT EXISTS usage (day TEXT PRIMARY KEY, units INTEGER NOT NULL DEFAULT 0,'
+        ' hits INTEGER NOT NULL DEFAULT 0, revalidated INTEGER NOT NULL DEFAULT 0, fetched INTEGER NOT NULL DEFAULT 0)'
+    ),
+)
+
+def quota_day():
+    """The current YouTube quota day, as an ISO date"""
+    return datetime.now(QUOTA_TIMEZONE).date().isoformat()
+
+def response_key(url, params):
+    """Cache key of an API call: the endpoint URL and its parameters, without the API key"""
+    return json.dumps([url, sorted((name, str(value)) for name, value in params.items() if name != 'key')])
+
+class YouTubeCache:
+    """YouTube API responses and quota usage in a SQLite file.
+
+    `ttls` maps an endpoint to the seconds its responses stay fresh; other
+    endpoints use `default_ttl`. The file is `path`, or youtube.sqlite3 in
+    `directory` (the shared cache directory, by default a private one under
+    the temp directory). Each thread gets its own connection.
+    """
+
+    def __init__(self, path=None, ttls=None, default_ttl=3600, keep_days=30, directory=None):
+        self.path = path or os.path.join(directory or private_temp_dir('baduktube-cache'), 'youtube.sqlite3')
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.keep_days = keep_days
+        self._local = threading.local()
+        self._pruned = False
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Autocommit; every statement is its own short transaction
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            if not self._pruned:
+                self._pruned = True
+                self.prune()
+        return connection
+
+    def lookup(self, key):
+        """The cached response for a response_key(), fresh or stale, or None"""
+        row = self._connection().execute(
+            'SELECT body, etag, expires_at FROM response WHERE key = ?', (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        body, etag, expires_at = row
+        return CachedResponse(json.loads(body), etag, expires_at > time.time())
+
+    def store(self, key, resource, body):
+        """Keep a response of an endpoint, with the ETag YouTube sent in its body"""
+        now = time.time()
+        self._connection().execute(
+            'INSERT OR REPLACE INTO response (key, etag, body, fetched_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+            (key, body.get('etag'), json.dumps(body), now, now + self.ttl(resource)),
+        )
+
+    def renew(self, key, resource):
+        """Mark a revalidated (304) response fresh again"""
+        now = time.time()
+        self._connection().execute(
+            'UPDATE response SET fetched_at = ?, expires_at = ? WHERE key = ?',
+            (now, now + self.ttl(resource), key),
+        )
+
+    def ttl(self, resource):
+        return self.ttls.get(resource, self.default_ttl)
+
+    def record(self, units=0, hits=0, revalidated=0, fetched=0):
+        """Add to today's quota units and cache counters"""
+        self._connection().execute(
+            'INSERT INTO usage (day, units, hits, revalidated, fetched) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (day) DO UPDATE SET units = units + excluded.units, hits = hits + excluded.hits, '
+            'revalidated = revalidated + excluded.revalidated, fetched = fetched + excluded.fetched',
+            (quota_day(), units, hits, revalidated, fetched),
+        )
+
+    def _usage_row(self, day=None):
+        return self._connection().execute(
+            'SELECT units, hits, revalidated, fetched FROM usage WHERE day = ?', (day or quota_day(),),
+        ).fetchone() or (0, 0, 0, 0)
+
+    def units_spent(self):
+        """Quota units spent today"""
+        return self._usage_row()[0]
+
+    def usage(self, day=None):
+        """Quota units and cache counters of a quota day (today by default)"""
+        units, hits, revalidated, fetched = self._usage_row(day)
+        lookups = hits + revalidated + fetched
+        return {
+            'units': units,
+            'hits': hits,
+            'revalidated': revalidated,
+            'fetched': fetched,
+            # Revalidated responses were served from the cache too, but cost a call
+            'hit_rate': round(hits / lookups, 3) if lookups else None,
+            'size': len(self),
+        }
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM response').fetchone()[0]
+
+    def prune(self):
+        """Forget responses and usage older than keep_days"""
+        cutoff = time.time() - self.keep_days * 86400
+        connection = self._connection()
+        removed = connection.execute('DELETE FROM response WHERE fetched_at < ?', (cutoff,)).rowcount
+        connection.execute(
+            'DELETE FROM usage WHERE day < ?',
+            (datetime.fromtimestamp(cutoff, QUOTA_TIMEZONE).date().isoformat(),),
+        )
+        if removed:
+            logging.info('Removed %s old YouTube responses from %s', removed, self.path)
+
+    def clear(self):
+        self._connection().execute('DELETE FROM response')
@@ -0,0 +1,401 @@
+"""
+Shared client for the YouTube Data API.
+
+Every call goes through one pooled requests.Session, so connections (and
+their TLS handshakes) are reused between calls and threads, and every call
+has a connect and a read timeout. Video lookups of more than 50 IDs are
+split into videos.list calls that run on a small thread pool, and playlists
+are read as a generator that fetches the next page while the caller works on
+the current one.
+
+Calls are paced by a token bucket (YOUTUBE_RATE_LIMIT calls per second in
+bursts of YOUTUBE_RATE_BURST, per process). A failed call is retried with
+jittered exponential backoff as the RETRY_POLICIES entry for its class of
+error says, and every call's latency, retries and outcome are counted per
+endpoint.
+
+Responses go through the persistent cache in youtube_cache.py, and every call
+made is charged to the day's quota. A call that would take the day past
+YOUTUBE_DAILY_QUOTA units raises QuotaExceeded instead of being made.
+
+The API address comes from YOUTUBE_API_URL, so the app can be pointed at a
+local fake server (see fake_youtube.py).
+"""
+import logging
+import math
+import random
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app import app
+from youtube_cache import YouTubeCache, quota_day, response_key
+
+# Most IDs a single videos.list call accepts, and most items per playlist page
+MAX_RESULTS = 50
+
+# Quota units per call of each endpoint; requests that fail are charged too
+QUOTA_COSTS = {
+    'playlistItems': 1,
+    'videos': 1,
+}
+
+RetryPolicy = namedtuple('RetryPolicy', ['attempts', 'base_delay', 'max_delay'])
+
+# How each class of error is retried: attempts in all, and the first and the
+# largest backoff in seconds. A Retry-After header replaces the backoff
+RETRY_POLICIES = {
+    # Connection errors and timeouts
+    'network': RetryPolicy(attempts=3, base_delay=0.5, max_delay=4),
+    # 500, 502, 503 and 504
+    'server': RetryPolicy(attempts=4, base_delay=1, max_delay=16),
+    # 429, and 403 with a rate limit reason
+    'rate_limit': RetryPolicy(attempts=5, base_delay=2, max_delay=32),
+    # A 200 whose body is not JSON, usually a proxy in the way
+    'invalid': RetryPolicy(attempts=2, base_delay=0.5, max_delay=2),
+    # Other 4xx answers: a bad request or key, or something that does not exist
+    'client': RetryPolicy(attempts=1, base_delay=0, max_delay=0),
+    # Out of quota, by the API or the daily budget; nothing to do until tomorrow
+    'quota': RetryPolicy(attempts=1, base_delay=0, max_delay=0),
+}
+
+# 403 reasons that mean slow down, and ones that mean the day's quota is spent
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+QUOTA_REASONS = {'quotaExceeded', 'dailyLimitExceeded'}
+
+PlaylistPage = namedtuple('PlaylistPage', ['items', 'videos', 'error'])
+VideoBatch = namedtuple('VideoBatch', ['video_ids', 'videos', 'error'])
+
+class YouTubeError(Exception):
+    """A YouTube API call failed: an API error, a bad response, a timeout or a connection error.
+
+    `kind` is the RETRY_POLICIES class of the error, `retry_after` the seconds
+    a Retry-After header asked for, if any.
+    """
+
+    def __init__(self, message, kind='client', retry_after=None):
+        super().__init__(message)
+        self.kind = kind
+        self.retry_after = retry_after
+
+class QuotaExceeded(YouTubeError):
+    """The calls asked for would take today's quota usage past the daily budget"""
+
+    def __init__(self, needed, remaining):
+        super().__init__(
+            f'Not enough YouTube API quota left today: {needed} units needed, {remaining} remaining', kind='quota',
+        )
+        self.needed = needed
+        self.remaining = remaining
+
+def classify(status, data):
+    """The RETRY_POLICIES class of an HTTP error status and its decoded error body"""
+    errors = (data or {}).get('error', {}).get('errors') or [{}]
+    reason = errors[0].get('reason')
+    if status == 429 or reason in RATE_LIMIT_REASONS:
+        return 'rate_limit'
+    if reason in QUOTA_REASONS:
+        return 'quota'
+    if status >= 500:
+        return 'server'
+    return 'client'
+
+def backoff(policy, attempt):
+    """Seconds to wait after a failed attempt: exponential, half of it random"""
+    delay = min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def retry_after(response):
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` calls per second on average, in bursts of up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is free; returns the seconds waited"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Taking a token that is not there yet reserves it, so waiters queue up in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+class CallMetrics:
+    """Latency, retries and outcomes of the YouTube calls in this process, per endpoint"""
+
+    def __init__(self, recent=50):
+        self._lock = threading.Lock()
+        self._endpoints = defaultdict(lambda: {
+            'calls': 0, 'retries': 0, 'outcomes': defaultdict(int), 'latency': 0.0, 'max_latency': 0.0,
+        })
+        self._recent = deque(maxlen=recent)
+
+    def record(self, resource, outcome, latency, retries):
+        with self._lock:
+            endpoint = self._endpoints[resource]
+            endpoint['calls'] += 1
+            endpoint['retries'] += retries
+            endpoint['outcomes'][outcome] += 1
+            endpoint['latency'] += latency
+            endpoint['max_latency'] = max(endpoint['max_latency'], latency)
+            self._recent.append({
+                'endpoint': resource,
+                'outcome': outcome,
+                'latency_ms': round(latency * 1000, 1),
+                'retries': retries,
+                'at': time.time(),
+            })
+        logging.debug('YouTube %s call: %s in %.0f ms after %s retries', resource, outcome, latency * 1000, retries)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'endpoints': {
+                    resource: {
+                        'calls': endpoint['calls'],
+                        'retries': endpoint['retries'],
+                        'outcomes': dict(endpoint['outcomes']),
+                        'mean_latency_ms': round(endpoint['latency'] * 1000 / endpoint['calls'], 1),
+                        'max_latency_ms': round(endpoint['max_latency'] * 1000, 1),
+                    }
+                    for resource, endpoint in self._endpoints.items()
+                },
+                'recent': list(self._recent),
+            }
+
+class YouTubeClient:
+    def __init__(
+        self, base_url, connect_timeout=5, read_timeout=15, workers=4, cache=None, daily_quota=None,
+        rate_limit=None, rate_burst=10,
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.workers = workers
+        self.cache = cache
+        # Quota is only tracked with a cache, which keeps the ledger
+        self.daily_quota = daily_quota if cache is not None else None
+        self.limiter = TokenBucket(rate_limit, rate_burst) if rate_limit else None
+        self.metrics = CallMetrics()
+        # Quota day on which the API itself said the quota is spent
+        self._exhausted_on = None
+        self.session = requests.Session()
+        # One connection per pool thread plus the calling thread
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers + 1)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='youtube')
+
+    def remaining_quota(self):
+        """Units left in today's budget, or None without one"""
+        if self._exhausted_on == quota_day():
+            return 0
+        if self.daily_quota is None:
+            return None
+        return max(self.daily_quota - self.cache.units_spent(), 0)
+
+    def ensure_quota(self, units):
+        """Raise QuotaExceeded unless `units` more fit in today's budget"""
+        remaining = self.remaining_quota()
+        if remaining is not None and units > remaining:
+            raise QuotaExceeded(units, remaining)
+
+    def stats(self):
+        """Today's quota use and cache counters, and this process's call metrics, for the admin panel"""
+        stats = self.cache.usage() if self.cache is not None else {}
+        stats.update(daily_quota=self.daily_quota, remaining=self.remaining_quota(), calls=self.metrics.as_dict())
+        return stats
+
+    def get(self, resource, api_key, **params):
+        """The decoded JSON of one API call; raises YouTubeError when it fails.
+
+        Fresh cached responses are returned without a call. Stale ones are
+        revalidated with their ETag and returned again on a 304. Failed
+        attempts are retried as RETRY_POLICIES says for their kind of error.
+        """
+        started = time.monotonic()
+        url = f'{self.base_url}/{resource}'
+        key = response_key(url, params)
+        cached = self.cache.lookup(key) if self.cache is not None else None
+        if cached is not None and cached.fresh:
+            self.cache.record(hits=1)
+            self.metrics.record(resource, 'cached', time.monotonic() - started, 0)
+            return cached.body
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                data, outcome = self._call(url, resource, key, api_key, params, cached)
+            except YouTubeError as e:
+                policy = RETRY_POLICIES[e.kind]
+                if attempt >= policy.attempts:
+                    self.metrics.record(resource, e.kind, time.monotonic() - started, attempt - 1)
+                    raise
+                delay = min(e.retry_after, policy.max_delay) if e.retry_after else backoff(policy, attempt)
+                logging.warning(
+                    'YouTube %s call failed (%s: %s), attempt %s of %s, retrying in %.1f s',
+                    resource, e.kind, e, attempt, policy.attempts, delay,
+                )
+                time.sleep(delay)
+                continue
+            self.metrics.record(resource, outcome, time.monotonic() - started, attempt - 1)
+            return data
+
+    def _call(self, url, resource, key, api_key, params, cached):
+        """One attempt at a call: (decoded JSON, 'fetched' or 'revalidated')"""
+        cost = QUOTA_COSTS.get(resource, 1)
+        self.ensure_quota(cost)
+        if self.limiter is not None:
+            self.limiter.acquire()
+        headers = {'If-None-Match': cached.etag} if cached is not None and cached.etag else {}
+        try:
+            response = self.session.get(url, params=dict(params, key=api_key), headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise YouTubeError(f'YouTube API request failed: {e}', kind='network') from e
+        if self.cache is not None:
+            self.cache.record(units=cost)
+        if response.status_code == 304 and cached is not None:
+            self.cache.record(revalidated=1)
+            self.cache.renew(key, resource)
+            return cached.body, 'revalidated'
+        try:
+            data = response.json()
+        except ValueError as e:
+            kind = 'invalid' if response.ok else classify(response.status_code, None)
+            raise YouTubeError(f'Invalid YouTube API response (HTTP {response.status_code})', kind=kind) from e
+        if 'error' in data or not response.ok:
+            kind = classify(response.status_code, data)
+            if kind == 'quota':
+                self._exhausted_on = quota_day()
+            message = data.get('error', {}).get('message') or f'YouTube API returned HTTP {response.status_code}'
+            raise YouTubeError(message, kind=kind, retry_after=retry_after(response))
+        if self.cache is not None:
+            self.cache.record(fetched=1)
+            self.cache.store(key, resource, data)
+        return data, 'fetched'
+
+    def videos_cost(self, video_ids):
+        """Quota units a lookup of these videos would spend, leaving out fresh cached responses"""
+        video_ids = list(video_ids)
+        cost = 0
+        for start in range(0, len(video_ids), MAX_RESULTS):
+            key = response_key(f'{self.base_url}/videos', self._videos_params(video_ids[start:start + MAX_RESULTS]))
+            cached = self.cache.lookup(key) if self.cache is not None else None
+            if cached is None or not cached.fresh:
+                cost += QUOTA_COSTS['videos']
+        return cost
+
+    def _map(self, func, items):
+        """Results of func over items, in order, with at most `workers` calls in flight"""
+        pending = deque()
+        for item in items:
+            pending.append(self._executor.submit(func, item))
+            if len(pending) >= self.workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    @staticmethod
+    def _videos_params(video_ids):
+        return {'part': 'contentDetails,snippet', 'id': ','.join(video_ids)}
+
+    def _videos(self, api_key, video_ids):
+        if not video_ids:
+            return {}
+        data = self.get('videos', api_key, **self._videos_params(video_ids))
+        return {item['id']: item for item in data.get('items', [])}
+
+    def _video_batch(self, api_key, video_ids):
+        """A VideoBatch; a call that failed after its retries is kept as the batch's error"""
+        try:
+            return VideoBatch(video_ids, self._videos(api_key, video_ids), None)
+        except YouTubeError as e:
+            return VideoBatch(video_ids, {}, e)
+
+    def iter_videos(self, api_key, video_ids):
+        """VideoBatches of video resources by ID, one per 50 IDs in order; the calls run concurrently.
+
+        A failed call does not stop the others: its batch carries the error.
+        """
+        chunks = (video_ids[start:start + MAX_RESULTS] for start in range(0, len(video_ids), MAX_RESULTS))
+        return self._map(lambda chunk: self._video_batch(api_key, chunk), chunks)
+
+    def videos(self, api_key, video_ids):
+        """Video resources by ID for any number of IDs; raises the error of the first failed call"""
+        resources = {}
+        for batch in self.iter_videos(api_key, list(video_ids)):
+            if batch.error:
+                raise batch.error
+            resources.update(batch.videos)
+        return resources
+
+    def iter_playlist(self, api_key, playlist_id):
+        """PlaylistPages: the playlist items, their video resources by ID, and the error of the videos call.
+
+        The next playlistItems page is requested before the video details of
+        the current one, so the two calls overlap, and it keeps loading while
+        the caller works on the page just yielded. Only one page is read
+        ahead, so a caller that stops early does not page through the rest.
+        A playlistItems call that fails raises; a videos call that fails
+        leaves its page without videos and with the error.
+
+        Once the first page tells the playlist's size, the calls for the rest
+        are checked against the day's quota, so a playlist too large for it
+        fails before the import gets going.
+        """
+        def fetch_page(token):
+            params = {'part': 'snippet,contentDetails', 'maxResults': MAX_RESULTS, 'playlistId': playlist_id}
+            if token:
+                params['pageToken'] = token
+            return self.get('playlistItems', api_key, **params)
+
+        page = self._executor.submit(fetch_page, None)
+        first = True
+        while page is not None:
+            data = page.result()
+            token = data.get('nextPageToken')
+            if first:
+                first = False
+                # Every page costs a playlistItems and a videos call
+                pages = math.ceil(data.get('pageInfo', {}).get('totalResults', 0) / MAX_RESULTS)
+                self.ensure_quota(max(pages - 1, 0) * QUOTA_COSTS['playlistItems'] + pages * QUOTA_COSTS['videos'])
+            page = self._executor.submit(fetch_page, token) if token else None
+            items = data.get('items', [])
+            batch = self._video_batch(api_key, [item['contentDetails']['videoId'] for item in items])
+            yield PlaylistPage(items, batch.videos, batch.error)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+youtube = YouTubeClient(
+    app.config['YOUTUBE_API_URL'],
+    connect_timeout=app.config['YOUTUBE_CONNECT_TIMEOUT'],
+    read_timeout=app.config['YOUTUBE_READ_TIMEOUT'],
+    workers=app.config['YOUTUBE_WORKERS'],
+    cache=YouTubeCache(
+        app.config['YOUTUBE_CACHE_PATH'],
+        ttls={'videos': app.config['YOUTUBE_VIDEO_TTL'], 'playlistItems': app.config['YOUTUBE_PLAYLIST_TTL']},
+        directory=app.config['CACHE_DIR'],
+    ),
+    daily_quota=app.config['YOUTUBE_DAILY_QUOTA'],
+    rate_limit=app.config['YOUTUBE_RATE_LIMIT'],
+    rate_burst=app.config['YOUTUBE_RATE_BURST'],
+)
@@ -2,7 +2,7 @@ import logging
 import re
 from datetime import datetime
 
-import requests
+from youtube_client import YouTubeError, youtube
 
 logging.basicConfig(level=logging.INFO)
 
@@ -22,101 +22,98 @@ def extract_youtube_id(youtube_url):
         return match.group(1)
     return None
 
+def parse_published(value):
+    """Timezone-aware datetime of an API timestamp like 2020-01-01T12:00:00Z"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def video_details_from(resource):
+    """The duration and upload date of a videos.list resource"""
+    return {
+        'duration': resource.get('contentDetails', {}).get('duration', 'PT0S'),
+        'upload_date': resource.get('snippet', {}).get('publishedAt'),
+    }
+
+# Error of a playlist video that videos.list does not return
+VIDEO_UNAVAILABLE = 'Not available on YouTube (private or deleted)'
+
+def playlist_video(item, resource, error=None):
+    """A playlist item as a video dict, with duration and upload date from its video resource.
+
+    Without the resource, `duration_seconds` is None and `error` says why:
+    the failed videos call, or VIDEO_UNAVAILABLE when YouTube left it out.
+    """
+    snippet = item['snippet']
+    duration_seconds = None
+    upload_date = None
+    if resource:
+        details = video_details_from(resource)
+        duration_seconds = parse_duration(details['duration'])
+        # Use actual upload date instead of playlist addition date if available
+        if details['upload_date']:
+            upload_date = parse_published(details['upload_date'])
+        error = None
+    elif error:
+        error = f'Video details could not be fetched: {error}'
+    else:
+        error = VIDEO_UNAVAILABLE
+    # If no upload date was found in video details, fall back to playlist date
+    if not upload_date:
+        upload_date = parse_published(snippet['publishedAt'])
+    return {
+        'title': snippet['title'],
+        'video_id': item['contentDetails']['videoId'],
+        'thumbnail_url': snippet.get('thumbnails', {}).get('high', {}).get('url', ''),
+        'published_at': upload_date,
+        'duration_seconds': duration_seconds,
+        'error': error,
+    }
+
+def iter_playlist_videos(api_key, playlist_id):
+    """Videos of a YouTube playlist, one list per page of up to 50, while the next page loads.
+
+    Raises YouTubeError when a playlist page cannot be read. Videos whose
+    details could not be fetched are kept with their `error`.
+    """
+    for page in youtube.iter_playlist(api_key, playlist_id):
+        yield [
+            playlist_video(item, page.videos.get(item['contentDetails']['videoId']), page.error)
+            for item in page.items
+        ]
+
 def fetch_playlist_videos(api_key, playlist_id):
     """Fetch all videos from a YouTube playlist."""
     videos = []
-    next_page_token = None
-
     try:
-        while True:
-            # Build URL with pagination token if it exists
-            url = f'https://www.googleapis.com/youtube/v3/playlistItems?part=snippet,contentDetails&maxResults=50&playlistId={playlist_id}&key={api_key}'
-            if next_page_token:
-                url += f'&pageToken={next_page_token}'
-
-            # Make request to get playlist items
-            response = requests.get(url)
-            data = response.json()
-
-            if 'error' in data:
-                return [], data['error'].get('message', 'An error occurred')
-
-            # Get video IDs for content details request
-            video_ids = [item['contentDetails']['videoId'] for item in data['items']]
-
-            # Get video details (including duration) in a single request
-            video_details = get_video_details(api_key, video_ids)
-
-            # Process each video in the playlist
-            for item in data['items']:
-                snippet = item['snippet']
-                video_id = item['contentDetails']['videoId']
-
-                # Get duration and upload date from video details
-                duration_seconds = 0
-                upload_date = None
-                
-                if video_id in video_details:
-                    duration_str = video_details[video_id].get('duration', 'PT0S')
-                    duration_seconds = parse_duration(duration_str)
-                    
-                    # Use actual upload date instead of playlist addition date if available
-                    if upload_date_str := video_details[video_id].get('upload_date'):
-                        upload_date = datetime.fromisoformat(upload_date_str.replace('Z', '+00:00'))
-                
-                # If no upload date was found in video details, fall back to playlist date
-                if not upload_date:
-                    upload_date = datetime.fromisoformat(snippet['publishedAt'].replace('Z', '+00:00'))
-                    
-                video = {
-                    'title': snippet['title'],
-                    'video_id': video_id,
-                    'thumbnail_url': snippet.get('thumbnails', {}).get('high', {}).get('url', ''),
-                    'published_at': upload_date,
-                    'duration_seconds': duration_seconds,
-                }
-                videos.append(video)
-
-            # Check if there are more pages
-            next_page_token = data.get('nextPageToken')
-            if not next_page_token:
-                break
-
+        for page in iter_playlist_videos(api_key, playlist_id):
+            videos.extend(page)
         return videos, None
     except Exception as e:
         return [], str(e)
 
-def get_video_details(api_key, video_ids):
-    """Get detailed information about videos including duration and upload date."""
-    if not video_ids:
-        return {}
+def iter_video_details(api_key, video_ids):
+    """(video IDs, duration and upload date by video ID, error) per 50 IDs in order, looked up concurrently.
 
-    # Join video IDs for batch request (max 50 IDs)
-    ids_str = ','.join(video_ids[:50])
+    A videos call that failed after its retries gives no details and its YouTubeError.
+    """
+    for batch in youtube.iter_videos(api_key, list(video_ids)):
+        # In the order asked for, whatever order the API answered in
+        details = {
+            video_id: video_details_from(batch.videos[video_id])
+            for video_id in batch.video_ids if video_id in batch.videos
+        }
+        yield batch.video_ids, details, batch.error
 
-    try:
-        # Include snippet part to get upload date, along with contentDetails for duration
-        url = f'https://www.googleapis.com/youtube/v3/videos?part=contentDetails,snippet&id={ids_str}&key={api_key}'
-        response = requests.get(url)
-        data = response.json()
-
-        # Create mapping of video ID to details
-        result = {}
-        if 'items' in data:
-            for item in data['items']:
-                video_id = item['id']
-                content_details = item['contentDetails']
-                snippet = item.get('snippet', {})
-                
-                result[video_id] = {
-                    'duration': content_details.get('duration', 'PT0S'),
-                    'upload_date': snippet.get('publishedAt'),
-                }
-
-        return result
-    except Exception as e:
-        logging.error('Error fetching video details: %s', e)
-        return {}
+def get_video_details(api_key, video_ids):
+    """Duration and upload date by video ID; videos YouTube does not return are left out.
+
+    Raises YouTubeError when a call fails.
+    """
+    result = {}
+    for _, details, error in iter_video_details(api_key, video_ids):
+        if error:
+            raise error
+        result.update(details)
+    return result
 
 def get_youtube_video_info(youtube_url, api_key=None):
     """
@@ -131,26 +128,18 @@ def get_youtube_video_info(youtube_url, api_key=None):
     if api_key:
         try:
             video_details = get_video_details(api_key, [video_id])
-            
-            if video_id in video_details and video_details[video_id].get('upload_date'):
-                # Parse the ISO date format
-                upload_date = datetime.fromisoformat(video_details[video_id]['upload_date'].replace('Z', '+00:00'))
-                
-                # Get the duration
-                duration_str = video_details[video_id].get('duration', 'PT0S')
-                duration_seconds = parse_duration(duration_str)
-                
-                return {
-                    'youtube_id': video_id,
-                    'thumbnail_url': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg',
-                    'publish_date': upload_date,
-                    'duration_seconds': duration_seconds,
-                }
-        except Exception as e:
-            logging.error('Error fetching video info from API: %s', e)
-            # Fall back to basic info if API call fails
-    
-    # Return basic info if no API key is provided or API call failed
+        except YouTubeError as e:
+            raise ValueError(f'Error fetching video info: {e}') from e
+        if video_id not in video_details:
+            raise ValueError(VIDEO_UNAVAILABLE)
+        return {
+            'youtube_id': video_id,
+            'thumbnail_url': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg',
+            'publish_date': parse_published(video_details[video_id]['upload_date']),
+            'duration_seconds': parse_duration(video_details[video_id]['duration']),
+        }
+
+    # Return basic info if no API key is provided
     return {
         'youtube_id': video_id,
         'thumbnail_url': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg',